@@ -0,0 +1,95 @@
+"""
+Fine-tuning data preparation: materialized lists vs the streaming pipeline.
+
+    python benchmarks/bench_agent_train.py --messages 500000
+"""
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from agent_train import (  # noqa: E402
+    MessageRecord,
+    PipelineStats,
+    TrainingConfig,
+    build_dataset,
+    clean_messages,
+    filter_last_90_days,
+    filter_sent_messages,
+    stream_clean,
+    stream_dataset,
+)
+
+_WORDS = ("ok", "sure", "see", "you", "at", "the", "lunch", "tomorrow", "haha", "running", "late", "love", "that")
+_EXTRAS = ("", "", "", " https://example.com/x", " 415-555-0100", " me@example.com", " 12 Main St", " 😂")
+
+
+def records(count: int, now: datetime, seed: int = 0):
+    """
+    `count` messages spread over two years, oldest first, generated on the fly.
+    """
+    rng = random.Random(seed)
+    start = now - timedelta(days=730)
+    step = timedelta(days=730) / count
+    for i in range(count):
+        roll = rng.random()
+        if roll < 0.05:
+            text = None
+        elif roll < 0.15:
+            text = rng.choice(("ok", "👍", "https://example.com/a", "lol"))
+        else:
+            text = " ".join(rng.choice(_WORDS) for _ in range(rng.randrange(2, 14))) + rng.choice(_EXTRAS)
+        yield MessageRecord(str(i), start + step * i, text, f"chat{i % 300}", 2)
+
+
+def run(label, prepare):
+    # Timed and measured in separate runs: tracemalloc slows allocation-heavy
+    # code several times over.
+    gc.collect()
+    started = time.perf_counter()
+    dataset = prepare()
+    seconds = time.perf_counter() - started
+    del dataset
+    gc.collect()
+    tracemalloc.start()
+    dataset = prepare()
+    _current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<13} {seconds:7.2f} s   peak {peak / 2**20:8.1f} MiB   {len(dataset.train_lines)} lines")
+    return dataset
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=500_000)
+    args = parser.parse_args()
+
+    now = datetime(2026, 1, 1)
+    config = TrainingConfig()
+
+    def materialized():
+        messages = list(records(args.messages, now))
+        cleaned = clean_messages(filter_sent_messages(filter_last_90_days(messages, now)), config)
+        return build_dataset(cleaned, config)
+
+    stats = []
+
+    def streamed():
+        stats.append(PipelineStats())
+        return stream_dataset(stream_clean(records(args.messages, now), config, now, stats[-1]), config, stats[-1])
+
+    old = run("materialized", materialized)
+    new = run("streamed", streamed)
+    assert old.dataset_hash == new.dataset_hash
+    print()
+    print(stats[0].report())  # from the untraced run
+
+
+if __name__ == "__main__":
+    main()
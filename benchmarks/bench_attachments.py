@@ -0,0 +1,98 @@
+"""
+Attach files to a share of the messages in a synthetic chat and time loading
+attachment metadata for history pages: one batched query per page versus one
+query per message.
+
+    python benchmarks/bench_attachments.py --messages 200000 --share 0.4
+"""
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from attachments import load_attachments  # noqa: E402
+from chatdb_synth import generate_chat_db, insert_attachment  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+
+PER_MESSAGE_SQL = """
+SELECT a.ROWID, a.filename, a.transfer_name, a.mime_type, a.total_bytes
+FROM message_attachment_join maj
+JOIN attachment a ON a.ROWID = maj.attachment_id
+WHERE maj.message_id = ?
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--chats", type=int, default=2_000)
+    parser.add_argument("--share", type=float, default=0.4, help="fraction of messages with attachments")
+    parser.add_argument("--page", type=int, default=60)
+    parser.add_argument("--pages", type=int, default=200)
+    args = parser.parse_args()
+
+    base = f"/tmp/bench_chat_{args.messages}_{args.chats}.db"
+    if not os.path.exists(base):
+        generate_chat_db(base, args.messages, args.chats)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "chat.db")
+        shutil.copy(base, db_path)
+        conn = sqlite3.connect(db_path)
+        rng = random.Random(0)
+        (max_rowid,) = conn.execute("SELECT MAX(ROWID) FROM message").fetchone()
+        for rowid in range(1, max_rowid + 1):
+            if rng.random() < args.share:
+                for n in range(rng.choice((1, 1, 1, 2, 4))):
+                    insert_attachment(
+                        conn,
+                        rowid,
+                        f"~/Library/Messages/Attachments/{rowid % 256:02x}/IMG_{rowid}_{n}.HEIC",
+                        "image/heic",
+                        rng.randint(200_000, 4_000_000),
+                    )
+        conn.execute("UPDATE message SET cache_has_attachments = 1 WHERE ROWID IN (SELECT message_id FROM message_attachment_join)")
+        conn.commit()
+        conn.close()
+
+        bridge = MessageBridge(db_path)
+        (chat_id,) = bridge.cur.execute(
+            "SELECT chat_id FROM chat_message_join GROUP BY chat_id ORDER BY COUNT(*) DESC LIMIT 1"
+        ).fetchone()
+        pages = []
+        cursor = None
+        for _ in range(args.pages):
+            page = bridge.messages_before(chat_id, cursor, limit=args.page)
+            if not page:
+                break
+            pages.append(list(page.rowids))
+            cursor = page.cursor(len(page) - 1)
+
+        batched = []
+        for rowids in pages:
+            t0 = time.perf_counter()
+            load_attachments(bridge.conn, rowids)
+            batched.append(time.perf_counter() - t0)
+
+        per_message = []
+        for rowids in pages:
+            t0 = time.perf_counter()
+            for rowid in rowids:
+                bridge.conn.execute(PER_MESSAGE_SQL, (rowid,)).fetchall()
+            per_message.append(time.perf_counter() - t0)
+        bridge.close()
+
+    print(f"{len(pages)} pages of {args.page} messages, ~{args.share:.0%} with attachments")
+    print(f"batched:     median {statistics.median(batched) * 1000:.3f} ms/page")
+    print(f"per-message: median {statistics.median(per_message) * 1000:.3f} ms/page")
+
+
+if __name__ == "__main__":
+    main()
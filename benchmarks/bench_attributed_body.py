@@ -0,0 +1,72 @@
+"""
+attributedBody decode throughput over a corpus of Messages-shaped blobs.
+
+    python benchmarks/bench_attributed_body.py --blobs 200000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from typedstream import decode_attributed_body, encode_attributed_body  # noqa: E402
+
+_WORDS = "ok sure see you soon 🎉 dinner tonight can you call me when free thanks ünïcode".split()
+
+
+def make_corpus(n: int, seed: int = 0):
+    # Most texts are short; a tail of long ones exercises the multi-byte
+    # length prefixes (>127 and >65535 bytes).
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        r = rng.random()
+        if r < 0.85:
+            words = rng.randint(1, 15)
+        elif r < 0.999:
+            words = rng.randint(40, 400)
+        else:
+            words = rng.randint(12_000, 15_000)
+        corpus.append(encode_attributed_body(" ".join(rng.choices(_WORDS, k=words))))
+    return corpus
+
+
+def legacy_decode(blob: bytes) -> str:
+    # Pre-rewrite fallback: single-byte length after b"\x01+"
+    i = blob.find(b"\x01+")
+    if i != -1 and i + 3 <= len(blob):
+        n = blob[i + 2]
+        start = i + 3
+        if start + n <= len(blob):
+            return blob[start:start + n].decode("utf-8", errors="ignore")
+    return ""
+
+
+def run(name, fn, corpus):
+    t0 = time.perf_counter()
+    for blob in corpus:
+        fn(blob)
+    elapsed = time.perf_counter() - t0
+    total_mb = sum(len(b) for b in corpus) / 1e6
+    print(f"{name:<12} {len(corpus) / elapsed:>12,.0f} blobs/s  {total_mb / elapsed:>8.1f} MB/s")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blobs", type=int, default=200_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.blobs, args.seed)
+    texts = [decode_attributed_body(b) for b in corpus]
+    truncated = sum(1 for blob, text in zip(corpus, texts) if legacy_decode(blob) != text)
+    print(f"corpus: {len(corpus):,} blobs, legacy heuristic wrong on {truncated:,}")
+
+    run("typedstream", decode_attributed_body, corpus)
+    run("legacy", legacy_decode, corpus)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Measure how long a new message takes to reach a ChangeFeed subscriber, and
+what the feed costs while idle, against a synthetic WAL-mode chat.db.
+
+    python benchmarks/bench_change_feed.py --writes 20
+"""
+import argparse
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from change_feed import ChangeFeed, MessagesAdded  # noqa: E402
+from chatdb_synth import generate_chat_db, insert_message  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--chats", type=int, default=500)
+    parser.add_argument("--writes", type=int, default=20)
+    parser.add_argument("--idle", type=float, default=3.0, help="seconds of idle time to measure")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "chat.db")
+        generate_chat_db(db_path, args.messages, args.chats)
+        conn = sqlite3.connect(db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+
+        delivered = threading.Event()
+        latencies = []
+        written_at = [0.0]
+
+        def on_event(event):
+            if isinstance(event, MessagesAdded):
+                latencies.append(time.perf_counter() - written_at[0])
+                delivered.set()
+
+        with ChangeFeed(db_path) as feed:
+            feed.subscribe(on_event)
+
+            cpu0 = time.process_time()
+            time.sleep(args.idle)
+            idle_cpu = time.process_time() - cpu0
+
+            rng = random.Random(0)
+            for i in range(args.writes):
+                delivered.clear()
+                written_at[0] = time.perf_counter()
+                insert_message(conn, rng.randint(1, args.chats), 10**18 + i, f"live {i}")
+                conn.commit()
+                if not delivered.wait(5):
+                    print(f"write {i}: no event within 5 s")
+                time.sleep(rng.uniform(0.1, 0.4))
+        conn.close()
+
+    print(f"watcher: {type(feed._watcher).__name__}, debounce {feed.debounce * 1000:.0f} ms")
+    print(f"idle: {idle_cpu / args.idle * 100:.2f}% of one core")
+    if latencies:
+        print(
+            f"commit -> event: median {statistics.median(latencies) * 1000:.0f} ms, "
+            f"max {max(latencies) * 1000:.0f} ms (old timer: up to 5000 ms)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Address-book scale on any platform: parse a vCard and a CSV export of N
+fake contacts (streaming, with peak traced memory), build the lookup index
+from each, reload it from the disk cache, and time single-handle lookups.
+
+    python benchmarks/bench_contact_sources.py --contacts 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from contact_index import ContactIndex, load_or_build  # noqa: E402
+from contact_sources import CSVContactSource, VCardContactSource  # noqa: E402
+from contacts_synth import generate_contacts, handles_for, write_csv, write_vcard  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--lookups", type=int, default=20_000)
+    args = parser.parse_args()
+
+    contacts = generate_contacts(args.contacts, seed=1)
+    handles = handles_for(contacts, args.lookups, seed=2)
+    workdir = tempfile.mkdtemp(prefix="bench_contacts_")
+    files = {
+        "vcard": (os.path.join(workdir, "contacts.vcf"), write_vcard, VCardContactSource),
+        "csv": (os.path.join(workdir, "contacts.csv"), write_csv, CSVContactSource),
+    }
+    print(f"{args.contacts:,} contacts")
+    for label, (path, write, source_cls) in files.items():
+        write(path, contacts)
+        source = source_cls(path)
+        size_mb = os.path.getsize(path) / 1e6
+
+        t0 = time.perf_counter()
+        count = sum(1 for _ in source.contacts())
+        parse_s = time.perf_counter() - t0
+        assert count == args.contacts
+        tracemalloc.start()  # separate pass: tracing slows parsing down several times
+        for _ in source.contacts():
+            pass
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        cache = os.path.join(workdir, f"{label}.idx")
+        t0 = time.perf_counter()
+        index = load_or_build(source, cache)
+        build_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        token = source.change_token()
+        token_s = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        cached = ContactIndex.load(cache)
+        load_s = time.perf_counter() - t0
+        assert cached.token == token == index.token
+
+        samples = []
+        for handle in handles:
+            t = time.perf_counter()
+            cached.lookup(handle)
+            samples.append(time.perf_counter() - t)
+        samples.sort()
+        print(
+            f"{label:>5}: {size_mb:.1f} MB, parse {parse_s * 1000:.0f} ms "
+            f"({count / parse_s / 1000:.0f}k/s, peak {peak / 1e6:.2f} MB traced), "
+            f"parse+build+save {build_s * 1000:.0f} ms, warm start {(token_s + load_s) * 1000:.0f} ms "
+            f"(hash {token_s * 1000:.0f} + load {load_s * 1000:.0f}), "
+            f"lookup p50 {statistics.median(samples) * 1e6:.1f} us p99 {samples[int(len(samples) * 0.99)] * 1e6:.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
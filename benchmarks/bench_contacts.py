@@ -0,0 +1,66 @@
+"""
+Contact resolution throughput: index build from a fake address book, then
+names for a batch of Messages handles, one lookup at a time versus
+resolve_many (cold and memoized), plus the digit normalizer on its own
+against the regex it replaced.
+
+    python benchmarks/bench_contacts.py --contacts 50000 --handles 100000
+"""
+import argparse
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from contact_index import ContactIndex, digits  # noqa: E402
+from contact_sources import MemoryContactSource  # noqa: E402
+from contacts_synth import generate_contacts, handles_for  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=50_000)
+    parser.add_argument("--handles", type=int, default=100_000)
+    args = parser.parse_args()
+
+    contacts = generate_contacts(args.contacts, seed=1)
+    handles = handles_for(contacts, args.handles, seed=2)
+    source = MemoryContactSource(contacts)
+
+    t0 = time.perf_counter()
+    index = ContactIndex.build(source)
+    build_s = time.perf_counter() - t0
+    print(f"{args.contacts:,} contacts, {args.handles:,} handles ({len(set(handles)):,} distinct)")
+    print(f"build: {build_s * 1000:.0f} ms ({len(index.e164):,} numbers, {len(index.email):,} emails)")
+
+    t0 = time.perf_counter()
+    for h in handles:
+        re.sub(r"\D", "", h)
+    regex_s = time.perf_counter() - t0
+    digits("warm up")
+    t0 = time.perf_counter()
+    for h in handles:
+        digits(h)
+    table_s = time.perf_counter() - t0
+    print(f"digits: regex {regex_s * 1e9 / len(handles):.0f} ns/handle, "
+          f"translate {table_s * 1e9 / len(handles):.0f} ns/handle")
+
+    t0 = time.perf_counter()
+    names = [index.lookup(h) for h in handles]
+    lookup_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    assert index.resolve_many(handles) == names
+    cold_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    index.resolve_many(handles)
+    warm_s = time.perf_counter() - t0
+    resolved = sum(name is not None for name in names)
+    for label, seconds in (("lookup() each", lookup_s), ("resolve_many cold", cold_s), ("resolve_many warm", warm_s)):
+        print(f"{label:<18} {seconds * 1000:8.1f} ms  {len(handles) / seconds / 1e6:6.2f} M handles/s")
+    print(f"resolved {resolved:,} of {len(handles):,}")
+
+
+if __name__ == "__main__":
+    main()
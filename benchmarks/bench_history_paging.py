@@ -0,0 +1,76 @@
+"""
+Scroll back through the largest chat of a synthetic chat.db and compare the
+latency of keyset pages (messages_before) with LIMIT/OFFSET pages at the same
+depth.
+
+    python benchmarks/bench_history_paging.py --messages 1000000 --depth 100000
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+
+OFFSET_PAGE_SQL = """
+SELECT m.ROWID, m.date, m.is_from_me, m.text, h.id
+FROM chat_message_join cmj
+JOIN message m ON m.ROWID = cmj.message_id
+LEFT JOIN handle h ON h.ROWID = m.handle_id
+WHERE cmj.chat_id = ?
+ORDER BY cmj.message_date DESC, cmj.message_id DESC
+LIMIT ? OFFSET ?
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=5_000)
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--page", type=int, default=60)
+    parser.add_argument("--depth", type=int, default=100_000)
+    args = parser.parse_args()
+
+    db_path = args.db or f"/tmp/bench_chat_{args.messages}_{args.chats}.db"
+    if not os.path.exists(db_path):
+        generate_chat_db(db_path, args.messages, args.chats)
+
+    bridge = MessageBridge(db_path)
+    chat_id, size = bridge.cur.execute(
+        "SELECT chat_id, COUNT(*) AS n FROM chat_message_join GROUP BY chat_id ORDER BY n DESC LIMIT 1"
+    ).fetchone()
+    depth = min(args.depth, size - args.page)
+    print(f"chat {chat_id}: {size:,} messages, paging {args.page} at a time to depth {depth:,}")
+
+    report_every = max(depth // 5, args.page)
+    keyset = []
+    cursor = None
+    seen = 0
+    t_total = time.perf_counter()
+    while seen < depth:
+        t0 = time.perf_counter()
+        page = bridge.messages_before(chat_id, cursor, limit=args.page)
+        keyset.append(time.perf_counter() - t0)
+        cursor = page.cursor(len(page) - 1)
+        seen += len(page)
+        if seen % report_every < args.page:
+            print(f"  keyset depth {seen:>9,}: last page {keyset[-1] * 1000:.3f} ms")
+    print(
+        f"keyset: {len(keyset):,} pages in {time.perf_counter() - t_total:.2f}s, "
+        f"median {statistics.median(keyset) * 1000:.3f} ms, max {max(keyset) * 1000:.3f} ms"
+    )
+
+    for offset in (0, depth // 10, depth // 2, depth):
+        t0 = time.perf_counter()
+        bridge.cur.execute(OFFSET_PAGE_SQL, (chat_id, args.page, offset)).fetchall()
+        print(f"  offset {offset:>9,}: {(time.perf_counter() - t0) * 1000:.3f} ms")
+    bridge.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Memory held by cached message rows: list of 5-tuples vs MessageBatch.
+
+    python benchmarks/bench_message_memory.py --chats 200 --per-chat 1000
+"""
+import argparse
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from message_batch import MessageBatch  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    held = build()
+    gc.collect()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return held, current
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=200)
+    parser.add_argument("--per-chat", type=int, default=1_000)
+    parser.add_argument("--db", default=None)
+    args = parser.parse_args()
+
+    db_path = args.db or f"/tmp/bench_chat_{args.messages}_5000.db"
+    if not os.path.exists(db_path):
+        generate_chat_db(db_path, args.messages, 5_000)
+
+    bridge = MessageBridge(db_path)
+    chat_ids = [
+        row[0]
+        for row in bridge.conn.execute(
+            "SELECT chat_id FROM chat_message_join GROUP BY chat_id ORDER BY COUNT(*) DESC LIMIT ?",
+            (args.chats,),
+        )
+    ]
+    batches = bridge.last_messages_for_chats(chat_ids, limit=args.per_chat)
+    rows_by_chat = {chat_id: list(batch) for chat_id, batch in batches.items()}
+    del batches
+    n = sum(len(rows) for rows in rows_by_chat.values())
+
+    # Texts are shared by both layouts and allocated before measuring, so
+    # the numbers below are the per-message container overhead. The tuple
+    # layout gets a fresh date int and handle string per row, which is what
+    # sqlite3 hands back for every fetched row.
+    def as_tuples():
+        return {
+            chat_id: [(int(str(d)), f, t, None if h is None else (h + " ")[:-1], k) for d, f, t, h, k in rows]
+            for chat_id, rows in rows_by_chat.items()
+        }
+
+    def as_batches():
+        return {chat_id: MessageBatch(rows) for chat_id, rows in rows_by_chat.items()}
+
+    text_bytes = sum(sys.getsizeof(t) for rows in rows_by_chat.values() for _d, _f, t, _h, _k in rows)
+    _held, tuple_bytes = measure(as_tuples)
+    _held, batch_bytes = measure(as_batches)
+    print(f"{n:,} messages across {len(rows_by_chat)} chats (text itself: {text_bytes / n:.0f} B/msg)")
+    print(f"list of tuples: {tuple_bytes / n:>6.1f} B/msg overhead")
+    print(f"MessageBatch:   {batch_bytes / n:>6.1f} B/msg overhead ({tuple_bytes / batch_bytes:.1f}x smaller)")
+    bridge.close()
+
+
+if __name__ == "__main__":
+    main()
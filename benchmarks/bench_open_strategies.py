@@ -0,0 +1,70 @@
+"""
+Open-plus-query latency of MessageBridge's open strategies on a large
+synthetic chat.db in WAL mode.
+
+Before every open a message is appended (as Messages would between two app
+refreshes), so the copy strategy has to make a fresh snapshot each time.
+
+    python benchmarks/bench_open_strategies.py --messages 1000000
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db, insert_message  # noqa: E402
+from messages import OPEN_COPY, OPEN_READONLY, MessageBridge  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    chats = max(50, args.messages // 200)
+    base = f"/tmp/bench_synth_{args.messages}_{chats}.db"
+    if not os.path.exists(base):
+        generate_chat_db(base, args.messages, chats)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "chat.db")
+        shutil.copy(base, db_path)
+        writer = sqlite3.connect(db_path)
+        writer.execute("PRAGMA journal_mode=WAL")
+        size_mb = os.path.getsize(db_path) / 1e6
+        print(f"{db_path}: {args.messages:,} messages, {size_mb:.0f} MB")
+
+        date = 10**18
+        for mode in (OPEN_COPY, OPEN_READONLY):
+            opens, queries = [], []
+            for _ in range(args.repeat):
+                date += 1
+                insert_message(writer, 1, date, "new")
+                writer.commit()
+
+                bridge = MessageBridge(db_path, open_mode=mode)
+                t0 = time.perf_counter()
+                chats_page = bridge.top_chats(limit=50)
+                bridge.last_messages_in_chat(int(chats_page[0]["id"]), limit=60)
+                queries.append(time.perf_counter() - t0)
+                opens.append(bridge.open_report.seconds)
+                strategy = bridge.open_report.strategy
+                bridge.close()
+            open_ms = statistics.median(opens) * 1000
+            query_ms = statistics.median(queries) * 1000
+            print(
+                f"{mode:<9} -> {strategy:<9} open {open_ms:9.2f} ms   "
+                f"top_chats+page {query_ms:8.2f} ms   total {open_ms + query_ms:9.2f} ms"
+            )
+        writer.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Messages/sec for attributedBody decoding per worker count.
+
+    python benchmarks/bench_parallel_decode.py --blobs 300000 --workers 1 2 4 8
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from bench_attributed_body import make_corpus  # noqa: E402
+from parallel_decode import BodyDecoderPool  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--blobs", type=int, default=300_000)
+    parser.add_argument("--batch", type=int, default=50_000, help="blobs handed to decode() per call")
+    parser.add_argument("--chunk-size", type=int, default=2_000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count() or 1])
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.blobs)
+    batches = [corpus[i:i + args.batch] for i in range(0, len(corpus), args.batch)]
+    print(f"corpus: {len(corpus):,} blobs in batches of {args.batch:,}")
+
+    baseline = None
+    for workers in args.workers:
+        with BodyDecoderPool(workers=workers, chunk_size=args.chunk_size, min_parallel=0) as pool:
+            pool.decode(batches[0][: args.chunk_size * workers])  # start workers outside the timing
+            t0 = time.perf_counter()
+            for batch in batches:
+                pool.decode(batch)
+            elapsed = time.perf_counter() - t0
+        rate = len(corpus) / elapsed
+        baseline = baseline or rate
+        print(f"workers={workers:<3} {rate:>12,.0f} msgs/s  ({rate / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+What a consumer pays to get chat data: opening its own MessageBridge versus
+connecting to a running QueryDaemon, then per-request latency of history
+pages and top_chats either way.
+
+    python benchmarks/bench_query_daemon.py --messages 1000000 --requests 500
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import OPEN_COPY, OPEN_READONLY, MessageBridge  # noqa: E402
+from query_daemon import QueryClient, QueryDaemon  # noqa: E402
+
+
+def timed(fn, n: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) * 1000 / n
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--open-mode", choices=(OPEN_COPY, OPEN_READONLY), default=OPEN_COPY)
+    args = parser.parse_args()
+
+    chats = max(50, args.messages // 200)
+    db_path = f"/tmp/bench_synth_{args.messages}_{chats}.db"
+    if not os.path.exists(db_path):
+        generate_chat_db(db_path, args.messages, chats)
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "query.sock")
+    with QueryDaemon(socket_path, db_path, open_mode=args.open_mode, watch=False):
+        t0 = time.perf_counter()
+        bridge = MessageBridge(db_path, open_mode=args.open_mode)
+        open_ms = (time.perf_counter() - t0) * 1000
+        t0 = time.perf_counter()
+        client = QueryClient(socket_path)
+        client.ping()
+        connect_ms = (time.perf_counter() - t0) * 1000
+        print(f"{args.messages:,} messages, open mode {args.open_mode}")
+        print(f"first query ready: own bridge {open_ms:.1f} ms, daemon client {connect_ms:.2f} ms")
+
+        chat_ids = [int(c["id"]) for c in bridge.top_chats(limit=200)]
+        for name, source in (("direct", bridge), ("daemon", client)):
+            rng = random.Random(1)
+            source.top_chats(limit=50)  # warm the daemon's reader for this connection
+            page_ms = timed(lambda: source.last_messages_in_chat(rng.choice(chat_ids), limit=60), args.requests)
+            top_ms = timed(lambda: source.top_chats(limit=50), max(1, args.requests // 10))
+            print(f"{name}: history page {page_ms:.3f} ms, top_chats {top_ms:.2f} ms")
+        client.close()
+        bridge.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+Throughput of a ReaderPool under a mixed read workload (top_chats, history
+pages, latest-conversation batches) as the number of threads grows.
+
+    python benchmarks/bench_reader_pool.py --messages 1000000 --threads 1 2 4 8
+"""
+import argparse
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import OPEN_COPY, OPEN_READONLY  # noqa: E402
+from reader_pool import ReaderPool  # noqa: E402
+
+
+def workload(pool: ReaderPool, ops: int, seed: int, chat_ids) -> None:
+    rng = random.Random(seed)
+    for _ in range(ops):
+        bridge = pool.bridge()
+        roll = rng.random()
+        if roll < 0.2:
+            bridge.top_chats(limit=50)
+        elif roll < 0.9:
+            bridge.last_messages_in_chat(rng.choice(chat_ids), limit=60)
+        else:
+            bridge.last_messages_for_chats(rng.sample(chat_ids, 5), limit=100)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--ops", type=int, default=400, help="operations per run, split across threads")
+    parser.add_argument("--open-mode", choices=(OPEN_COPY, OPEN_READONLY), default=OPEN_COPY)
+    args = parser.parse_args()
+
+    chats = max(50, args.messages // 200)
+    db_path = f"/tmp/bench_synth_{args.messages}_{chats}.db"
+    if not os.path.exists(db_path):
+        generate_chat_db(db_path, args.messages, chats)
+
+    print(f"{os.cpu_count()} CPUs, {args.messages:,} messages, open mode {args.open_mode}")
+    base = None
+    for n in args.threads:
+        with ReaderPool(db_path, open_mode=args.open_mode) as pool:
+            chat_ids = [int(c["id"]) for c in pool.bridge().top_chats(limit=200)]
+            per_thread = args.ops // n
+            ready = threading.Barrier(n + 1)
+
+            def run(seed: int) -> None:
+                workload(pool, 1, seed, chat_ids)  # open this thread's connection first
+                ready.wait()
+                workload(pool, per_thread, seed, chat_ids)
+
+            threads = [threading.Thread(target=run, args=(i,)) for i in range(n)]
+            for t in threads:
+                t.start()
+            ready.wait()
+            t0 = time.perf_counter()
+            for t in threads:
+                t.join()
+            elapsed = time.perf_counter() - t0
+        rate = per_thread * n / elapsed
+        base = base or rate
+        print(f"{n:>3} threads: {rate:8.1f} ops/s  ({rate / base:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Recipient search latency per keystroke: index N fake contacts plus M chats,
+then type each query one character at a time and time every search.
+
+    python benchmarks/bench_recipient_search.py --contacts 50000 --chats 10000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from contact_index import ContactIndex  # noqa: E402
+from contact_sources import MemoryContactSource  # noqa: E402
+from contacts_synth import generate_contacts, handles_for  # noqa: E402
+from recipient_index import RecipientIndex  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--contacts", type=int, default=50_000)
+    parser.add_argument("--chats", type=int, default=10_000)
+    parser.add_argument("--queries", type=int, default=300)
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    contacts = generate_contacts(args.contacts, seed=1)
+    contact_index = ContactIndex.build(MemoryContactSource(contacts))
+    handles = handles_for(contacts, args.chats * 2, seed=2)
+    chats = []
+    for chat_id in range(args.chats, 0, -1):
+        if rng.random() < 0.15:
+            members = rng.sample(handles, rng.randint(3, 6))
+            chats.append((chat_id, rng.choice(("Family", "Team", "Book club", None)), f"chat{chat_id}", members))
+        else:
+            chats.append((chat_id, None, handles[chat_id], [handles[chat_id]]))
+
+    t0 = time.perf_counter()
+    index = RecipientIndex.build(chats, contact_index)
+    build_s = time.perf_counter() - t0
+    print(f"{len(index):,} recipients from {args.contacts:,} contacts and {args.chats:,} chats, "
+          f"built in {build_s * 1000:.0f} ms")
+
+    queries = []
+    for _ in range(args.queries):
+        name = rng.choice(index.recipients).name
+        word = rng.choice(name.split())
+        if rng.random() < 0.2 and len(word) > 3:  # a typo
+            i = rng.randrange(len(word) - 1)
+            word = word[:i] + word[i + 1] + word[i] + word[i + 2:]
+        queries.append(word[:8])
+
+    by_length = {}
+    for query in queries:
+        for n in range(1, len(query) + 1):
+            t = time.perf_counter()
+            index.search(query[:n], limit=10)
+            by_length.setdefault(min(n, 5), []).append(time.perf_counter() - t)
+    everything = sorted(s for samples in by_length.values() for s in samples)
+    for n, samples in sorted(by_length.items()):
+        samples.sort()
+        label = f"{n}+ chars" if n == 5 else f"{n} chars"
+        print(f"{label:>8}: p50 {statistics.median(samples) * 1000:6.2f} ms  "
+              f"p95 {samples[int(len(samples) * 0.95)] * 1000:6.2f} ms")
+    print(f"     all: p50 {statistics.median(everything) * 1000:6.2f} ms  "
+          f"p95 {everything[int(len(everything) * 0.95)] * 1000:6.2f} ms  max {everything[-1] * 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
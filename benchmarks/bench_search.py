@@ -0,0 +1,67 @@
+"""
+Build the FTS5 sidecar over a synthetic chat.db and time keyword searches.
+
+    python benchmarks/bench_search.py --messages 1000000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+from search_index import MessageSearchIndex  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=5_000)
+    parser.add_argument("--db", default=None)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db_path = args.db or f"/tmp/bench_chat_{args.messages}_{args.chats}.db"
+    if not os.path.exists(db_path):
+        generate_chat_db(db_path, args.messages, args.chats)
+
+    bridge = MessageBridge(db_path)
+    with tempfile.TemporaryDirectory() as tmp:
+        index = MessageSearchIndex(os.path.join(tmp, "search.db"))
+        t0 = time.perf_counter()
+        indexed = index.update(bridge)
+        print(f"indexed {indexed:,} messages in {time.perf_counter() - t0:.1f}s")
+
+        # Latency tracks how many documents match (BM25 scores every hit), so
+        # report terms across the selectivity range found in the index.
+        index.conn.execute("CREATE VIRTUAL TABLE temp.vocab USING fts5vocab(main, 'message_fts', 'col')")
+        terms = [
+            row[0]
+            for row in index.conn.execute("SELECT term FROM temp.vocab WHERE col = 'text' ORDER BY doc ASC")
+        ]
+        probes = [terms[0], terms[len(terms) // 2], terms[-1], "zzzznomatch"]
+        for term in probes:
+            (matches,) = index.conn.execute(
+                "SELECT COALESCE(SUM(doc), 0) FROM temp.vocab WHERE col = 'text' AND term = ?", (term,)
+            ).fetchone()
+            samples = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                index.search(term, limit=20)
+                samples.append(time.perf_counter() - t0)
+            print(f"search {term!r:<16} {matches:>9,} matching docs  {statistics.median(samples) * 1000:>8.2f} ms")
+
+        chat_id = bridge.top_chats(limit=1)[0]["id"]
+        t0 = time.perf_counter()
+        index.search(probes[-2], limit=20, chat_id=int(chat_id))
+        print(f"search {probes[-2]!r} in chat {chat_id}: {(time.perf_counter() - t0) * 1000:.2f} ms")
+        index.close()
+    bridge.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+MessageBridge benchmark suite over synthetic chat.dbs of increasing size.
+
+Times top_chats, last_messages_in_chat, last_100_messages_for_latest_conversations
+and a snapshot copy at each scale and compares the medians with a stored
+baseline. Exits non-zero when something regressed.
+
+    python benchmarks/bench_suite.py                       # 10k, 100k
+    python benchmarks/bench_suite.py --scales 10000 100000 1000000 10000000
+    python benchmarks/bench_suite.py --save-baseline       # record this machine's numbers
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+from snapshots import SnapshotManager  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+
+
+def chats_for(messages: int) -> int:
+    return max(50, messages // 200)
+
+
+def db_for(messages: int) -> str:
+    path = f"/tmp/bench_synth_{messages}_{chats_for(messages)}.db"
+    if not os.path.exists(path):
+        t0 = time.perf_counter()
+        generate_chat_db(path + ".tmp", messages, chats_for(messages))
+        os.replace(path + ".tmp", path)
+        print(f"  generated {path} in {time.perf_counter() - t0:.1f}s")
+    return path
+
+
+def median_ms(fn: Callable[[], object], repeat: int) -> float:
+    fn()  # warm the page cache and statement cache
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1000
+
+
+def run_scale(messages: int, repeat: int) -> Dict[str, float]:
+    db_path = db_for(messages)
+    bridge = MessageBridge(db_path)
+    (busiest,) = bridge.cur.execute(
+        "SELECT chat_id FROM chat_message_join GROUP BY chat_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()
+
+    def latest_conversations():
+        bridge._body_cache.clear()  # measure attributedBody decoding too
+        bridge.last_100_messages_for_latest_conversations(5)
+
+    results = {
+        "top_chats": median_ms(lambda: bridge.top_chats(limit=50), repeat),
+        "last_messages_in_chat": median_ms(lambda: bridge.last_messages_in_chat(busiest, limit=60), repeat),
+        "last_100_messages_for_latest_conversations": median_ms(latest_conversations, repeat),
+    }
+    bridge.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        def snapshot_copy():
+            root = tempfile.mkdtemp(dir=tmp)
+            SnapshotManager(db_path, root).acquire().release()
+            shutil.rmtree(root)
+
+        results["snapshot_copy"] = median_ms(snapshot_copy, max(3, repeat // 2))
+    return results
+
+
+def compare(results, baseline, threshold: float, min_ms: float):
+    regressions = []
+    for scale, cases in results.items():
+        for case, ms in cases.items():
+            base = baseline.get(scale, {}).get(case)
+            if base is None:
+                continue
+            if ms > base * (1 + threshold) and ms - base > min_ms:
+                regressions.append((scale, case, base, ms))
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=7)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = 25%%")
+    parser.add_argument("--min-ms", type=float, default=0.5, help="ignore slowdowns smaller than this")
+    args = parser.parse_args()
+
+    results: Dict[str, Dict[str, float]] = {}
+    for messages in args.scales:
+        print(f"{messages:,} messages / {chats_for(messages):,} chats")
+        results[str(messages)] = run_scale(messages, args.repeat)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print(f"\n{'scale':>10}  {'case':<44} {'ms':>10} {'baseline':>10} {'change':>8}")
+    for scale, cases in results.items():
+        for case, ms in cases.items():
+            base = baseline.get(scale, {}).get(case)
+            change = f"{(ms / base - 1) * 100:+.0f}%" if base else ""
+            base_text = f"{base:.2f}" if base else "-"
+            print(f"{int(scale):>10,}  {case:<44} {ms:>10.2f} {base_text:>10} {change:>8}")
+
+    if args.save_baseline:
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\nbaseline written to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.threshold, args.min_ms)
+    for scale, case, base, ms in regressions:
+        print(f"REGRESSION {case} @ {int(scale):,}: {base:.2f} ms -> {ms:.2f} ms")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
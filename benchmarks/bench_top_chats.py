@@ -0,0 +1,104 @@
+"""
+top_chats latency on a synthetic chat.db, legacy query vs current.
+
+    python benchmarks/bench_top_chats.py --messages 1000000 --chats 5000
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from chatdb_synth import generate_chat_db  # noqa: E402
+from messages import MessageBridge  # noqa: E402
+
+# The pre-rewrite top_chats: correlated MAX(date) per joined row, then one
+# participants query per returned chat.
+LEGACY_TOP_CHATS_SQL = """
+    SELECT
+        c.ROWID AS chat_id,
+        c.display_name,
+        c.chat_identifier,
+        m.date,
+        m.is_from_me,
+        COALESCE(m.text, '') AS text,
+        h.id AS handle
+    FROM chat c
+    JOIN chat_message_join cmj ON cmj.chat_id = c.ROWID
+    JOIN message m ON m.ROWID = cmj.message_id
+    LEFT JOIN handle h ON h.ROWID = m.handle_id
+    WHERE m.date = (
+        SELECT MAX(m2.date)
+        FROM chat_message_join cmj2
+        JOIN message m2 ON m2.ROWID = cmj2.message_id
+        WHERE cmj2.chat_id = c.ROWID
+    )
+    ORDER BY m.date DESC
+    LIMIT ?
+"""
+
+LEGACY_PARTICIPANTS_SQL = """
+    SELECT DISTINCT h.id
+    FROM chat_handle_join chj
+    JOIN handle h ON h.ROWID = chj.handle_id
+    WHERE chj.chat_id = ?
+"""
+
+
+def legacy_top_chats(conn: sqlite3.Connection, limit: int, timeout: float):
+    deadline = time.perf_counter() + timeout
+    conn.set_progress_handler(lambda: int(time.perf_counter() > deadline), 100_000)
+    try:
+        rows = conn.execute(LEGACY_TOP_CHATS_SQL, (limit,)).fetchall()
+        for row in rows:
+            conn.execute(LEGACY_PARTICIPANTS_SQL, (row[0],)).fetchall()
+        return rows
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--chats", type=int, default=5_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--legacy-timeout", type=float, default=60.0)
+    parser.add_argument("--db", default=None, help="reuse/create the synthetic db at this path")
+    args = parser.parse_args()
+
+    db_path = args.db or f"/tmp/bench_chat_{args.messages}_{args.chats}.db"
+    if not os.path.exists(db_path):
+        t0 = time.perf_counter()
+        generate_chat_db(db_path, args.messages, args.chats)
+        print(f"generated {db_path} in {time.perf_counter() - t0:.1f}s")
+
+    bridge = MessageBridge(db_path)
+    current = timed(lambda: bridge.top_chats(limit=args.limit), args.repeat)
+    print(f"top_chats current: {current * 1000:.1f} ms (median of {args.repeat})")
+
+    conn = sqlite3.connect(bridge.tmp)
+    try:
+        legacy = timed(lambda: legacy_top_chats(conn, args.limit, args.legacy_timeout), 1)
+        print(f"top_chats legacy:  {legacy * 1000:.1f} ms ({legacy / current:.0f}x slower)")
+    except sqlite3.OperationalError:
+        print(f"top_chats legacy:  > {args.legacy_timeout:.0f} s (interrupted)")
+    finally:
+        conn.close()
+        bridge.close()
+
+
+if __name__ == "__main__":
+    main()
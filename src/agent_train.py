@@ -1,11 +1,14 @@
 from __future__ import annotations
 
+import collections.abc
 import hashlib
 import json
 import re
+import time
+from collections import deque
 from dataclasses import dataclass, field
 from datetime import datetime, timedelta
-from typing import Iterable, List, Optional, Protocol, Sequence, Tuple
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Protocol, Sequence, Set, Tuple
 
 
 SYSTEM_PROMPT = (
@@ -127,6 +130,75 @@ class InMemoryMetadataStore:
         return self._models.get((user_id, latest_version))
 
 
+_URL_PATTERN = re.compile(r"https?://\S+", re.IGNORECASE)
+_ALNUM_PATTERN = re.compile(r"[A-Za-z0-9]")
+_WHITESPACE_PATTERN = re.compile(r"\s+")
+_PHONE_PATTERN = re.compile(r"\b\+?\d[\d\-\(\) ]{7,}\d\b")
+_EMAIL_PATTERN = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_ADDRESS_PATTERN = re.compile(
+    r"\b\d{1,5}\s+[A-Za-z0-9 .'-]{2,}\s+(Street|St|Avenue|Ave|Road|Rd|Lane|Ln|Boulevard|Blvd|Drive|Dr)\b",
+    re.IGNORECASE,
+)
+
+# A pipeline stage: (name, step). step maps one record to the record to pass
+# on (the same one or a rewritten copy) or to None to drop it.
+Stage = Tuple[str, Callable[[MessageRecord], Optional[MessageRecord]]]
+
+
+@dataclass
+class StageStats:
+    name: str
+    records_in: int = 0
+    records_out: int = 0
+    seconds: float = 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "in": self.records_in,
+            "out": self.records_out,
+            "dropped": self.records_in - self.records_out,
+            "ms": self.seconds * 1000,
+            "us_per_record": self.seconds * 1e6 / self.records_in if self.records_in else 0.0,
+        }
+
+
+@dataclass
+class PipelineStats:
+    """
+    Per-stage record counts and time spent in each stage (its own work
+    only, not upstream stages), plus what the token count stage saw: the
+    surviving messages, their tokens, their time range and how many came
+    earlier than the message before them.
+    """
+
+    stages: List[StageStats] = field(default_factory=list)
+    messages: int = 0
+    tokens: int = 0
+    first_timestamp: Optional[datetime] = None
+    last_timestamp: Optional[datetime] = None
+    out_of_order: int = 0
+
+    def stage(self, name: str) -> StageStats:
+        for stats in self.stages:
+            if stats.name == name:
+                return stats
+        stats = StageStats(name)
+        self.stages.append(stats)
+        return stats
+
+    def as_dict(self) -> Dict[str, Dict[str, Any]]:
+        return {s.name: s.as_dict() for s in self.stages}
+
+    def report(self) -> str:
+        lines = [f"{'stage':<10} {'in':>9} {'out':>9} {'dropped':>9} {'total ms':>10} {'us/rec':>7}"]
+        for name, s in self.as_dict().items():
+            lines.append(
+                f"{name:<10} {s['in']:>9} {s['out']:>9} {s['dropped']:>9} {s['ms']:>10.1f} {s['us_per_record']:>7.2f}"
+            )
+        lines.append(f"{self.messages} messages, {self.tokens} tokens")
+        return "\n".join(lines)
+
+
 def filter_last_90_days(
     messages: Iterable[MessageRecord],
     now: Optional[datetime] = None,
@@ -141,66 +213,176 @@ def filter_sent_messages(messages: Iterable[MessageRecord]) -> List[MessageRecor
 
 
 def estimate_tokens(text: str) -> int:
-    return len(re.findall(r"\S+", text))
+    # Same count as re.findall(r"\S+"), without building the match list
+    return len(text.split())
 
 
 def _is_url_only(text: str) -> bool:
-    stripped = re.sub(r"https?://\S+", "", text, flags=re.IGNORECASE).strip()
+    stripped = _URL_PATTERN.sub("", text).strip()
     return stripped == ""
 
 
 def _is_emoji_only(text: str) -> bool:
-    return re.search(r"[A-Za-z0-9]", text) is None and text.strip() != ""
+    return _ALNUM_PATTERN.search(text) is None and text.strip() != ""
 
 
 def _redact_pii(text: str) -> str:
-    phone_pattern = re.compile(r"\b\+?\d[\d\-\(\) ]{7,}\d\b")
-    email_pattern = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
-    address_pattern = re.compile(
-        r"\b\d{1,5}\s+[A-Za-z0-9 .'-]{2,}\s+(Street|St|Avenue|Ave|Road|Rd|Lane|Ln|Boulevard|Blvd|Drive|Dr)\b",
-        re.IGNORECASE,
+    text = _PHONE_PATTERN.sub("[REDACTED_PHONE]", text)
+    text = _EMAIL_PATTERN.sub("[REDACTED_EMAIL]", text)
+    text = _ADDRESS_PATTERN.sub("[REDACTED_ADDRESS]", text)
+    return text
+
+
+def _with_text(msg: MessageRecord, text: str) -> MessageRecord:
+    if text == msg.text:
+        return msg
+    return MessageRecord(
+        message_id=msg.message_id,
+        timestamp=msg.timestamp,
+        text=text,
+        conversation_id=msg.conversation_id,
+        recipient_count=msg.recipient_count,
     )
 
-    text = phone_pattern.sub("[REDACTED_PHONE]", text)
-    text = email_pattern.sub("[REDACTED_EMAIL]", text)
-    text = address_pattern.sub("[REDACTED_ADDRESS]", text)
-    return text
 
+def recent_stage(now: datetime, days: int = 90) -> Stage:
+    cutoff = now - timedelta(days=days)
 
-def clean_messages(messages: Iterable[MessageRecord], config: TrainingConfig) -> List[MessageRecord]:
-    cleaned: List[MessageRecord] = []
-    seen: set[str] = set()
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
+        return msg if msg.timestamp >= cutoff else None
 
-    for msg in messages:
+    return "recent", step
+
+
+def sent_stage() -> Stage:
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
+        return msg if msg.text is not None else None
+
+    return "sent", step
+
+
+def clean_stage(config: TrainingConfig) -> Stage:
+    """
+    Strip whitespace; drop empty, short, URL-only and emoji-only messages.
+    """
+    threshold = config.short_message_threshold
+
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
         text = (msg.text or "").strip()
-        if not text:
-            continue
-        if len(text) < config.short_message_threshold:
-            continue
-        if _is_url_only(text):
-            continue
-        if _is_emoji_only(text):
-            continue
-
-        normalized = re.sub(r"\s+", " ", text).lower()
-        if normalized in seen:
-            continue
-        seen.add(normalized)
-
-        if config.redact_pii:
-            text = _redact_pii(text)
-
-        cleaned.append(
-            MessageRecord(
-                message_id=msg.message_id,
-                timestamp=msg.timestamp,
-                text=text,
-                conversation_id=msg.conversation_id,
-                recipient_count=msg.recipient_count,
-            )
-        )
+        if not text or len(text) < threshold or _is_url_only(text) or _is_emoji_only(text):
+            return None
+        return _with_text(msg, text)
+
+    return "clean", step
+
+
+def redact_stage() -> Stage:
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
+        return _with_text(msg, _redact_pii(msg.text))
 
-    return cleaned
+    return "redact", step
+
+
+def dedupe_stage() -> Stage:
+    """
+    Drop repeats of a text seen earlier, ignoring case and whitespace runs.
+    Only a 64-bit digest of each distinct text is remembered, not the text.
+    """
+    seen: Set[bytes] = set()
+
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
+        normalized = _WHITESPACE_PATTERN.sub(" ", msg.text).lower()
+        key = hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+        if key in seen:
+            return None
+        seen.add(key)
+        return msg
+
+    return "dedupe", step
+
+
+def token_count_stage(stats: PipelineStats) -> Stage:
+    previous: Optional[datetime] = None
+
+    def step(msg: MessageRecord) -> Optional[MessageRecord]:
+        nonlocal previous
+        stats.messages += 1
+        stats.tokens += estimate_tokens(msg.text)
+        ts = msg.timestamp
+        if previous is not None and ts < previous:
+            stats.out_of_order += 1
+        previous = ts
+        if stats.first_timestamp is None or ts < stats.first_timestamp:
+            stats.first_timestamp = ts
+        if stats.last_timestamp is None or ts > stats.last_timestamp:
+            stats.last_timestamp = ts
+        return msg
+
+    return "tokens", step
+
+
+def training_stages(
+    config: TrainingConfig,
+    stats: PipelineStats,
+    now: Optional[datetime] = None,
+) -> List[Stage]:
+    """
+    The standard stages: last 90 days before `now` (no date filter when
+    None), sent, clean, redact (if config.redact_pii), dedupe, token count.
+    """
+    stages = [recent_stage(now)] if now is not None else []
+    stages += [sent_stage(), clean_stage(config)]
+    if config.redact_pii:
+        stages.append(redact_stage())
+    stages += [dedupe_stage(), token_count_stage(stats)]
+    return stages
+
+
+def run_pipeline(
+    messages: Iterable[MessageRecord],
+    stages: Sequence[Stage],
+    stats: Optional[PipelineStats] = None,
+) -> Iterator[MessageRecord]:
+    """
+    Push each record through `stages` in turn and yield the survivors.
+    Records are pulled from `messages` one at a time, so nothing upstream
+    or downstream is held besides what the stages themselves keep.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    steps = [(step, stats.stage(name)) for name, step in stages]
+    return _run_steps(messages, steps)
+
+
+def _run_steps(
+    messages: Iterable[MessageRecord],
+    steps: List[Tuple[Callable[[MessageRecord], Optional[MessageRecord]], StageStats]],
+) -> Iterator[MessageRecord]:
+    clock = time.perf_counter
+    for msg in messages:
+        for step, stage in steps:
+            stage.records_in += 1
+            start = clock()
+            msg = step(msg)
+            stage.seconds += clock() - start
+            if msg is None:
+                break
+            stage.records_out += 1
+        else:
+            yield msg
+
+
+def stream_clean(
+    messages: Iterable[MessageRecord],
+    config: TrainingConfig,
+    now: Optional[datetime] = None,
+    stats: Optional[PipelineStats] = None,
+) -> Iterator[MessageRecord]:
+    stats = stats if stats is not None else PipelineStats()
+    return run_pipeline(messages, training_stages(config, stats, now), stats)
+
+
+def clean_messages(messages: Iterable[MessageRecord], config: TrainingConfig) -> List[MessageRecord]:
+    return list(stream_clean(messages, config))
 
 
 def split_train_holdout(
@@ -217,34 +399,83 @@ def split_train_holdout(
     return train, holdout
 
 
-def build_dataset(
-    messages: Sequence[MessageRecord],
+def training_line(msg: MessageRecord, config: TrainingConfig) -> str:
+    payload = {
+        "messages": [
+            {"role": "system", "content": config.system_prompt},
+            {"role": "user", "content": config.user_prompt},
+            {"role": "assistant", "content": msg.text},
+        ]
+    }
+    return json.dumps(payload, ensure_ascii=False)
+
+
+def stream_dataset(
+    messages: Iterable[MessageRecord],
     config: TrainingConfig,
+    stats: Optional[PipelineStats] = None,
 ) -> TrainingDataset:
-    train, holdout = split_train_holdout(messages, config.holdout_ratio)
+    """
+    build_dataset() over records arriving in timestamp order, in one pass
+    without knowing their number up front.
+
+    Only the newest holdout_ratio of the records seen so far is buffered.
+    That tail only grows as records arrive, so a record pushed out of it
+    belongs to the training split whatever follows, and is serialized and
+    hashed right away. Raises ValueError on a record older than the one
+    before it, since the split would no longer hold out the newest records.
+    """
+    stats = stats if stats is not None else PipelineStats()
+    serialize = stats.stage("serialize")
+    keep_ratio = 1 - config.holdout_ratio
+    clock = time.perf_counter
+    tail: Deque[MessageRecord] = deque()
     lines: List[str] = []
+    digest = hashlib.sha256()
     token_estimate = 0
+    count = 0
 
-    for msg in train:
-        payload = {
-            "messages": [
-                {"role": "system", "content": config.system_prompt},
-                {"role": "user", "content": config.user_prompt},
-                {"role": "assistant", "content": msg.text},
-            ]
-        }
-        lines.append(json.dumps(payload, ensure_ascii=False))
-        token_estimate += estimate_tokens(msg.text)
+    previous: Optional[datetime] = None
+
+    for msg in messages:
+        if previous is not None and msg.timestamp < previous:
+            raise ValueError(
+                f"record {msg.message_id} is older than the one before it; "
+                "use build_dataset() for records not in timestamp order"
+            )
+        previous = msg.timestamp
+        count += 1
+        tail.append(msg)
+        holdout_size = count - max(1, int(count * keep_ratio))
+        while len(tail) > holdout_size:
+            start = clock()
+            msg = tail.popleft()
+            serialize.records_in += 1
+            line = training_line(msg, config)
+            if lines:
+                digest.update(b"\n")
+            digest.update(line.encode("utf-8"))
+            lines.append(line)
+            token_estimate += estimate_tokens(msg.text)
+            serialize.records_out += 1
+            serialize.seconds += clock() - start
 
-    dataset_hash = hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()
     return TrainingDataset(
         train_lines=tuple(lines),
-        holdout=tuple(holdout),
+        holdout=tuple(tail),
         token_estimate=token_estimate,
-        dataset_hash=dataset_hash,
+        dataset_hash=digest.hexdigest(),
     )
 
 
+def build_dataset(
+    messages: Sequence[MessageRecord],
+    config: TrainingConfig,
+    stats: Optional[PipelineStats] = None,
+) -> TrainingDataset:
+    return stream_dataset(sorted(messages, key=lambda m: m.timestamp), config, stats)
+
+
 def should_train(
     now: datetime,
     last_trained_at: Optional[datetime],
@@ -286,42 +517,61 @@ class FineTuningOrchestrator:
         self._openai_client = openai_client
         self._metadata_store = metadata_store
         self._config = config
+        self.last_pipeline_stats: Optional[PipelineStats] = None
 
     def start_training(
         self,
         user_id: str,
-        messages: Sequence[MessageRecord],
+        messages: Iterable[MessageRecord],
         now: Optional[datetime] = None,
     ) -> ModelMetadata:
+        """
+        messages is read twice: once to count and, only if training goes
+        ahead, again to build the dataset. Pass a sequence or a re-iterable
+        view over chat.db, not a one-shot iterator. Records in timestamp
+        order are streamed without being held in memory; otherwise the
+        cleaned records are sorted before the split. Stage counts and
+        timings of the counting pass, plus the serialize stage, are left in
+        last_pipeline_stats.
+        """
+        if isinstance(messages, collections.abc.Iterator):
+            raise TypeError("start_training() reads messages twice; pass a sequence or re-iterable, not an iterator")
         now = now or datetime.now()
-        filtered = filter_last_90_days(messages, now=now)
-        cleaned = clean_messages(filtered, self._config)
-        token_estimate = sum(estimate_tokens(msg.text) for msg in cleaned)
+        stats = PipelineStats()
+        self.last_pipeline_stats = stats
+        for _msg in stream_clean(messages, self._config, now, stats):
+            pass
+        num_messages = stats.messages
+        token_estimate = stats.tokens
 
         latest_metadata = self._metadata_store.get_latest_model_metadata(user_id)
         last_trained_at = latest_metadata.completed_at if latest_metadata else None
         previous_count = latest_metadata.num_messages if latest_metadata else None
 
-        if not should_train(now, last_trained_at, previous_count, len(cleaned)):
-            return self._create_skipped_metadata(user_id, now, len(cleaned), token_estimate)
+        if not should_train(now, last_trained_at, previous_count, num_messages):
+            return self._create_skipped_metadata(user_id, now, num_messages, token_estimate)
 
-        if len(cleaned) < self._config.min_messages or token_estimate < self._config.min_tokens:
+        if num_messages < self._config.min_messages or token_estimate < self._config.min_tokens:
             return self._create_failed_metadata(
                 user_id,
                 now,
-                len(cleaned),
+                num_messages,
                 token_estimate,
                 "failed_insufficient_data",
             )
 
-        training_data = build_dataset(cleaned, self._config)
+        cleaned = stream_clean(messages, self._config, now)
+        if stats.out_of_order:
+            training_data = build_dataset(list(cleaned), self._config, stats)
+        else:
+            training_data = stream_dataset(cleaned, self._config, stats)
         model_metadata = self._create_new_metadata(
             user_id,
             now,
-            len(cleaned),
+            num_messages,
             training_data.token_estimate,
             training_data.dataset_hash,
-            cleaned,
+            (stats.first_timestamp, stats.last_timestamp),
         )
 
         training_file_id = self._openai_client.upload_training_file(training_data.to_jsonl())
@@ -355,7 +605,7 @@ class FineTuningOrchestrator:
         num_messages: int,
         token_estimate: int,
         dataset_hash: str,
-        messages: Sequence[MessageRecord],
+        training_data_range: Tuple[datetime, datetime],
     ) -> ModelMetadata:
         latest = self._metadata_store.get_latest_model_metadata(user_id)
         version = (latest.version + 1) if latest else 1
@@ -365,7 +615,7 @@ class FineTuningOrchestrator:
             base_model=self._config.base_model,
             status="queued",
             created_at=now,
-            training_data_range=(messages[0].timestamp, messages[-1].timestamp),
+            training_data_range=training_data_range,
             num_messages=num_messages,
             token_estimate=token_estimate,
             dataset_hash=dataset_hash,
@@ -0,0 +1,313 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    from PySide6.QtCore import Qt
+    from PySide6.QtGui import QImageReader
+except ImportError:
+    QImageReader = None
+
+DEFAULT_THUMBNAIL_DIR = os.path.expanduser("~/Library/Caches/AllInOne/thumbnails")
+THUMBNAIL_SIZE = 256  # longest edge, px
+THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+FAILED_RENDER_KEYS = 4096  # unrenderable (path, size, mtime) keys remembered
+ATTACHMENT_LOOKUP_CHUNK = 900  # message ROWIDs per query, under SQLite's variable limit
+
+# (src_path, dst_path, max_edge) -> True if a PNG thumbnail was written
+Renderer = Callable[[str, str, int], bool]
+
+
+@dataclass(frozen=True)
+class AttachmentInfo:
+    attachment_rowid: int
+    message_rowid: int
+    path: Optional[str]  # attachment.filename with "~" expanded
+    name: str  # transfer_name, what the sender called the file
+    mime_type: Optional[str]
+    uti: Optional[str]
+    total_bytes: int
+    is_outgoing: int
+
+    @property
+    def is_image(self) -> bool:
+        return bool(self.mime_type) and self.mime_type.startswith("image/")
+
+
+def load_attachments(
+    conn: Union[sqlite3.Connection, sqlite3.Cursor],
+    message_rowids: Iterable[int],
+) -> Dict[int, List[AttachmentInfo]]:
+    """
+    Attachment metadata for a page of messages: one join over
+    message_attachment_join and attachment per chunk of ROWIDs, never one
+    query per message. Messages without attachments are absent from the
+    result; each list is in attachment order.
+    """
+    rowids = sorted({int(rowid) for rowid in message_rowids if rowid})
+    out: Dict[int, List[AttachmentInfo]] = {}
+    for start in range(0, len(rowids), ATTACHMENT_LOOKUP_CHUNK):
+        chunk = rowids[start:start + ATTACHMENT_LOOKUP_CHUNK]
+        placeholders = ",".join("?" for _ in chunk)
+        rows = conn.execute(f"""
+        SELECT
+            maj.message_id,
+            a.ROWID,
+            a.filename,
+            a.transfer_name,
+            a.mime_type,
+            a.uti,
+            a.total_bytes,
+            a.is_outgoing
+        FROM message_attachment_join maj
+        JOIN attachment a ON a.ROWID = maj.attachment_id
+        WHERE maj.message_id IN ({placeholders})
+        ORDER BY maj.message_id, a.ROWID
+        """, chunk).fetchall()
+        for message_id, attachment_id, filename, transfer_name, mime_type, uti, total_bytes, is_outgoing in rows:
+            path = os.path.expanduser(filename) if filename else None
+            name = transfer_name or (os.path.basename(filename) if filename else "Attachment")
+            out.setdefault(message_id, []).append(
+                AttachmentInfo(
+                    int(attachment_id),
+                    int(message_id),
+                    path,
+                    name,
+                    mime_type,
+                    uti,
+                    int(total_bytes or 0),
+                    int(is_outgoing or 0),
+                )
+            )
+    return out
+
+
+def format_size(num_bytes: int) -> str:
+    size = float(num_bytes)
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+def render_with_qt(src_path: str, dst_path: str, max_edge: int) -> bool:
+    # QImageReader (unlike QPixmap) is safe off the GUI thread, and
+    # setScaledSize lets JPEG decode straight at thumbnail resolution.
+    reader = QImageReader(src_path)
+    reader.setAutoTransform(True)
+    size = reader.size()
+    if size.isValid():
+        reader.setScaledSize(size.scaled(max_edge, max_edge, Qt.KeepAspectRatio))
+    image = reader.read()
+    return not image.isNull() and image.save(dst_path, "PNG")
+
+
+def render_with_sips(src_path: str, dst_path: str, max_edge: int) -> bool:
+    # Covers HEIC and the other formats Qt has no plugin for on macOS.
+    result = subprocess.run(
+        ["sips", "-Z", str(max_edge), "-s", "format", "png", src_path, "--out", dst_path],
+        capture_output=True,
+    )
+    return result.returncode == 0 and os.path.exists(dst_path)
+
+
+def default_renderer() -> Optional[Renderer]:
+    renderers: List[Renderer] = []
+    if QImageReader is not None:
+        renderers.append(render_with_qt)
+    if sys.platform == "darwin":
+        renderers.append(render_with_sips)
+    if not renderers:
+        return None
+
+    def render(src_path: str, dst_path: str, max_edge: int) -> bool:
+        for renderer in renderers:
+            try:
+                if renderer(src_path, dst_path, max_edge):
+                    return True
+            except Exception:
+                pass
+        return False
+
+    return render
+
+
+class ThumbnailCache:
+    """
+    Disk-backed LRU of attachment previews.
+
+    Thumbnails are PNGs named by a hash of (source path, size, mtime, edge),
+    so an edited or replaced file gets a fresh preview. get() only looks at
+    the cache; request() renders misses on a small worker pool and resolves
+    a Future with the thumbnail path (None if there is nothing to show).
+    Callbacks run on the worker thread, so UI code has to hop back to its own
+    thread before touching widgets. A file that fails to render is not tried
+    again until its size or mtime changes. Least recently used files are deleted
+    once the directory grows past max_bytes; recency survives restarts
+    through the files' mtimes.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Optional[str] = None,
+        max_bytes: int = THUMBNAIL_CACHE_BYTES,
+        max_edge: int = THUMBNAIL_SIZE,
+        workers: int = 2,
+        renderer: Optional[Renderer] = None,
+    ) -> None:
+        self.cache_dir = cache_dir or DEFAULT_THUMBNAIL_DIR
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.renderer = renderer or default_renderer()
+        self._workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes, oldest first
+        self._total_bytes = 0
+        self._pending: Dict[str, Future] = {}
+        self._failed: "OrderedDict[str, None]" = OrderedDict()  # keys that didn't render
+        self.rendered = 0
+        self._load_index()
+
+    def _load_index(self) -> None:
+        found: List[Tuple[int, str, int]] = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith(".png"):
+                st = entry.stat()
+                found.append((st.st_mtime_ns, entry.name[:-4], st.st_size))
+        for _mtime, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def key_for(self, path: str) -> Optional[str]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        ident = f"{path}\0{st.st_size}\0{st.st_mtime_ns}\0{self.max_edge}"
+        return hashlib.sha1(ident.encode("utf-8", "surrogateescape")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key + ".png")
+
+    def get(self, attachment: AttachmentInfo) -> Optional[str]:
+        """
+        Cached thumbnail path, or None on a miss. Never renders.
+        """
+        if not attachment.is_image or not attachment.path:
+            return None
+        key = self.key_for(attachment.path)
+        if key is None:
+            return None
+        return self._hit(key)
+
+    def _hit(self, key: str) -> Optional[str]:
+        with self._lock:
+            if key not in self._entries:
+                return None
+            self._entries.move_to_end(key)
+        thumb = self._path(key)
+        try:
+            os.utime(thumb)
+        except OSError:
+            with self._lock:
+                self._forget(key)
+            return None
+        return thumb
+
+    def request(
+        self,
+        attachment: AttachmentInfo,
+        callback: Optional[Callable[[AttachmentInfo, Optional[str]], None]] = None,
+    ) -> "Future[Optional[str]]":
+        """
+        Thumbnail path as a Future, rendering in the background on a miss.
+        Concurrent requests for the same file share one render.
+        """
+        future: "Future[Optional[str]]"
+        key = self.key_for(attachment.path) if attachment.is_image and attachment.path else None
+        cached = self._hit(key) if key else None
+        with self._lock:
+            failed = key in self._failed
+        if key is None or cached is not None or failed or self.renderer is None:
+            future = Future()
+            future.set_result(cached)
+        else:
+            with self._lock:
+                future = self._pending.get(key)
+                if future is None:
+                    if self._executor is None:
+                        self._executor = ThreadPoolExecutor(self._workers, thread_name_prefix="thumbnail")
+                    future = self._executor.submit(self._render, key, attachment.path)
+                    self._pending[key] = future
+        if callback is not None:
+            future.add_done_callback(lambda f: callback(attachment, f.result() if not f.exception() else None))
+        return future
+
+    def _render(self, key: str, src_path: str) -> Optional[str]:
+        try:
+            fd, staging = tempfile.mkstemp(suffix=".png", dir=self.cache_dir, prefix=".render-")
+            os.close(fd)
+            try:
+                try:
+                    ok = self.renderer(src_path, staging, self.max_edge) and os.path.getsize(staging) > 0
+                except Exception:
+                    ok = False
+                if not ok:
+                    with self._lock:
+                        self._failed[key] = None
+                        if len(self._failed) > FAILED_RENDER_KEYS:
+                            self._failed.popitem(last=False)
+                    return None
+                thumb = self._path(key)
+                os.replace(staging, thumb)
+            finally:
+                if os.path.exists(staging):
+                    os.unlink(staging)
+            size = os.path.getsize(thumb)
+            with self._lock:
+                self._forget(key)
+                self._entries[key] = size
+                self._total_bytes += size
+                self.rendered += 1
+                self._evict()
+            return thumb
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def _forget(self, key: str) -> None:
+        size = self._entries.pop(key, None)
+        if size is not None:
+            self._total_bytes -= size
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            key, size = self._entries.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.unlink(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def total_bytes(self) -> int:
+        with self._lock:
+            return self._total_bytes
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
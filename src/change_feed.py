@@ -0,0 +1,320 @@
+from __future__ import annotations
+
+import logging
+import os
+import select
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple, Union
+
+from snapshots import DEFAULT_SOURCE_DB, SourceFingerprint, fingerprint
+
+DEBOUNCE_SECONDS = 0.15  # quiet period that ends a burst of writes
+MAX_DELAY_SECONDS = 1.0  # ...but never hold a change back longer than this
+STAT_POLL_SECONDS = 0.25  # fallback watcher interval where kqueue is missing
+ERROR_BACKOFF_SECONDS = 1.0  # pause after a failed wait or poll before retrying
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ChatActivity:
+    chat_id: int
+    new_messages: int
+    last_message_rowid: int
+
+
+@dataclass(frozen=True)
+class MessagesAdded:
+    """
+    New message ROWIDs in (since_rowid, max_rowid], grouped by chat.
+    """
+    chats: Tuple[ChatActivity, ...]
+    since_rowid: int
+    max_rowid: int
+
+    @property
+    def chat_ids(self) -> Tuple[int, ...]:
+        return tuple(chat.chat_id for chat in self.chats)
+
+
+@dataclass(frozen=True)
+class SourceChanged:
+    """
+    chat.db was written without adding messages (read receipts, edits,
+    deletes, checkpoints). Views that show more than new rows may refresh.
+    """
+    fingerprint: SourceFingerprint
+
+
+ChangeEvent = Union[MessagesAdded, SourceChanged]
+Subscriber = Callable[[ChangeEvent], None]
+
+
+class _StatWatcher:
+    # Portable fallback: compare db/WAL fingerprints on a short interval.
+    # A couple of stat() calls per tick, no database access while idle.
+
+    def __init__(self, db_path: str, interval: float = STAT_POLL_SECONDS) -> None:
+        self.db_path = db_path
+        self.interval = interval
+        self._last = fingerprint(db_path)
+        self._closed = threading.Event()
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._closed.is_set():
+            fp = fingerprint(self.db_path)
+            if fp != self._last:
+                self._last = fp
+                return True
+            remaining = self.interval if deadline is None else min(self.interval, deadline - time.monotonic())
+            if remaining <= 0:
+                return False
+            self._closed.wait(remaining)
+        return False
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class _KqueueWatcher:
+    # macOS/BSD: block on vnode events for the db, its WAL and the directory
+    # (which reports the WAL being created or removed by a checkpoint).
+
+    _FLAGS = getattr(select, "KQ_NOTE_WRITE", 0) | getattr(select, "KQ_NOTE_EXTEND", 0) \
+        | getattr(select, "KQ_NOTE_DELETE", 0) | getattr(select, "KQ_NOTE_RENAME", 0)
+
+    def __init__(self, db_path: str) -> None:
+        self.db_path = db_path
+        self._kq = select.kqueue()
+        self._fds: List[int] = []
+        self._closed = False
+        self._arm()
+
+    def _arm(self) -> None:
+        if self._closed:
+            return
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+        events = []
+        for path in (os.path.dirname(self.db_path) or ".", self.db_path, self.db_path + "-wal"):
+            try:
+                fd = os.open(path, os.O_RDONLY)
+            except OSError:
+                continue
+            self._fds.append(fd)
+            events.append(select.kevent(
+                fd,
+                filter=select.KQ_FILTER_VNODE,
+                flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                fflags=self._FLAGS,
+            ))
+        self._kq.control(events, 0, 0)
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        if self._closed:
+            return False
+        # Wake up at least once a second so close() is noticed.
+        slice_timeout = 1.0 if timeout is None else min(timeout, 1.0)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self._closed:
+            if self._kq.control(None, 8, slice_timeout):
+                # The WAL may have been replaced; watch the current inode.
+                self._arm()
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+        return False
+
+    def close(self) -> None:
+        self._closed = True
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+
+def make_watcher(db_path: str, poll_interval: float = STAT_POLL_SECONDS):
+    if hasattr(select, "kqueue"):
+        try:
+            return _KqueueWatcher(db_path)
+        except OSError:
+            pass
+    return _StatWatcher(db_path, poll_interval)
+
+
+class ChangeFeed:
+    """
+    Pushes typed change events for a chat.db to subscribers.
+
+    A background thread waits on the db/WAL files (kqueue where available,
+    fingerprint polling otherwise), lets a burst of writes settle, then runs
+    one range query over chat_message_join(message_id) for ROWIDs past the
+    last seen one and reports which chats gained messages. Subscribers are
+    called on the feed thread; UI code should hop to its own thread.
+    """
+
+    def __init__(
+        self,
+        source_path: Optional[str] = None,
+        *,
+        debounce: float = DEBOUNCE_SECONDS,
+        max_delay: float = MAX_DELAY_SECONDS,
+        poll_interval: float = STAT_POLL_SECONDS,
+        since_rowid: Optional[int] = None,
+    ) -> None:
+        self.source_path = source_path or DEFAULT_SOURCE_DB
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self._conn: Optional[sqlite3.Connection] = None
+        self._subscribers: List[Subscriber] = []
+        self._lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._watcher = None
+        self._stopping = threading.Event()
+        self.since_rowid = self._max_rowid() if since_rowid is None else since_rowid
+        self._last_fp = fingerprint(self.source_path)
+
+    def subscribe(self, callback: Subscriber) -> Callable[[], None]:
+        """
+        Register callback(event); returns a function that unsubscribes it.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+        def unsubscribe() -> None:
+            with self._lock:
+                if callback in self._subscribers:
+                    self._subscribers.remove(callback)
+
+        return unsubscribe
+
+    def start(self) -> "ChangeFeed":
+        if self._thread is None:
+            self._stopping.clear()
+            self._watcher = make_watcher(self.source_path, self.poll_interval)
+            self._thread = threading.Thread(target=self._run, name="chatdb-change-feed", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopping.set()
+            watcher = self._watcher
+        if watcher is not None:
+            watcher.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self) -> "ChangeFeed":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            uri = "file:" + os.path.abspath(self.source_path) + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        return self._conn
+
+    def _max_rowid(self) -> int:
+        (max_rowid,) = self._connect().execute("SELECT COALESCE(MAX(ROWID), 0) FROM message").fetchone()
+        return int(max_rowid)
+
+    def poll(self) -> Optional[ChangeEvent]:
+        """
+        Compute and publish the change since the last call, if there is one.
+        The feed thread calls this after each settled burst; it can also be
+        called directly to check synchronously.
+        """
+        with self._poll_lock:
+            event = self._diff()
+        if event is not None:
+            self._publish(event)
+        return event
+
+    def _diff(self) -> Optional[ChangeEvent]:
+        fp = fingerprint(self.source_path)
+        rows = self._connect().execute(
+            """
+            SELECT cmj.chat_id, COUNT(*), MAX(cmj.message_id)
+            FROM chat_message_join cmj
+            WHERE cmj.message_id > ?
+            GROUP BY cmj.chat_id
+            ORDER BY MAX(cmj.message_id) DESC
+            """,
+            (self.since_rowid,),
+        ).fetchall()
+
+        event: Optional[ChangeEvent] = None
+        if rows:
+            chats = tuple(ChatActivity(int(chat_id), int(n), int(last)) for chat_id, n, last in rows)
+            max_rowid = max(chat.last_message_rowid for chat in chats)
+            event = MessagesAdded(chats, self.since_rowid, max_rowid)
+            self.since_rowid = max_rowid
+        elif fp != self._last_fp:
+            event = SourceChanged(fp)
+        self._last_fp = fp
+        return event
+
+    def _publish(self, event: ChangeEvent) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception:
+                # One broken subscriber must not stop the feed for the others.
+                pass
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                self._wait_and_poll()
+            except Exception:
+                # Typically transient: the WAL rotated or was checkpointed away
+                # under a stat() or kqueue re-arm, or the db was briefly locked.
+                # The thread must outlive it, or the window stops updating.
+                logger.exception("chat.db change feed: wait/poll failed, retrying")
+                if self._stopping.wait(ERROR_BACKOFF_SECONDS):
+                    break
+                self._rewatch()
+
+    def _wait_and_poll(self) -> None:
+        watcher = self._watcher
+        if not watcher.wait(None):
+            return
+        # Debounce: keep absorbing writes until they go quiet for
+        # `debounce` seconds or the burst has lasted `max_delay`.
+        deadline = time.monotonic() + self.max_delay
+        while not self._stopping.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not watcher.wait(min(self.debounce, remaining)):
+                break
+        if not self._stopping.is_set():
+            self.poll()
+
+    def _rewatch(self) -> None:
+        # A watcher that raised may hold stale descriptors; start a fresh one.
+        # Swapped under the lock so stop() always closes the current watcher.
+        try:
+            watcher = make_watcher(self.source_path, self.poll_interval)
+        except Exception:
+            logger.exception("chat.db change feed: could not re-create the file watcher")
+            return
+        with self._lock:
+            old, self._watcher = self._watcher, watcher
+            stopping = self._stopping.is_set()
+        old.close()
+        if stopping:
+            watcher.close()
@@ -0,0 +1,426 @@
+from __future__ import annotations
+
+import sqlite3
+from typing import Iterable, Optional
+
+# Subset of the macOS Messages chat.db schema. Column names, types and the
+# implicit-rowid join tables match the real database closely enough that the
+# readers in messages.py run unchanged against it.
+CHAT_DB_SCHEMA = """
+CREATE TABLE handle (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT UNIQUE,
+    id TEXT NOT NULL,
+    country TEXT,
+    service TEXT NOT NULL,
+    uncanonicalized_id TEXT,
+    person_centric_id TEXT,
+    UNIQUE (id, service)
+);
+CREATE TABLE chat (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT,
+    guid TEXT UNIQUE NOT NULL,
+    style INTEGER,
+    state INTEGER,
+    account_id TEXT,
+    properties BLOB,
+    chat_identifier TEXT,
+    service_name TEXT,
+    room_name TEXT,
+    account_login TEXT,
+    is_archived INTEGER DEFAULT 0,
+    last_addressed_handle TEXT,
+    display_name TEXT,
+    group_id TEXT,
+    is_filtered INTEGER DEFAULT 0
+);
+CREATE TABLE message (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT,
+    guid TEXT UNIQUE NOT NULL,
+    text TEXT,
+    replace INTEGER DEFAULT 0,
+    service_center TEXT,
+    handle_id INTEGER DEFAULT 0,
+    subject TEXT,
+    country TEXT,
+    attributedBody BLOB,
+    version INTEGER DEFAULT 0,
+    type INTEGER DEFAULT 0,
+    service TEXT,
+    account TEXT,
+    account_guid TEXT,
+    error INTEGER DEFAULT 0,
+    date INTEGER,
+    date_read INTEGER,
+    date_delivered INTEGER,
+    is_delivered INTEGER DEFAULT 0,
+    is_finished INTEGER DEFAULT 0,
+    is_from_me INTEGER DEFAULT 0,
+    is_read INTEGER DEFAULT 0,
+    is_sent INTEGER DEFAULT 0,
+    cache_has_attachments INTEGER DEFAULT 0,
+    cache_roomnames TEXT,
+    associated_message_guid TEXT DEFAULT NULL,
+    associated_message_type INTEGER DEFAULT 0,
+    thread_originator_guid TEXT,
+    date_retracted INTEGER DEFAULT 0,
+    date_edited INTEGER DEFAULT 0
+);
+CREATE TABLE chat_message_join (
+    chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+    message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE,
+    message_date INTEGER DEFAULT 0,
+    PRIMARY KEY (chat_id, message_id)
+);
+CREATE TABLE chat_handle_join (
+    chat_id INTEGER REFERENCES chat (ROWID) ON DELETE CASCADE,
+    handle_id INTEGER REFERENCES handle (ROWID) ON DELETE CASCADE,
+    UNIQUE (chat_id, handle_id)
+);
+CREATE TABLE attachment (
+    ROWID INTEGER PRIMARY KEY AUTOINCREMENT,
+    guid TEXT UNIQUE NOT NULL,
+    created_date INTEGER DEFAULT 0,
+    filename TEXT,
+    uti TEXT,
+    mime_type TEXT,
+    transfer_state INTEGER DEFAULT 0,
+    is_outgoing INTEGER DEFAULT 0,
+    transfer_name TEXT,
+    total_bytes INTEGER DEFAULT 0
+);
+CREATE TABLE message_attachment_join (
+    message_id INTEGER REFERENCES message (ROWID) ON DELETE CASCADE,
+    attachment_id INTEGER REFERENCES attachment (ROWID) ON DELETE CASCADE,
+    UNIQUE (message_id, attachment_id)
+);
+CREATE INDEX message_idx_handle ON message (handle_id, date);
+CREATE INDEX message_idx_associated_message ON message (associated_message_guid);
+CREATE INDEX chat_message_join_idx_message_id_only ON chat_message_join (message_id);
+CREATE INDEX chat_message_join_idx_message_date_id_chat_id ON chat_message_join (chat_id, message_date, message_id);
+CREATE INDEX chat_handle_join_idx_handle_id ON chat_handle_join (handle_id);
+CREATE INDEX message_attachment_join_idx_message_id ON message_attachment_join (message_id);
+"""
+
+
+def create_chat_db(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(CHAT_DB_SCHEMA)
+    conn.commit()
+    return conn
+
+
+def insert_handle(conn: sqlite3.Connection, handle: str, service: str = "iMessage") -> int:
+    cur = conn.execute(
+        "INSERT INTO handle (id, service, uncanonicalized_id) VALUES (?, ?, ?)",
+        (handle, service, handle),
+    )
+    return int(cur.lastrowid)
+
+
+def insert_chat(
+    conn: sqlite3.Connection,
+    chat_identifier: str,
+    handle_ids: Iterable[int] = (),
+    display_name: Optional[str] = None,
+) -> int:
+    handle_ids = list(handle_ids)
+    cur = conn.execute(
+        """
+        INSERT INTO chat (guid, style, chat_identifier, service_name, display_name)
+        VALUES (?, ?, ?, 'iMessage', ?)
+        """,
+        (f"iMessage;-;{chat_identifier}", 43 if len(handle_ids) > 1 else 45, chat_identifier, display_name),
+    )
+    chat_id = int(cur.lastrowid)
+    conn.executemany(
+        "INSERT INTO chat_handle_join (chat_id, handle_id) VALUES (?, ?)",
+        [(chat_id, handle_id) for handle_id in handle_ids],
+    )
+    return chat_id
+
+
+def insert_message(
+    conn: sqlite3.Connection,
+    chat_id: int,
+    date: int,
+    text: Optional[str] = None,
+    *,
+    handle_id: int = 0,
+    is_from_me: int = 0,
+    attributed_body: Optional[bytes] = None,
+    cache_has_attachments: int = 0,
+    associated_message_guid: Optional[str] = None,
+    associated_message_type: int = 0,
+    guid: Optional[str] = None,
+) -> int:
+    if guid is None:
+        (next_rowid,) = conn.execute("SELECT COALESCE(MAX(ROWID), 0) + 1 FROM message").fetchone()
+        guid = f"msg-{next_rowid}"
+    cur = conn.execute(
+        """
+        INSERT INTO message (
+            guid, text, handle_id, attributedBody, date, is_from_me,
+            cache_has_attachments, associated_message_guid, associated_message_type
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            guid,
+            text,
+            handle_id,
+            attributed_body,
+            date,
+            is_from_me,
+            cache_has_attachments,
+            associated_message_guid,
+            associated_message_type,
+        ),
+    )
+    message_id = int(cur.lastrowid)
+    conn.execute(
+        "INSERT INTO chat_message_join (chat_id, message_id, message_date) VALUES (?, ?, ?)",
+        (chat_id, message_id, date),
+    )
+    return message_id
+
+
+def insert_attachment(
+    conn: sqlite3.Connection,
+    message_id: int,
+    filename: str,
+    mime_type: Optional[str] = None,
+    total_bytes: int = 0,
+    *,
+    uti: Optional[str] = None,
+    transfer_name: Optional[str] = None,
+    is_outgoing: int = 0,
+) -> int:
+    (next_rowid,) = conn.execute("SELECT COALESCE(MAX(ROWID), 0) + 1 FROM attachment").fetchone()
+    cur = conn.execute(
+        """
+        INSERT INTO attachment (guid, filename, uti, mime_type, transfer_name, total_bytes, is_outgoing)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        """,
+        (
+            f"att-{next_rowid}",
+            filename,
+            uti,
+            mime_type,
+            transfer_name or filename.rsplit("/", 1)[-1],
+            total_bytes,
+            is_outgoing,
+        ),
+    )
+    attachment_id = int(cur.lastrowid)
+    conn.execute(
+        "INSERT INTO message_attachment_join (message_id, attachment_id) VALUES (?, ?)",
+        (message_id, attachment_id),
+    )
+    return attachment_id
+
+
+APPLE_NS = 1_000_000_000
+_WORDS = (
+    "ok sure running late see you soon lol haha what time are we still on for dinner "
+    "tonight tomorrow can you call me when free sounds good thanks love that omw "
+    "did you see this just landed be there in ten minutes no worries happy birthday"
+).split()
+
+
+_TAPBACK_VERBS = {
+    2000: "Loved",
+    2001: "Liked",
+    2002: "Disliked",
+    2003: "Laughed at",
+    2004: "Emphasized",
+    2005: "Questioned",
+}
+# (mime_type, uti, file name pattern, typical size in bytes)
+_ATTACHMENT_KINDS = (
+    ("image/jpeg", "public.jpeg", "IMG_{n:04d}.JPG", 2_500_000),
+    ("image/heic", "public.heic", "IMG_{n:04d}.HEIC", 1_800_000),
+    ("image/png", "public.png", "Screenshot {n}.png", 900_000),
+    ("video/quicktime", "com.apple.quicktime-movie", "IMG_{n:04d}.MOV", 25_000_000),
+    ("application/pdf", "com.adobe.pdf", "Document {n}.pdf", 400_000),
+    ("audio/x-m4a", "com.apple.m4a-audio", "Audio Message.caf", 120_000),
+)
+_ATTACHMENT_WEIGHTS = (40, 25, 12, 10, 8, 5)
+_RECENT_TARGETS = 20  # tapbacks pick one of the last N messages of their chat
+
+
+def generate_chat_db(
+    path: str,
+    num_messages: int = 10_000,
+    num_chats: int = 100,
+    *,
+    seed: int = 0,
+    group_ratio: float = 0.2,
+    start_date: int = 600_000_000 * APPLE_NS,
+    batch_size: int = 50_000,
+    body_only_ratio: float = 0.5,
+    tapback_ratio: float = 0.05,
+    tapback_removal_ratio: float = 0.1,
+    attachment_ratio: float = 0.06,
+) -> None:
+    """
+    Write a deterministic chat.db-shaped database at `path`.
+
+    Chat sizes follow a Zipf-like skew (a few chats hold most of the
+    history), dates increase with ROWID like they do in the real database.
+    Every text message carries a typedstream attributedBody and
+    `body_only_ratio` of them have text NULL, as recent macOS writes them.
+    `tapback_ratio` of the rows are tapbacks on one of the last few messages
+    of their chat (`tapback_removal_ratio` of those take an earlier tapback
+    back), and `attachment_ratio` are attachment bubbles with attachment
+    rows. The same arguments always produce the same database.
+    """
+    import random
+
+    from typedstream import encode_attributed_body
+
+    rng = random.Random(seed)
+    conn = create_chat_db(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    num_handles = max(1, num_chats)
+    conn.executemany(
+        "INSERT INTO handle (ROWID, id, service, uncanonicalized_id) VALUES (?, ?, 'iMessage', ?)",
+        (
+            (i, f"+1415{i:07d}", f"+1415{i:07d}")
+            for i in range(1, num_handles + 1)
+        ),
+    )
+
+    chat_members = {}
+    chat_rows = []
+    for chat_id in range(1, num_chats + 1):
+        if rng.random() < group_ratio:
+            members = rng.sample(range(1, num_handles + 1), k=min(num_handles, rng.randint(3, 8)))
+            display_name = f"Group {chat_id}"
+            identifier = f"chat{chat_id:010d}"
+            style = 43
+        else:
+            members = [chat_id if chat_id <= num_handles else rng.randint(1, num_handles)]
+            display_name = None
+            identifier = f"+1415{members[0]:07d}"
+            style = 45
+        chat_members[chat_id] = members
+        chat_rows.append((chat_id, f"iMessage;-;{identifier}", style, identifier, display_name))
+    conn.executemany(
+        """
+        INSERT INTO chat (ROWID, guid, style, chat_identifier, service_name, display_name)
+        VALUES (?, ?, ?, ?, 'iMessage', ?)
+        """,
+        chat_rows,
+    )
+    conn.executemany(
+        "INSERT INTO chat_handle_join (chat_id, handle_id) VALUES (?, ?)",
+        ((chat_id, h) for chat_id, members in chat_members.items() for h in members),
+    )
+
+    weights = [1.0 / (rank ** 1.1) for rank in range(1, num_chats + 1)]
+    chat_order = list(range(1, num_chats + 1))
+    rng.shuffle(chat_order)
+
+    recent = {}  # chat_id -> [guid of its last few bubbles]
+    reactions = {}  # chat_id -> [(target guid, type, handle_id, is_from_me)] still in effect
+    date = start_date
+    rowid = 0
+    attachment_rowid = 0
+    while rowid < num_messages:
+        n = min(batch_size, num_messages - rowid)
+        chats = rng.choices(chat_order, weights=weights, k=n)
+        msg_rows = []
+        join_rows = []
+        attachment_rows = []
+        attachment_join_rows = []
+        for chat_id in chats:
+            rowid += 1
+            date += rng.randint(1, 600) * APPLE_NS
+            guid = f"msg-{rowid}"
+            is_from_me = 1 if rng.random() < 0.45 else 0
+            handle_id = 0 if is_from_me else rng.choice(chat_members[chat_id])
+            text = None
+            body = None
+            has_attachments = 0
+            assoc_guid = None
+            assoc_type = 0
+
+            roll = rng.random()
+            targets = recent.get(chat_id)
+            if roll < tapback_ratio and targets:
+                in_effect = reactions.setdefault(chat_id, [])
+                if in_effect and rng.random() < tapback_removal_ratio:
+                    target, kind, handle_id, is_from_me = in_effect.pop(rng.randrange(len(in_effect)))
+                    assoc_type = kind + 1000
+                    text = "Removed a tapback"
+                else:
+                    target = rng.choice(targets)
+                    assoc_type = rng.choice(tuple(_TAPBACK_VERBS))
+                    text = f"{_TAPBACK_VERBS[assoc_type]} a message"
+                    in_effect.append((target, assoc_type, handle_id, is_from_me))
+                    del in_effect[:-_RECENT_TARGETS]
+                assoc_guid = f"p:0/{target}"
+            elif roll < tapback_ratio + attachment_ratio:
+                has_attachments = 1
+                text = "\ufffc"
+                for _ in range(1 if rng.random() < 0.85 else rng.randint(2, 4)):
+                    attachment_rowid += 1
+                    mime_type, uti, pattern, typical = rng.choices(_ATTACHMENT_KINDS, _ATTACHMENT_WEIGHTS)[0]
+                    name = pattern.format(n=attachment_rowid % 10_000)
+                    attachment_rows.append((
+                        attachment_rowid,
+                        f"att-{attachment_rowid}",
+                        date,
+                        f"~/Library/Messages/Attachments/{attachment_rowid % 256:02x}/"
+                        f"{attachment_rowid // 256 % 100:02d}/att-{attachment_rowid}/{name}",
+                        uti,
+                        mime_type,
+                        is_from_me,
+                        name,
+                        int(typical * rng.uniform(0.2, 2.0)),
+                    ))
+                    attachment_join_rows.append((rowid, attachment_rowid))
+                body = encode_attributed_body(text)
+            else:
+                words = " ".join(rng.choices(_WORDS, k=rng.randint(1, 12)))
+                body = encode_attributed_body(words)
+                text = None if rng.random() < body_only_ratio else words
+
+            if not assoc_type:
+                chat_recent = recent.setdefault(chat_id, [])
+                chat_recent.append(guid)
+                del chat_recent[:-_RECENT_TARGETS]
+
+            msg_rows.append((
+                rowid, guid, text, handle_id, body, date, is_from_me,
+                has_attachments, assoc_guid, assoc_type,
+            ))
+            join_rows.append((chat_id, rowid, date))
+        conn.executemany(
+            """
+            INSERT INTO message (
+                ROWID, guid, text, handle_id, attributedBody, date, is_from_me,
+                cache_has_attachments, associated_message_guid, associated_message_type
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            msg_rows,
+        )
+        conn.executemany(
+            "INSERT INTO chat_message_join (chat_id, message_id, message_date) VALUES (?, ?, ?)",
+            join_rows,
+        )
+        conn.executemany(
+            """
+            INSERT INTO attachment (
+                ROWID, guid, created_date, filename, uti, mime_type, is_outgoing, transfer_name, total_bytes
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            attachment_rows,
+        )
+        conn.executemany(
+            "INSERT INTO message_attachment_join (message_id, attachment_id) VALUES (?, ?)",
+            attachment_join_rows,
+        )
+    conn.commit()
+    conn.close()
@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+import marshal
+import os
+import tempfile
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from contact_sources import ContactSource
+
+DEFAULT_CONTACT_CACHE = os.path.expanduser("~/Library/Caches/AllInOne/contacts_index.bin")
+DEFAULT_COUNTRY_CODE = "1"  # numbers written without one are assumed to be in this country
+CACHE_MAGIC = b"AIOC"
+CACHE_FORMAT = 3
+
+# Country calling codes are prefix-free: 1 and 7 are the only one-digit
+# codes, these are the two-digit ones, and everything else takes three.
+_COUNTRY_CODES_1 = frozenset(("1", "7"))
+_COUNTRY_CODES_2 = frozenset(
+    "20 27 30 31 32 33 34 36 39 40 41 43 44 45 46 47 48 49 51 52 53 54 55 56 57 58 "
+    "60 61 62 63 64 65 66 81 82 84 86 90 91 92 93 94 95 98".split()
+)
+# Countries whose national numbers keep their leading 0 after the country code
+_KEEPS_TRUNK_ZERO = frozenset(("39",))
+_MISSING = object()
+
+
+class _DigitTable(dict):
+    # str.translate table that keeps decimal digits (any script, mapped to
+    # ASCII) and drops everything else. Entries are filled in on first sight,
+    # so after warm-up translate() never leaves C.
+
+    def __missing__(self, codepoint: int) -> Optional[int]:
+        value = unicodedata.decimal(chr(codepoint), None)
+        result = self[codepoint] = None if value is None else 0x30 + value
+        return result
+
+
+_DIGITS = _DigitTable((c, c) for c in range(0x30, 0x3A))
+
+
+def digits(s: str) -> str:
+    return (s or "").translate(_DIGITS)
+
+
+def split_country_code(d: str) -> Tuple[str, str]:
+    """
+    (country code, national number) for international digits.
+    """
+    if d[:1] in _COUNTRY_CODES_1:
+        return d[:1], d[1:]
+    if d[:2] in _COUNTRY_CODES_2:
+        return d[:2], d[2:]
+    return d[:3], d[3:]
+
+
+def phone_key(raw: str, country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[Tuple[str, str]]:
+    """
+    (country code, national number) for a phone number as typed or stored
+    by Messages, or None for short codes and text that isn't a number.
+
+    "+44 20 7946 0958", "0044 20 7946 0958" and, with country_code "44",
+    "020 7946 0958" all give ("44", "2079460958"). With the default "1",
+    "(415) 555-0100", "1-415-555-0100" and "+14155550100" give
+    ("1", "4155550100").
+    """
+    parsed = _parse_phone(raw, country_code)
+    return None if parsed is None else parsed[:2]
+
+
+def _parse_phone(raw: str, country_code: str) -> Optional[Tuple[str, str, bool]]:
+    # phone_key plus whether the number carried its own country code
+    s = raw.lstrip()
+    d = s.translate(_DIGITS)
+    if s.startswith("+"):
+        international = True
+    elif d.startswith("00") or (country_code == "1" and d.startswith("011")):
+        d = d[3:] if d.startswith("011") else d[2:]
+        international = True
+    else:
+        international = False
+
+    if international:
+        cc, national = split_country_code(d)
+        return (cc, national, True) if len(national) >= 4 else None
+    if len(d) < 7:
+        return None
+    if country_code == "1" and len(d) == 11 and d.startswith("1"):
+        d = d[1:]
+    elif d.startswith("0") and country_code not in _KEEPS_TRUNK_ZERO:
+        d = d[1:]
+    return country_code, d, False
+
+
+class ContactIndex:
+    """
+    Lookup tables from normalized phone numbers and emails to display names.
+
+    Phones are keyed by their full international number (see phone_key) and,
+    for numbers stored without a country code (so the index's country code
+    was assumed), also by the last 10 and last 7 digits of the national
+    number; emails by their lowercase form.
+    Each key maps to a position in one shared names list, so a name is
+    stored once however many numbers and addresses it has. The index
+    persists to a small marshal file stamped with the source's change token
+    and the country code it was normalized for.
+
+    resolve() and resolve_many() are lookup() memoized per handle. The
+    tables never change once built and the memo is only added to, so any
+    thread can read an index.
+    """
+
+    __slots__ = (
+        "names", "e164", "phone10", "phone7", "email", "token", "country_code", "contacts_seen", "_resolved",
+    )
+
+    def __init__(self, token: Optional[str] = None, country_code: str = DEFAULT_COUNTRY_CODE) -> None:
+        self.names: List[str] = []
+        self.e164: Dict[str, int] = {}
+        self.phone10: Dict[str, int] = {}
+        self.phone7: Dict[str, int] = {}
+        self.email: Dict[str, int] = {}
+        self.token = token
+        self.country_code = country_code
+        self.contacts_seen = 0
+        self._resolved: Dict[str, Optional[str]] = {}
+
+    @classmethod
+    def build(
+        cls,
+        source: ContactSource,
+        token: Optional[str] = None,
+        country_code: str = DEFAULT_COUNTRY_CODE,
+    ) -> "ContactIndex":
+        index = cls(token, country_code)
+        name_ids: Dict[str, int] = {}
+        names, e164, phone10, phone7, email = index.names, index.e164, index.phone10, index.phone7, index.email
+        for entry in source.contacts():
+            index.contacts_seen += 1
+            name_id = name_ids.get(entry.name)
+            if name_id is None:
+                name_id = name_ids[entry.name] = len(names)
+                names.append(entry.name)
+            for address in entry.emails:
+                key = address.strip().lower()
+                if key:
+                    email[key] = name_id
+            for phone in entry.phones:
+                parsed = _parse_phone(phone, country_code)
+                if parsed is None:
+                    continue
+                cc, national, international = parsed
+                e164[cc + national] = name_id
+                # A number with its own country code only ever matches in
+                # full; the suffix keys are for numbers whose country was
+                # assumed and may be wrong.
+                if international:
+                    continue
+                if len(national) >= 10:
+                    phone10[national[-10:]] = name_id
+                phone7[national[-7:]] = name_id
+        return index
+
+    def lookup(self, handle: str) -> Optional[str]:
+        if not handle:
+            return None
+        if "@" in handle:
+            name_id = self.email.get(handle.strip().lower())
+            return None if name_id is None else self.names[name_id]
+
+        key = phone_key(handle, self.country_code)
+        # Short codes and garbage don't look like a phone number
+        if key is None:
+            return None
+        cc, national = key
+        name_id = self.e164.get(cc + national)
+        if name_id is None and len(national) >= 10:
+            name_id = self.phone10.get(national[-10:])
+        if name_id is None and len(national) >= 7:
+            name_id = self.phone7.get(national[-7:])
+        return None if name_id is None else self.names[name_id]
+
+    def resolve(self, handle: str) -> Optional[str]:
+        name = self._resolved.get(handle, _MISSING)
+        if name is _MISSING:
+            name = self._resolved[handle] = self.lookup(handle)
+        return name
+
+    def resolve_many(self, handles: Iterable[str]) -> List[Optional[str]]:
+        """
+        Names for `handles`, in order (None where there is no contact).
+        """
+        memo = self._resolved
+        get = memo.get
+        lookup = self.lookup
+        out = []
+        append = out.append
+        for handle in handles:
+            name = get(handle, _MISSING)
+            if name is _MISSING:
+                name = memo[handle] = lookup(handle)
+            append(name)
+        return out
+
+    def handles_by_name(self) -> Dict[str, List[str]]:
+        """
+        Every name with the handles that resolve to it, as Messages writes
+        them: "+<country code><number>" for phones, the address for emails.
+        """
+        by_id: Dict[int, List[str]] = {}
+        for key, name_id in self.e164.items():
+            by_id.setdefault(name_id, []).append("+" + key)
+        for key, name_id in self.email.items():
+            by_id.setdefault(name_id, []).append(key)
+        return {self.names[name_id]: handles for name_id, handles in by_id.items()}
+
+    def save(self, path: str) -> None:
+        parent = os.path.dirname(path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        payload = marshal.dumps((
+            self.token, self.country_code, self.contacts_seen,
+            self.names, self.e164, self.phone10, self.phone7, self.email,
+        ))
+        fd, staging = tempfile.mkstemp(dir=parent or ".", prefix=".contacts-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(CACHE_MAGIC + bytes([CACHE_FORMAT]) + payload)
+            os.replace(staging, path)
+        finally:
+            if os.path.exists(staging):
+                os.unlink(staging)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["ContactIndex"]:
+        """
+        The index saved at path, or None if it is missing, from another
+        format version or unreadable.
+        """
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        header = CACHE_MAGIC + bytes([CACHE_FORMAT])
+        if not data.startswith(header):
+            return None
+        try:
+            token, country_code, contacts_seen, names, e164, phone10, phone7, email = marshal.loads(
+                data[len(header):]
+            )
+        except (EOFError, ValueError, TypeError):
+            return None
+        index = cls(token, country_code)
+        index.contacts_seen = contacts_seen
+        index.names, index.e164, index.phone10, index.phone7, index.email = names, e164, phone10, phone7, email
+        return index
+
+
+def load_or_build(
+    source: ContactSource,
+    cache_path: Optional[str] = DEFAULT_CONTACT_CACHE,
+    country_code: str = DEFAULT_COUNTRY_CODE,
+) -> ContactIndex:
+    """
+    The saved index if the source's change token (and the country code)
+    still match it, otherwise a fresh enumeration (saved for next time when
+    the source has a token). cache_path=None disables the disk cache.
+    """
+    token = source.change_token()
+    if cache_path and token is not None:
+        cached = ContactIndex.load(cache_path)
+        if cached is not None and cached.token == token and cached.country_code == country_code:
+            return cached
+    index = ContactIndex.build(source, token, country_code)
+    if cache_path and token is not None:
+        try:
+            index.save(cache_path)
+        except OSError:
+            pass  # a read-only cache dir only costs the next start a rebuild
+    return index
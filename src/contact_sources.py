@@ -0,0 +1,371 @@
+from __future__ import annotations
+
+import abc
+import csv
+import hashlib
+import quopri
+import threading
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import Contacts  # PyObjC binding: pyobjc-framework-Contacts
+except ImportError:  # not on macOS
+    Contacts = None
+
+
+@dataclass(frozen=True)
+class ContactEntry:
+    name: str
+    phones: Tuple[str, ...] = ()  # as entered, any formatting
+    emails: Tuple[str, ...] = ()
+
+
+class ContactSource(abc.ABC):
+    """
+    Where contact names come from. contacts() enumerates the whole address
+    book; change_token() identifies its current state so a saved index can be
+    reused until it changes (None means unknown: always rebuild).
+
+    Implementations: CNContactSource (macOS Contacts), VCardContactSource
+    and CSVContactSource (exported address books, any platform) and
+    MemoryContactSource.
+    """
+
+    def change_token(self) -> Optional[str]:
+        return None
+
+    @abc.abstractmethod
+    def contacts(self) -> Iterator[ContactEntry]:
+        ...
+
+
+class MemoryContactSource(ContactSource):
+    """
+    Fixed list of contacts, for tests and benchmarks off macOS. The change
+    token is a hash of the contents.
+    """
+
+    def __init__(self, entries: Iterable[ContactEntry]) -> None:
+        self.entries: List[ContactEntry] = list(entries)
+        self.enumerations = 0
+
+    def change_token(self) -> Optional[str]:
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update("\x1f".join((entry.name,) + entry.phones + ("",) + entry.emails).encode("utf-8"))
+            digest.update(b"\x1e")
+        return "sha1:" + digest.hexdigest()
+
+    def contacts(self) -> Iterator[ContactEntry]:
+        self.enumerations += 1
+        return iter(self.entries)
+
+
+class _FileContactSource(ContactSource):
+    # File-backed sources: the change token is a hash of the file contents,
+    # read in chunks, so a copied or touched-but-identical file still hits
+    # the cache and an edited one never does.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def change_token(self) -> Optional[str]:
+        digest = hashlib.sha1()
+        try:
+            with open(self.path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(chunk)
+        except OSError:
+            return None
+        return "sha1:" + digest.hexdigest()
+
+
+def _vcard_unescape(value: str) -> str:
+    if "\\" not in value:
+        return value
+    out = []
+    chars = iter(value)
+    for ch in chars:
+        if ch == "\\":
+            nxt = next(chars, "")
+            out.append("\n" if nxt in "nN" else nxt)
+        else:
+            out.append(ch)
+    return "".join(out)
+
+
+def _split_property(line: str) -> Tuple[str, str, str]:
+    # "item1.TEL;TYPE=CELL;TYPE=pref:+1 415..." -> ("TEL", "TEL;TYPE=CELL;TYPE=pref", "+1 415...")
+    # Parameter values may be quoted and contain ":".
+    colon = line.find(":")
+    if colon < 0:
+        return "", "", ""
+    if '"' in line[:colon]:
+        in_quotes = False
+        for colon, ch in enumerate(line):
+            if ch == '"':
+                in_quotes = not in_quotes
+            elif ch == ":" and not in_quotes:
+                break
+    head = line[:colon]
+    name = head.split(";", 1)[0].rsplit(".", 1)[-1].upper()
+    return name, head, line[colon + 1:]
+
+
+def _param(head: str, key: str) -> Optional[str]:
+    for param in head.split(";")[1:]:
+        k, _sep, v = param.partition("=")
+        if k.upper() == key:
+            return v.strip('"')
+    return None
+
+
+class VCardContactSource(_FileContactSource):
+    """
+    A .vcf export (vCard 2.1, 3.0 or 4.0, any number of cards). The file is
+    read line by line and each card is yielded as soon as it ends, so memory
+    stays flat however large the address book is.
+
+    The name is FN, else the given and family parts of N, else ORG. TEL
+    values may be tel: URIs; folded lines and quoted-printable values are
+    decoded.
+    """
+
+    def contacts(self) -> Iterator[ContactEntry]:
+        with open(self.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            yield from self._parse(self._unfold(f))
+
+    @staticmethod
+    def _unfold(lines: Iterable[str]) -> Iterator[str]:
+        pending: Optional[str] = None
+        quoted_printable = False
+        for raw in lines:
+            line = raw.rstrip("\r\n")
+            if pending is not None:
+                if line[:1] in (" ", "\t") and not quoted_printable:
+                    pending += line[1:]
+                    continue
+                if quoted_printable and pending.endswith("="):
+                    pending = pending[:-1] + line  # soft line break
+                    continue
+                yield pending
+            pending = line
+            quoted_printable = line.endswith("=") and "QUOTED-PRINTABLE" in line.split(":", 1)[0].upper()
+        if pending is not None:
+            yield pending
+
+    @staticmethod
+    def _parse(lines: Iterable[str]) -> Iterator[ContactEntry]:
+        card: Optional[Dict[str, List[str]]] = None
+        for line in lines:
+            if not line:
+                continue
+            name, head, value = _split_property(line)
+            if card is not None and name in card:
+                if "QUOTED-PRINTABLE" in head.upper():
+                    raw = quopri.decodestring(value.encode("latin-1", "replace"))
+                    try:
+                        value = raw.decode(_param(head, "CHARSET") or "utf-8", "replace")
+                    except LookupError:
+                        value = raw.decode("utf-8", "replace")
+                card[name].append(value)
+            elif name == "BEGIN" and value.upper() == "VCARD":
+                card = {"FN": [], "N": [], "ORG": [], "TEL": [], "EMAIL": []}
+            elif name == "END" and value.upper() == "VCARD":
+                if card is not None:
+                    yield VCardContactSource._entry(card)
+                card = None
+
+    @staticmethod
+    def _entry(card: Dict[str, List[str]]) -> ContactEntry:
+        name = ""
+        if card["FN"]:
+            name = _vcard_unescape(card["FN"][0]).strip()
+        if not name and card["N"]:
+            parts = card["N"][0].split(";")
+            given = _vcard_unescape(parts[1]) if len(parts) > 1 else ""
+            name = (given + " " + _vcard_unescape(parts[0])).strip()
+        if not name and card["ORG"]:
+            name = _vcard_unescape(card["ORG"][0].split(";")[0]).strip()
+        phones = []
+        for value in card["TEL"]:
+            value = value.strip()
+            if value[:4].lower() == "tel:":
+                value = value[4:]
+            if value:
+                phones.append(value)
+        emails = tuple(e.strip() for e in card["EMAIL"] if e.strip())
+        return ContactEntry(name or "Unknown", tuple(phones), emails)
+
+
+class CSVContactSource(_FileContactSource):
+    """
+    A CSV export with a header row (Google Contacts, Outlook, Apple Numbers
+    or hand-made), read one row at a time.
+
+    The name comes from a Name / Full Name / Display Name column, else from
+    First/Given + Last/Family. Every column whose header mentions phone or
+    mobile holds numbers and every one mentioning e-mail holds addresses,
+    skipping their Type/Label companions; Google's " ::: " multi-value
+    separator is split.
+    """
+
+    _NAME_COLUMNS = ("name", "full name", "display name", "formatted name")
+    _GIVEN_COLUMNS = ("first name", "given name")
+    _FAMILY_COLUMNS = ("last name", "family name", "surname")
+
+    def contacts(self) -> Iterator[ContactEntry]:
+        with open(self.path, encoding="utf-8-sig", errors="replace", newline="") as f:
+            reader = csv.reader(f)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = [h.strip().lower() for h in header]
+            name_col = self._first(columns, self._NAME_COLUMNS)
+            given_col = self._first(columns, self._GIVEN_COLUMNS)
+            family_col = self._first(columns, self._FAMILY_COLUMNS)
+            phone_cols = [i for i, h in enumerate(columns) if ("phone" in h or "mobile" in h) and not self._is_label(h)]
+            email_cols = [i for i, h in enumerate(columns) if ("e-mail" in h or "email" in h) and not self._is_label(h)]
+            for row in reader:
+                if not any(row):
+                    continue
+                name = self._cell(row, name_col)
+                if not name:
+                    name = (self._cell(row, given_col) + " " + self._cell(row, family_col)).strip()
+                yield ContactEntry(
+                    name or "Unknown",
+                    tuple(self._values(row, phone_cols)),
+                    tuple(self._values(row, email_cols)),
+                )
+
+    @staticmethod
+    def _first(columns: List[str], names: Tuple[str, ...]) -> Optional[int]:
+        for name in names:
+            if name in columns:
+                return columns.index(name)
+        return None
+
+    @staticmethod
+    def _is_label(header: str) -> bool:
+        return header.endswith(("type", "label"))
+
+    @staticmethod
+    def _cell(row: List[str], col: Optional[int]) -> str:
+        return row[col].strip() if col is not None and col < len(row) else ""
+
+    @staticmethod
+    def _values(row: List[str], cols: List[int]) -> Iterator[str]:
+        for col in cols:
+            if col < len(row):
+                for value in row[col].split(" ::: "):
+                    value = value.strip()
+                    if value:
+                        yield value
+
+
+def _display_name(contact) -> str:
+    given = str(contact.givenName() or "")
+    family = str(contact.familyName() or "")
+    name = (given + " " + family).strip()
+    return name if name else "Unknown"
+
+
+class CNContactSource(ContactSource):
+    """
+    The macOS address book through CNContactStore. The change token is the
+    store's change-history token, which moves on every edit.
+    """
+
+    def __init__(self, auth_wait: float = 10.0) -> None:
+        if Contacts is None:
+            raise RuntimeError("the Contacts framework is not available")
+        self.store = Contacts.CNContactStore.alloc().init()
+        self.auth_wait = auth_wait
+        self._authorized: Optional[bool] = None
+
+    def authorized(self) -> bool:
+        if self._authorized is None:
+            self._authorized = self._ensure_authorized()
+        return self._authorized
+
+    def _ensure_authorized(self) -> bool:
+        status = Contacts.CNContactStore.authorizationStatusForEntityType_(
+            Contacts.CNEntityTypeContacts
+        )
+
+        if status == Contacts.CNAuthorizationStatusAuthorized:
+            return True
+
+        if status != Contacts.CNAuthorizationStatusNotDetermined:
+            # Denied / Restricted
+            return False
+
+        ev = threading.Event()
+        result = {"ok": False}
+
+        def cb(ok, err):
+            result["ok"] = bool(ok)
+            ev.set()
+
+        self.store.requestAccessForEntityType_completionHandler_(
+            Contacts.CNEntityTypeContacts, cb
+        )
+
+        ev.wait(self.auth_wait)
+        return bool(result["ok"])
+
+    def change_token(self) -> Optional[str]:
+        # Unauthorized stores enumerate as empty; never let that be cached.
+        if not self.authorized() or not hasattr(self.store, "currentHistoryToken"):
+            return None
+        token = self.store.currentHistoryToken()
+        return "cn:" + bytes(token).hex() if token is not None else None
+
+    def contacts(self) -> Iterator[ContactEntry]:
+        if not self.authorized():
+            return iter(())
+
+        keys = [
+            Contacts.CNContactGivenNameKey,
+            Contacts.CNContactFamilyNameKey,
+            Contacts.CNContactPhoneNumbersKey,
+            Contacts.CNContactEmailAddressesKey,
+        ]
+        req = Contacts.CNContactFetchRequest.alloc().initWithKeysToFetch_(keys)
+        entries: List[ContactEntry] = []
+
+        def handler(contact, stop_ptr):
+            # IMPORTANT: do not return anything from this function.
+            emails = []
+            for lv in (contact.emailAddresses() or []):
+                try:
+                    emails.append(str(lv.value() or ""))
+                except Exception:
+                    continue
+            phones = []
+            for lv in (contact.phoneNumbers() or []):
+                try:
+                    pn = lv.value()
+                    phones.append(str(pn.stringValue() if pn else ""))
+                except Exception:
+                    continue
+            entries.append(ContactEntry(_display_name(contact), tuple(phones), tuple(emails)))
+
+        self.store.enumerateContactsWithFetchRequest_error_usingBlock_(req, None, handler)
+        return iter(entries)
+
+
+def source_for_path(path: str) -> ContactSource:
+    """
+    VCardContactSource or CSVContactSource, by file extension.
+    """
+    if path.lower().endswith((".vcf", ".vcard")):
+        return VCardContactSource(path)
+    if path.lower().endswith(".csv"):
+        return CSVContactSource(path)
+    raise ValueError(f"no contact source for {path!r} (expected .vcf or .csv)")
+
+
+def default_source() -> Optional[ContactSource]:
+    return CNContactSource() if Contacts is not None else None
@@ -1,169 +1,181 @@
 # contacts.py
-import re
 import threading
-from typing import Dict, Iterable, Optional, Set
+from concurrent.futures import Future
+from typing import Callable, Iterable, List, Optional, Sequence
 
-import Contacts  # PyObjC binding: pyobjc-framework-Contacts
+from contact_index import DEFAULT_CONTACT_CACHE, DEFAULT_COUNTRY_CODE, ContactIndex, load_or_build
+from contact_sources import ContactSource, default_source
+
+_DEFAULT = object()
 
 
 class ContactsConnector:
-  _built: bool = False
-  _map: Dict[str, Optional[str]] = {}
-
-  @staticmethod
-  def _digits(s: str) -> str:
-    return re.sub(r"\D", "", s or "")
-
-  @staticmethod
-  def _normalize_us_digits(d: str) -> str:
-    # If it’s 11 digits and starts with US country code "1", drop it
-    if len(d) == 11 and d.startswith("1"):
-      return d[1:]
-    return d
-
-  @staticmethod
-  def _display_name(contact) -> str:
-    given = str(contact.givenName() or "")
-    family = str(contact.familyName() or "")
-    name = (given + " " + family).strip()
-    return name if name else "Unknown"
+  """
+  Process-wide handle -> contact name resolution.
+
+  The whole address book is loaded once into a ContactIndex, so any handle,
+  including ones first seen long after startup, resolves with a couple of
+  dict lookups. Loading never blocks the caller: load_async() and refresh()
+  build on a worker thread and swap the new index in with one assignment
+  (readers keep using whichever index they picked up), then notify
+  subscribers so views can relabel handles they showed raw meanwhile.
+  """
+
+  _index: Optional[ContactIndex] = None
+  _source = _DEFAULT  # ContactSource, None for no contacts, or _DEFAULT (CNContactStore on macOS)
+  _cache_path: Optional[str] = DEFAULT_CONTACT_CACHE
+  _country_code: str = DEFAULT_COUNTRY_CODE
+  _load_lock = threading.Lock()
+  _loaded: bool = False
+  _pending: Optional[Future] = None
+  _subscribers: List[Callable[[Optional[ContactIndex]], None]] = []
+
+  @classmethod
+  def configure(
+    cls,
+    source: Optional[ContactSource] = None,
+    cache_path: Optional[str] = DEFAULT_CONTACT_CACHE,
+    country_code: str = DEFAULT_COUNTRY_CODE,
+  ) -> None:
+    """
+    Use `source` for names (None: resolve nothing) and keep the index at
+    cache_path (None: no disk cache). Numbers written without a country
+    code are taken to be in `country_code`. Drops the current index.
+    """
+    with cls._load_lock:
+      cls._source = source
+      cls._cache_path = cache_path
+      cls._country_code = country_code
+      cls._index = None
+      cls._loaded = False
+      cls._pending = None
+
+  @classmethod
+  def _current_source(cls) -> Optional[ContactSource]:
+    if cls._source is _DEFAULT:
+      cls._source = default_source()
+    return cls._source
+
+  @classmethod
+  def _build(cls, source: Optional[ContactSource]) -> Optional[ContactIndex]:
+    if source is None:
+      return None
+    return load_or_build(source, cls._cache_path, cls._country_code)
 
   @classmethod
-  def _ensure_authorized(cls, store, wait_sec: float = 10.0) -> bool:
-    status = Contacts.CNContactStore.authorizationStatusForEntityType_(
-      Contacts.CNEntityTypeContacts
-    )
+  def subscribe(cls, callback: Callable[[Optional[ContactIndex]], None]) -> Callable[[], None]:
+    """
+    Call callback(index) on the worker thread whenever a new index is
+    swapped in. Returns a function that unsubscribes it.
+    """
+    with cls._load_lock:
+      cls._subscribers.append(callback)
 
-    if status == Contacts.CNAuthorizationStatusAuthorized:
-      return True
+    def unsubscribe() -> None:
+      with cls._load_lock:
+        if callback in cls._subscribers:
+          cls._subscribers.remove(callback)
 
-    if status != Contacts.CNAuthorizationStatusNotDetermined:
-      # Denied / Restricted
-      return False
+    return unsubscribe
 
-    ev = threading.Event()
-    result = {"ok": False}
+  @classmethod
+  def _spawn(cls, name: str) -> "Future[Optional[ContactIndex]]":
+    future: "Future[Optional[ContactIndex]]" = Future()
+
+    def run():
+      with cls._load_lock:
+        source = cls._current_source()
+      try:
+        index = cls._build(source)
+      except Exception as e:
+        with cls._load_lock:
+          if cls._pending is future:
+            cls._pending = None
+        future.set_exception(e)
+        return
+      with cls._load_lock:
+        current = cls._source is source  # not reconfigured meanwhile
+        if current:
+          cls._index = index
+          cls._loaded = True
+        if cls._pending is future:
+          cls._pending = None
+        subscribers = list(cls._subscribers) if current else []
+      for callback in subscribers:
+        try:
+          callback(index)
+        except Exception:
+          pass  # one broken subscriber must not starve the others
+      future.set_result(index)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
 
-    def cb(ok, err):
-      result["ok"] = bool(ok)
-      ev.set()
+  @classmethod
+  def load_async(cls) -> "Future[Optional[ContactIndex]]":
+    """
+    The index as a Future, loading it on a worker thread on first use (from
+    the disk cache when the source hasn't changed). Concurrent callers share
+    one load.
+    """
+    with cls._load_lock:
+      if cls._loaded:
+        future: "Future[Optional[ContactIndex]]" = Future()
+        future.set_result(cls._index)
+        return future
+      if cls._pending is None:
+        cls._pending = cls._spawn("contacts-load")
+      return cls._pending
 
-    store.requestAccessForEntityType_completionHandler_(
-      Contacts.CNEntityTypeContacts, cb
-    )
+  @classmethod
+  def ensure_loaded(cls) -> Optional[ContactIndex]:
+    """
+    Blocking load_async(), for scripts and tests.
+    """
+    return cls.load_async().result()
 
-    ev.wait(wait_sec)
-    return bool(result["ok"])
+  @classmethod
+  def build_index_for_handles(cls, handles: Iterable[str], wait: bool = False) -> None:
+    """
+    Resolve `handles` ahead of display. If the index isn't loaded yet this
+    starts loading it and returns (names show up through subscribe());
+    wait=True blocks until it is loaded instead.
+    """
+    index = cls._index
+    if index is None:
+      future = cls.load_async()
+      if not wait:
+        return
+      index = future.result()
+      if index is None:
+        return
+    for h in handles:
+      if h:
+        index.resolve(h)
+
+  @classmethod
+  def refresh(cls) -> "Future[Optional[ContactIndex]]":
+    """
+    Rebuild the index from the source on a worker thread and swap it in
+    when done. Lookups meanwhile are served by the old index.
+    """
+    return cls._spawn("contacts-refresh")
 
   @classmethod
-  def build_index_for_handles(cls, handles: Iterable[str]) -> None:
-    if cls._built:
-      return
-
-    uniq: Set[str] = set(h for h in handles if h)
-
-    # Pre-fill map so get_contact_name() is safe even if auth fails
-    cls._map = {h: None for h in uniq}
-
-    # Build desired lookup keys (only for real-looking handles)
-    want_emails: Set[str] = set()
-    want_last10: Set[str] = set()
-    want_last7: Set[str] = set()
-
-    for h in uniq:
-      if "@" in h:
-        want_emails.add(h.lower())
-        continue
-
-      d = cls._digits(h)
-      # Filter out short codes / garbage: keep only 7+ digits
-      if len(d) < 7:
-        continue
-
-      if len(d) >= 10:
-        want_last10.add(d[-10:])
-      else:
-        want_last7.add(d[-7:])
-
-    store = Contacts.CNContactStore.alloc().init()
-    if not cls._ensure_authorized(store):
-      cls._built = True
-      return
-
-    keys = [
-      Contacts.CNContactGivenNameKey,
-      Contacts.CNContactFamilyNameKey,
-      Contacts.CNContactPhoneNumbersKey,
-      Contacts.CNContactEmailAddressesKey,
-    ]
-    req = Contacts.CNContactFetchRequest.alloc().initWithKeysToFetch_(keys)
-
-    phone10_to_name: Dict[str, str] = {}
-    phone7_to_name: Dict[str, str] = {}
-    email_to_name: Dict[str, str] = {}
-
-    count = {"n": 0}
-
-    def handler(contact, stop_ptr):
-        # IMPORTANT: do not return anything from this function.
-        count["n"] += 1
-
-        name = cls._display_name(contact)
-
-        for lv in (contact.emailAddresses() or []):
-            try:
-                e = str(lv.value() or "").lower()
-            except Exception:
-                continue
-            if e:
-                email_to_name[e] = name
-
-        for lv in (contact.phoneNumbers() or []):
-            try:
-                pn = lv.value()
-                s = str(pn.stringValue() if pn else "")
-            except Exception:
-                continue
-
-            d = cls._normalize_us_digits(cls._digits(s))
-            if len(d) >= 10:
-                phone10_to_name[d[-10:]] = name
-            if len(d) >= 7:
-                phone7_to_name[d[-7:]] = name
-
-    ok, err = store.enumerateContactsWithFetchRequest_error_usingBlock_(req, None, handler)
-
-    print("enumerate ok:", ok)
-    print("enumerate err:", err)
-    print("contacts visited:", count["n"])
-    print("indexed last10:", len(phone10_to_name))
-    print("indexed last7:", len(phone7_to_name))
-    print("indexed emails:", len(email_to_name))
-
-
-
-    # Fill the map for requested handles
-    for h in uniq:
-      if "@" in h:
-        cls._map[h] = email_to_name.get(h.lower())
-        continue
-
-      d = cls._digits(h)
-      if len(d) < 7:
-        cls._map[h] = None
-        continue
-
-      nm = None
-      if len(d) >= 10:
-        nm = phone10_to_name.get(d[-10:])
-      if nm is None:
-        nm = phone7_to_name.get(d[-7:])
-      cls._map[h] = nm
-
-    cls._built = True
+  def resolve_many(cls, handles: Sequence[str]) -> List[Optional[str]]:
+    """
+    Names for `handles` in order, None where unknown (or while the index
+    is still loading, which this starts).
+    """
+    index = cls._index
+    if index is None:
+      cls.load_async()
+      return [None] * len(handles)
+    return index.resolve_many(handles)
 
   @classmethod
   def get_contact_name(cls, handle: str) -> Optional[str]:
     if not handle:
       return None
-    return cls._map.get(handle)
+    index = cls._index
+    return index.resolve(handle) if index is not None else None
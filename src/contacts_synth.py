@@ -0,0 +1,111 @@
+from __future__ import annotations
+
+import csv
+import random
+from typing import List
+
+from contact_sources import ContactEntry
+
+_GIVEN = (
+    "Alice", "Bob", "Carol", "David", "Emma", "Farid", "Grace", "Hiro", "Ines", "Jonas",
+    "Kofi", "Lena", "Mateo", "Nadia", "Omar", "Priya", "Quinn", "Rosa", "Sven", "Yuki",
+)
+_FAMILY = (
+    "Smith", "Garcia", "Nguyen", "Müller", "Okafor", "Rossi", "Kowalski", "Tanaka", "Silva", "Cohen",
+    "Dubois", "Larsen", "Patel", "Novak", "Haddad", "Jensen", "Kim", "Moreau", "Ivanova", "Byrne",
+)
+_DOMAINS = ("example.com", "mail.example.org", "icloud.example", "work.example.net")
+# (country code, national digits) of non-US numbers, written with the "+"
+_FOREIGN = (("44", 10), ("49", 11), ("33", 9), ("81", 10), ("91", 10), ("61", 9), ("353", 9))
+
+
+def _us_formats(area: int, number: int) -> List[str]:
+    exchange, line = divmod(number, 10_000)
+    return [
+        f"({area}) {exchange:03d}-{line:04d}",
+        f"+1 {area} {exchange:03d} {line:04d}",
+        f"{area}.{exchange:03d}.{line:04d}",
+        f"1-{area}-{exchange:03d}-{line:04d}",
+        f"{area}{exchange:03d}{line:04d}",
+    ]
+
+
+def generate_contacts(count: int, seed: int = 0) -> List[ContactEntry]:
+    """
+    `count` deterministic address-book entries. Most have one or two US
+    numbers typed in assorted formats, some a foreign number in
+    international form, and about half an email address.
+    """
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        name = f"{rng.choice(_GIVEN)} {rng.choice(_FAMILY)}"
+        if rng.random() < 0.3:
+            name += f" {i}"  # not every name is unique, but most are
+        phones = []
+        for _ in range(rng.choice((1, 1, 1, 2))):
+            if rng.random() < 0.15:
+                cc, width = rng.choice(_FOREIGN)
+                phones.append(f"+{cc} {rng.randrange(10 ** (width - 1), 10 ** width)}")
+            else:
+                phones.append(rng.choice(_us_formats(rng.randrange(201, 990), rng.randrange(2_000_000, 10_000_000))))
+        emails = []
+        if rng.random() < 0.5:
+            emails.append(f"{name.split()[0].lower()}.{i}@{rng.choice(_DOMAINS)}")
+        entries.append(ContactEntry(name, tuple(phones), tuple(emails)))
+    return entries
+
+
+def handles_for(entries: List[ContactEntry], count: int, seed: int = 0, known_ratio: float = 0.8) -> List[str]:
+    """
+    `count` handles as Messages stores them (E.164 phone numbers and email
+    addresses); `known_ratio` of them belong to one of `entries`, the rest
+    to nobody in the address book.
+    """
+    from contact_index import phone_key
+
+    rng = random.Random(seed)
+    known = []
+    for entry in entries:
+        for phone in entry.phones:
+            key = phone_key(phone)
+            if key is not None:
+                known.append("+" + key[0] + key[1])
+        known.extend(entry.emails)
+    handles = []
+    for i in range(count):
+        if rng.random() < known_ratio:
+            handles.append(rng.choice(known))
+        elif rng.random() < 0.8:
+            handles.append(f"+1{rng.randrange(201, 990)}{rng.randrange(2_000_000, 10_000_000)}")
+        else:
+            handles.append(f"stranger{i}@{rng.choice(_DOMAINS)}")
+    return handles
+
+
+def write_vcard(path: str, entries: List[ContactEntry]) -> None:
+    """
+    Write entries as a vCard 3.0 file, the way Contacts.app exports them.
+    """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for entry in entries:
+            given, _, family = entry.name.partition(" ")
+            lines = ["BEGIN:VCARD", "VERSION:3.0", f"N:{family};{given};;;", f"FN:{entry.name}"]
+            lines += [f"TEL;type=CELL;type=VOICE:{phone}" for phone in entry.phones]
+            lines += [f"EMAIL;type=INTERNET;type=HOME:{email}" for email in entry.emails]
+            lines.append("END:VCARD")
+            f.write("\r\n".join(lines) + "\r\n")
+
+
+def write_csv(path: str, entries: List[ContactEntry]) -> None:
+    """
+    Write entries in the Google Contacts CSV layout.
+    """
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Name", "Given Name", "Family Name", "E-mail 1 - Type", "E-mail 1 - Value",
+                         "Phone 1 - Type", "Phone 1 - Value"])
+        for entry in entries:
+            given, _, family = entry.name.partition(" ")
+            writer.writerow([entry.name, given, family, "* Home" if entry.emails else "", " ::: ".join(entry.emails),
+                             "Mobile", " ::: ".join(entry.phones)])
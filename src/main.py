@@ -1,5 +1,9 @@
+import os
+import sqlite3
 import sys
-from PySide6.QtCore import Qt, QTimer, QEvent
+import threading
+from PySide6.QtCore import Qt, QTimer, QEvent, QObject, QStringListModel, Signal
+from PySide6.QtGui import QPixmap
 from PySide6.QtWidgets import (
   QApplication,
   QCompleter,
@@ -18,10 +22,30 @@ from PySide6.QtWidgets import (
   QLineEdit,
 )
 
+from attachments import ThumbnailCache, format_size
+from change_feed import ChangeFeed, MessagesAdded
+from contact_sources import source_for_path
 from contacts import ContactsConnector
-from messages import MessageBridge
+from messages import OPEN_READONLY, MessageBridge
+from recipient_index import RecipientIndex
+from sql_stats import DEFAULT_RECORDER
+from message_sync import ChatDBMirror
 from logic import get_status
 
+# Safety net behind the change feed: refresh this often even with no events,
+# in case a change is missed or the feed thread is stuck.
+FALLBACK_POLL_MS = 60_000
+MIRROR_RECONCILE_MS = 10 * 60_000
+
+TAPBACK_LABELS = {
+  "love": "\u2764\ufe0f",
+  "like": "\U0001F44D",
+  "dislike": "\U0001F44E",
+  "laugh": "\U0001F602",
+  "emphasize": "\u203C\ufe0f",
+  "question": "\u2753",
+}
+
 
 class ElidedLabel(QLabel):
   def __init__(self, text="", parent=None):
@@ -43,6 +67,26 @@ class ElidedLabel(QLabel):
     super().setText(elided)
 
 
+class ThumbnailNotifier(QObject):
+  # Emitted from thumbnail worker threads; Qt queues it onto the GUI thread.
+  ready = Signal(int, str)
+
+
+class ChangeNotifier(QObject):
+  # Emitted from the change feed thread; Qt queues it onto the GUI thread.
+  changed = Signal(object)
+
+
+class ContactsNotifier(QObject):
+  # Emitted from the contacts worker thread when names become available.
+  ready = Signal()
+
+
+class RecipientsNotifier(QObject):
+  # Emitted from the recipient index builder thread with the new index.
+  ready = Signal(object)
+
+
 class MainWindow(QMainWindow):
   def __init__(self):
     super().__init__()
@@ -132,13 +176,26 @@ class MainWindow(QMainWindow):
     self.note_recipient_dropdown.setEditable(True)
     self.note_recipient_dropdown.setInsertPolicy(QComboBox.NoInsert)
     dropdown_line_edit = self.note_recipient_dropdown.lineEdit()
-    dropdown_line_edit.setPlaceholderText("Search chats")
-    completer = self.note_recipient_dropdown.completer()
-    if completer is None:
-      completer = QCompleter(self.note_recipient_dropdown.model(), self.note_recipient_dropdown)
-      self.note_recipient_dropdown.setCompleter(completer)
+    dropdown_line_edit.setPlaceholderText("Search chats and contacts")
+    # Suggestions come from RecipientIndex (every chat and contact), already
+    # ranked, so the completer shows them as they are instead of filtering.
+    self.recipient_index = None
+    # One builder thread at a time; requests made while it runs fold into
+    # its next pass. The built_* pair is what the current index came from.
+    self.recipient_lock = threading.Lock()
+    self.recipient_pending = False
+    self.recipient_builder_running = False
+    self.recipient_contacts = None
+    self.recipient_built_contacts = None
+    self.recipient_built_directory = None
+    self.recipient_model = QStringListModel(self)
+    completer = QCompleter(self.recipient_model, self.note_recipient_dropdown)
     completer.setCaseSensitivity(Qt.CaseInsensitive)
-    completer.setFilterMode(Qt.MatchContains)
+    completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+    self.note_recipient_dropdown.setCompleter(completer)
+    dropdown_line_edit.textEdited.connect(self._on_recipient_text_edited)
+    self.recipients_notifier = RecipientsNotifier()
+    self.recipients_notifier.ready.connect(self._on_recipient_index_ready)
 
     self.note_text_input = QLineEdit()
     self.note_text_input.setObjectName("noteTextInput")
@@ -153,7 +210,16 @@ class MainWindow(QMainWindow):
     self.note_overlay_layout.addWidget(self.note_text_input)
     self.note_overlay_layout.addWidget(self.note_generate_button)
 
-    self.bridge = MessageBridge()
+    self.bridge = MessageBridge(mirror=ChatDBMirror())
+    self.thumbnails = ThumbnailCache()
+    self.thumbnail_notifier = ThumbnailNotifier()
+    self.thumbnail_notifier.ready.connect(self._on_thumbnail_ready)
+    self.thumbnail_labels = {}  # attachment ROWID -> preview labels waiting for a thumbnail
+    # Contacts load in the background; rows show raw handles until then.
+    self.contacts_notifier = ContactsNotifier()
+    self.contacts_notifier.ready.connect(self._on_contacts_ready)
+    self.unsubscribe_contacts = ContactsConnector.subscribe(lambda _index: self.contacts_notifier.ready.emit())
+    ContactsConnector.load_async()
     chats = self._load_chats()
 
     self.chat_rows = []
@@ -240,10 +306,25 @@ class MainWindow(QMainWindow):
     if self.chat_rows:
       self._select_chat(chats[0], self.chat_rows[0])
 
+    # Refresh when chat.db actually changes instead of on a fixed timer.
+    self.change_notifier = ChangeNotifier()
+    self.change_notifier.changed.connect(self._on_source_changed)
+    self.change_feed = ChangeFeed(self.bridge.mirror.source_path)
+    self.change_feed.subscribe(self.change_notifier.changed.emit)
+    self.change_feed.start()
     self.poll_timer = QTimer(self)
-    self.poll_timer.setInterval(5000)
+    self.poll_timer.setInterval(FALLBACK_POLL_MS)
     self.poll_timer.timeout.connect(self._poll_for_updates)
     self.poll_timer.start()
+    # Edits, deletions and membership changes that sync() doesn't look for:
+    # a full reconcile off the GUI thread, at startup and then now and then.
+    self.reconcile_lock = threading.Lock()
+    self.reconcile_timer = QTimer(self)
+    self.reconcile_timer.setInterval(MIRROR_RECONCILE_MS)
+    self.reconcile_timer.timeout.connect(self._reconcile_mirror)
+    self.reconcile_timer.start()
+    self._reconcile_mirror()
+    self._rebuild_recipient_index()
 
     app = QApplication.instance()
     if app:
@@ -334,6 +415,14 @@ class MainWindow(QMainWindow):
         font-size: 12px;
         font-weight: 500;
       }
+      QLabel#attachmentCaption {
+        color: rgba(255, 255, 255, 0.75);
+        font-size: 11px;
+      }
+      QLabel#messageReactions {
+        color: rgba(255, 255, 255, 0.75);
+        font-size: 12px;
+      }
       QLabel#senderAvatar {
         background-color: rgba(255, 255, 255, 0.18);
         color: #ffffff;
@@ -480,6 +569,60 @@ class MainWindow(QMainWindow):
     if current_text:
       self.note_recipient_dropdown.setEditText(current_text)
 
+  def _rebuild_recipient_index(self):
+    future = ContactsConnector.load_async()
+    contacts = future.result() if future.done() and not future.exception() else None
+    with self.recipient_lock:
+      self.recipient_contacts = contacts
+      self.recipient_pending = True
+      if self.recipient_builder_running:
+        return
+      self.recipient_builder_running = True
+    mirror_path = self.bridge.mirror.path
+    threading.Thread(target=self._build_recipient_index, args=(mirror_path,), name="recipient-index", daemon=True).start()
+
+  def _build_recipient_index(self, mirror_path):
+    # Builder thread. The directory is read on its own read-only connection
+    # to the mirror (WAL, so syncs don't block it), and the index is only
+    # rebuilt when chat names, participants or the contact index changed:
+    # a new message that just reorders chats reuses the current one.
+    try:
+      while True:
+        with self.recipient_lock:
+          if not self.recipient_pending:
+            self.recipient_builder_running = False
+            return
+          self.recipient_pending = False
+          contacts = self.recipient_contacts
+        reader = MessageBridge(mirror_path, open_mode=OPEN_READONLY)
+        try:
+          directory = reader.chat_directory()
+        finally:
+          reader.close()
+        signature = sorted((chat_id, name, identifier, tuple(sorted(handles))) for chat_id, name, identifier, handles in directory)
+        if contacts is self.recipient_built_contacts and signature == self.recipient_built_directory:
+          continue
+        index = RecipientIndex.build(directory, contacts)
+        self.recipient_built_contacts = contacts
+        self.recipient_built_directory = signature
+        self.recipients_notifier.ready.emit(index)
+    except Exception:
+      with self.recipient_lock:
+        self.recipient_builder_running = False  # the next refresh tries again
+      raise
+
+  def _on_recipient_index_ready(self, index):
+    self.recipient_index = index
+    text = self.note_recipient_dropdown.currentText()
+    if text:
+      self._on_recipient_text_edited(text)
+
+  def _on_recipient_text_edited(self, text):
+    if self.recipient_index is None:
+      return
+    matches = self.recipient_index.search(text, limit=12)
+    self.recipient_model.setStringList([match.recipient.name for match in matches])
+
   def on_run(self):
     self.output.append(get_status())
 
@@ -531,6 +674,10 @@ class MainWindow(QMainWindow):
     row_layout.addWidget(text_container)
 
     row.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Fixed)
+    row.chat = chat
+    row.name_label = name
+    row.avatar_label = avatar
+    row.participant_label = participant_label
     row.mousePressEvent = lambda event, chat=chat, row=row: self._on_chat_clicked(
       event,
       chat,
@@ -596,15 +743,29 @@ class MainWindow(QMainWindow):
     bubble_layout.setContentsMargins(12, 8, 12, 8)
     bubble_layout.setSpacing(4)
 
-    text = QLabel(message["text"])
-    text.setObjectName("messageText")
-    text.setWordWrap(True)
-    text.setTextInteractionFlags(Qt.TextSelectableByMouse)
-    text.setMaximumWidth(420)
+    attachments = message.get("attachments") or []
+    for attachment in attachments:
+      bubble_layout.addWidget(self._build_attachment_preview(attachment))
 
-    bubble_layout.addWidget(text)
+    if not (attachments and message.get("kind") == "attachment"):
+      text = QLabel(message["text"])
+      text.setObjectName("messageText")
+      text.setWordWrap(True)
+      text.setTextInteractionFlags(Qt.TextSelectableByMouse)
+      text.setMaximumWidth(420)
+
+      bubble_layout.addWidget(text)
     content_layout.addWidget(bubble)
 
+    reactions = message.get("reactions")
+    if reactions:
+      summary = QLabel("  ".join(
+        f"{TAPBACK_LABELS.get(name, name)} {count}" if count > 1 else TAPBACK_LABELS.get(name, name)
+        for name, count in reactions.items()
+      ))
+      summary.setObjectName("messageReactions")
+      content_layout.addWidget(summary, alignment=Qt.AlignRight if message["is_from_me"] else Qt.AlignLeft)
+
     if message.get("show_avatar"):
       avatar = QLabel(message.get("avatar_initials", "?"))
       avatar.setObjectName("senderAvatar")
@@ -622,26 +783,72 @@ class MainWindow(QMainWindow):
 
     return wrapper
 
+  def _build_attachment_preview(self, attachment):
+    preview = QWidget()
+    preview_layout = QVBoxLayout(preview)
+    preview_layout.setContentsMargins(0, 0, 0, 0)
+    preview_layout.setSpacing(4)
+
+    if attachment.is_image:
+      image = QLabel()
+      image.setObjectName("attachmentThumbnail")
+      thumb = self.thumbnails.get(attachment)
+      if thumb:
+        image.setPixmap(QPixmap(thumb))
+      else:
+        image.setFixedSize(self.thumbnails.max_edge // 2, self.thumbnails.max_edge // 2)
+        self.thumbnail_labels.setdefault(attachment.attachment_rowid, []).append(image)
+        self.thumbnails.request(
+          attachment,
+          lambda att, path: self.thumbnail_notifier.ready.emit(att.attachment_rowid, path or ""),
+        )
+      preview_layout.addWidget(image)
+
+    caption = QLabel(f"{attachment.name} \u00b7 {format_size(attachment.total_bytes)}")
+    caption.setObjectName("attachmentCaption")
+    preview_layout.addWidget(caption)
+    return preview
+
+  def _on_thumbnail_ready(self, attachment_rowid, path):
+    labels = self.thumbnail_labels.pop(attachment_rowid, [])
+    if not path:
+      return
+    pixmap = QPixmap(path)
+    for label in labels:
+      label.setMinimumSize(0, 0)
+      label.setMaximumSize(16777215, 16777215)
+      label.setPixmap(pixmap)
+
   def _get_message_snapshot(self, rows):
-    return [(date_val, is_from_me, text, handle) for date_val, is_from_me, text, handle, _kind in rows]
+    return [
+      (date_val, is_from_me, text, handle, tuple(sorted(rows.reaction_counts(index).items())))
+      for index, (date_val, is_from_me, text, handle, _kind) in enumerate(rows)
+    ]
 
   def _build_message_payload(self, rows):
-    handles = [handle for _date, is_from_me, _text, handle, _kind in rows if not is_from_me and handle]
-    if handles:
-      ContactsConnector.build_index_for_handles(handles)
+    handles = list({handle for _date, is_from_me, _text, handle, _kind in rows if not is_from_me and handle})
+    names = dict(zip(handles, ContactsConnector.resolve_many(handles)))
 
     messages = []
-    for date_val, is_from_me, text, handle, _kind in reversed(rows):
+    senders = {}  # handle -> (sender_name, sender_key, initials), shared across bubbles
+    attachments = self.bridge.attachments_for(rows.rowids) if self.bridge else {}
+    for index in range(len(rows) - 1, -1, -1):
+      date_val, is_from_me, text, handle, kind = rows[index]
       normalized_text = (text or "").strip()
       if not normalized_text:
         normalized_text = "Shared an attachment."
-      if is_from_me:
-        sender_name = "You"
-        sender_key = "me"
-      else:
-        sender_name = ContactsConnector.get_contact_name(handle) or handle or "Unknown"
-        sender_key = handle or sender_name
-      initials = "".join([part[0] for part in sender_name.split()[:2]]).upper() or "?"
+      sender_lookup = (bool(is_from_me), None if is_from_me else handle)
+      sender = senders.get(sender_lookup)
+      if sender is None:
+        if is_from_me:
+          sender_name = "You"
+          sender_key = "me"
+        else:
+          sender_name = names.get(handle) or handle or "Unknown"
+          sender_key = handle or sender_name
+        initials = "".join([part[0] for part in sender_name.split()[:2]]).upper() or "?"
+        sender = senders[sender_lookup] = (sender_name, sender_key, initials)
+      sender_name, sender_key, initials = sender
       messages.append(
         {
           "text": text or normalized_text,
@@ -651,6 +858,9 @@ class MainWindow(QMainWindow):
           "sender_name": sender_name,
           "sender_key": sender_key,
           "avatar_initials": initials,
+          "reactions": rows.reaction_counts(index),
+          "kind": kind,
+          "attachments": attachments.get(rows.rowids[index], []),
         }
       )
 
@@ -679,6 +889,7 @@ class MainWindow(QMainWindow):
 
   def _render_messages(self, messages):
     self._clear_layout(self.message_layout)
+    self.thumbnail_labels = {}
     for message in messages:
       self.message_layout.addWidget(self._build_message_bubble(message, 32))
     self.message_layout.addStretch()
@@ -697,6 +908,7 @@ class MainWindow(QMainWindow):
 
     self.chat_list_snapshot = snapshot
     self._load_recipient_choices(chats)
+    self._rebuild_recipient_index()
     self._clear_layout(self.left_layout)
     self.chat_rows = []
     for chat in chats:
@@ -707,7 +919,58 @@ class MainWindow(QMainWindow):
         self._set_row_selected(row, True)
     return chats
 
-  def _poll_for_updates(self):
+  def _on_contacts_ready(self):
+    # Relabel the existing rows and bubbles; nothing is rebuilt or re-sorted.
+    fresh = {chat["id"]: chat for chat in self.bridge.top_chats(limit=50)}
+    for row in self.chat_rows:
+      chat = fresh.get(row.chat["id"])
+      if chat is None:
+        continue
+      row.chat.update(chat)  # the click handler holds this dict
+      row.name_label.setText(chat["name"])
+      row.avatar_label.setText(chat["initials"])
+      if row.participant_label is not None:
+        row.participant_label.setText(", ".join(chat.get("participants") or []))
+    chats = [row.chat for row in self.chat_rows]
+    self.chat_list_snapshot = [(chat["id"], chat["name"], chat["preview"], chat["time"]) for chat in chats]
+    self._load_recipient_choices(chats)
+    self._rebuild_recipient_index()
+    if self.current_chat:
+      self.current_chat.update(fresh.get(self.current_chat["id"], {}))
+      self.name_label.setText(self.current_chat["name"])
+      rows = self.bridge.last_messages_in_chat(int(self.current_chat["id"]), limit=60)
+      self.current_message_snapshot = self._get_message_snapshot(rows)
+      self._render_messages(self._build_message_payload(rows))
+
+  def _reconcile_mirror(self):
+    if not self.reconcile_lock.acquire(blocking=False):
+      return  # the previous run is still going
+    mirror = self.bridge.mirror
+
+    def run():
+      # Its own ChatDBMirror: a connection stays on the thread that made it.
+      try:
+        reconciler = ChatDBMirror(mirror.source_path, mirror.path)
+        try:
+          changed = reconciler.reconcile()
+        finally:
+          reconciler.close()
+      except sqlite3.Error:
+        changed = {}  # chat.db busy or unreadable; the next run retries
+      finally:
+        self.reconcile_lock.release()
+      if any(changed.values()):
+        self.change_notifier.changed.emit(None)
+
+    threading.Thread(target=run, name="mirror-reconcile", daemon=True).start()
+
+  def _on_source_changed(self, event):
+    chat_ids = None
+    if isinstance(event, MessagesAdded):
+      chat_ids = {str(chat_id) for chat_id in event.chat_ids}
+    self._poll_for_updates(chat_ids)
+
+  def _poll_for_updates(self, changed_chat_ids=None):
     chats = self._refresh_chat_list()
     if not self.current_chat:
       return
@@ -721,6 +984,9 @@ class MainWindow(QMainWindow):
       self.current_chat = updated_chat
       self.name_label.setText(updated_chat["name"])
 
+    if changed_chat_ids is not None and current_chat_id not in changed_chat_ids:
+      return
+
     rows = self.bridge.last_messages_in_chat(int(current_chat_id), limit=60)
     snapshot = self._get_message_snapshot(rows)
     if snapshot != self.current_message_snapshot:
@@ -729,16 +995,26 @@ class MainWindow(QMainWindow):
       self._render_messages(messages)
 
   def _load_chats(self):
-    bridge = MessageBridge()
-    chats = bridge.top_chats(limit=50)
+    self.bridge.refresh()
+    chats = self.bridge.top_chats(limit=50)
     return chats
 
 
 def main():
   app = QApplication(sys.argv)
+  # ALLINONE_SQL_STATS=<seconds> dumps per-query SQL timings to stderr
+  stats_interval = os.environ.get("ALLINONE_SQL_STATS")
+  if stats_interval:
+    DEFAULT_RECORDER.start_dump(float(stats_interval))
+  # ALLINONE_CONTACTS=<file.vcf|file.csv> takes names from an exported address book
+  contacts_file = os.environ.get("ALLINONE_CONTACTS")
+  if contacts_file:
+    ContactsConnector.configure(source_for_path(contacts_file))
   w = MainWindow()
   w.setMinimumSize(1100, 600)
   w.show()
+  app.aboutToQuit.connect(w.change_feed.stop)
+  app.aboutToQuit.connect(w.unsubscribe_contacts)
   sys.exit(app.exec())
 
 
@@ -0,0 +1,170 @@
+from __future__ import annotations
+
+import sys
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union, overload
+
+KINDS: Tuple[str, ...] = ("text", "attachment", "reaction", "unknown")
+_KIND_INDEX: Dict[str, int] = {kind: i for i, kind in enumerate(KINDS)}
+
+FLAG_FROM_ME = 0x01
+
+# (date, is_from_me, text, handle, kind)
+MessageTuple = Tuple[int, int, str, Optional[str], str]
+
+
+class MessageBatch(Sequence[MessageTuple]):
+    """
+    Columnar list of message rows.
+
+    Dates, flags and kinds live in typed arrays and each distinct handle is
+    stored once, so a batch costs a few bytes per message plus its text
+    instead of a tuple, a boxed int and a fresh handle string per row.
+
+    Indexing materializes the familiar (date, is_from_me, text, handle, kind)
+    tuple on demand, so existing call sites keep unpacking rows as before.
+    """
+
+    __slots__ = (
+        "rowids",
+        "dates",
+        "flags",
+        "kinds",
+        "texts",
+        "handle_refs",
+        "handles",
+        "reactions",
+        "_handle_index",
+    )
+
+    def __init__(self, rows: Optional[Sequence[MessageTuple]] = None) -> None:
+        self.rowids = array("q")  # message ROWID, 0 when unknown
+        self.dates = array("q")
+        self.flags = array("B")
+        self.kinds = array("B")
+        self.texts: List[str] = []
+        self.handle_refs = array("i")  # index into handles, -1 for None
+        self.handles: List[str] = []
+        # row index -> {tapback name: count}; sparse, most rows have none
+        self.reactions: Dict[int, Dict[str, int]] = {}
+        self._handle_index: Dict[str, int] = {}
+        if rows:
+            for row in rows:
+                self.append(*row)
+
+    def append(
+        self,
+        date: int,
+        is_from_me: int,
+        text: str,
+        handle: Optional[str],
+        kind: str,
+        message_rowid: int = 0,
+    ) -> None:
+        self.rowids.append(message_rowid)
+        self.dates.append(date)
+        self.flags.append(FLAG_FROM_ME if is_from_me else 0)
+        self.kinds.append(_KIND_INDEX[kind])
+        self.texts.append(text)
+        if handle is None:
+            self.handle_refs.append(-1)
+        else:
+            ref = self._handle_index.get(handle)
+            if ref is None:
+                ref = len(self.handles)
+                # interned, so batches of the same chat share handle strings
+                self.handles.append(sys.intern(handle))
+                self._handle_index[handle] = ref
+            self.handle_refs.append(ref)
+
+    def cursor(self, i: int) -> Tuple[int, int]:
+        """
+        (date, message_rowid) of row i, for MessageBridge.messages_before/after.
+        """
+        return self.dates[i], self.rowids[i]
+
+    def reaction_counts(self, i: int) -> Dict[str, int]:
+        """
+        Net tapbacks on row i, e.g. {"love": 2, "like": 1}.
+        """
+        return dict(self.reactions.get(i, ()))
+
+    def is_from_me(self, i: int) -> int:
+        return self.flags[i] & FLAG_FROM_ME
+
+    def handle(self, i: int) -> Optional[str]:
+        ref = self.handle_refs[i]
+        return self.handles[ref] if ref >= 0 else None
+
+    def kind(self, i: int) -> str:
+        return KINDS[self.kinds[i]]
+
+    def to_columns(self) -> Dict[str, object]:
+        """
+        The batch as plain columns (typed arrays as native-order bytes), for
+        shipping between processes. Inverse of from_columns.
+        """
+        return {
+            "rowids": self.rowids.tobytes(),
+            "dates": self.dates.tobytes(),
+            "flags": self.flags.tobytes(),
+            "kinds": self.kinds.tobytes(),
+            "handle_refs": self.handle_refs.tobytes(),
+            "texts": self.texts,
+            "handles": self.handles,
+            "reactions": [[i, counts] for i, counts in sorted(self.reactions.items())],
+        }
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, object]) -> "MessageBatch":
+        batch = cls()
+        batch.rowids.frombytes(columns["rowids"])
+        batch.dates.frombytes(columns["dates"])
+        batch.flags.frombytes(columns["flags"])
+        batch.kinds.frombytes(columns["kinds"])
+        batch.handle_refs.frombytes(columns["handle_refs"])
+        batch.texts = list(columns["texts"])
+        batch.handles = [sys.intern(handle) for handle in columns["handles"]]
+        batch._handle_index = {handle: i for i, handle in enumerate(batch.handles)}
+        batch.reactions = {int(i): dict(counts) for i, counts in columns["reactions"]}
+        return batch
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @overload
+    def __getitem__(self, i: int) -> MessageTuple: ...
+
+    @overload
+    def __getitem__(self, i: slice) -> "MessageBatch": ...
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[MessageTuple, "MessageBatch"]:
+        if isinstance(i, slice):
+            out = MessageBatch()
+            for j in range(*i.indices(len(self))):
+                if j in self.reactions:
+                    out.reactions[len(out)] = dict(self.reactions[j])
+                out.append(*self[j], message_rowid=self.rowids[j])
+            return out
+        return (
+            self.dates[i],
+            self.flags[i] & FLAG_FROM_ME,
+            self.texts[i],
+            self.handle(i),
+            KINDS[self.kinds[i]],
+        )
+
+    def __iter__(self) -> Iterator[MessageTuple]:
+        handles = self.handles
+        for date, flags, text, ref, kind in zip(self.dates, self.flags, self.texts, self.handle_refs, self.kinds):
+            yield (date, flags & FLAG_FROM_ME, text, handles[ref] if ref >= 0 else None, KINDS[kind])
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, MessageBatch) and self.reactions != other.reactions:
+            return False
+        if isinstance(other, (MessageBatch, list, tuple)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"MessageBatch({list(self)!r})"
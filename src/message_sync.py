@@ -0,0 +1,349 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+DEFAULT_SOURCE_DB = os.path.expanduser("~/Library/Messages/chat.db")
+DEFAULT_MIRROR_DB = os.path.expanduser("~/Library/Application Support/AllInOne/chat_mirror.db")
+
+# Tables pulled from chat.db.
+MIRRORED_TABLES: Tuple[str, ...] = (
+    "handle",
+    "chat",
+    "message",
+    "chat_message_join",
+    "chat_handle_join",
+    "attachment",
+    "message_attachment_join",
+)
+
+# Messages appends new rows, but it also updates rows in place (read and
+# delivered state, edits, unsends, attachment transfer state, chat renames,
+# group membership) and deletes them. sync() runs on every change and costs
+# time in proportion to what is new; reconcile() catches everything else and
+# costs time in proportion to the database, so it runs rarely and off the UI
+# thread. How each table is kept in step:
+#
+#   ROWID tables (INTEGER PRIMARY KEY AUTOINCREMENT, so ROWIDs are never
+#   reused or renumbered): rows above the watermark are new, and the newest
+#   RECONCILE_ROWS below it are re-compared by sync(), which is where
+#   in-place updates and deletions of recent rows land. reconcile() also
+#   looks for edited and unsent messages by date_edited / date_retracted in
+#   the EDIT_WINDOW_ROWS below that, and sweeps deletions anywhere once the
+#   row counts stop matching.
+RECONCILE_ROWS = 2_000
+EDIT_WINDOW_ROWS = 20_000
+ROWID_TABLES = frozenset(("handle", "chat", "message", "attachment"))
+#   Join tables with an implicit rowid, which VACUUM may renumber: new rows
+#   are found through their parents' watermarks, {table: ((column, parent), ...)}.
+#   sync() follows only the first parent, whose column leads an index (Messages
+#   writes a join row together with its message or chat); reconcile() follows
+#   all of them and sweeps rows removed without their parent.
+CHILD_TABLES: Dict[str, Tuple[Tuple[str, str], ...]] = {
+    "chat_message_join": (("message_id", "message"),),
+    "chat_handle_join": (("chat_id", "chat"), ("handle_id", "handle")),
+    "message_attachment_join": (("message_id", "message"), ("attachment_id", "attachment")),
+}
+#   Small tables reconcile() compares in full (chat renames, group membership).
+FULL_TABLES = frozenset(("chat", "chat_handle_join"))
+EDIT_STAMP_COLUMNS = ("date_edited", "date_retracted")
+
+_SYNC_STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS _sync_state (
+    table_name TEXT PRIMARY KEY,
+    watermark INTEGER NOT NULL
+)
+"""
+
+
+class ChatDBMirror:
+    """
+    Persistent local copy of chat.db, kept up to date by pulling rows above
+    a per-table ROWID watermark and reconciling the rows Messages changes in
+    place (see the table strategies above).
+
+    A source whose ROWIDs went backwards, or whose row at a watermark is no
+    longer the one mirrored (chat.db restored or recreated), is mirrored
+    again from scratch. A connection belongs to one thread, so to reconcile
+    in the background open a second ChatDBMirror on the same paths there;
+    the mirror is in WAL mode and the two serialize on its write lock.
+    """
+
+    def __init__(
+        self,
+        source_path: Optional[str] = None,
+        mirror_path: Optional[str] = None,
+        tables: Sequence[str] = MIRRORED_TABLES,
+        reconcile_rows: int = RECONCILE_ROWS,
+        edit_window_rows: int = EDIT_WINDOW_ROWS,
+    ) -> None:
+        self.source_path = source_path or DEFAULT_SOURCE_DB
+        self.path = mirror_path or DEFAULT_MIRROR_DB
+        self.tables = tuple(tables)
+        self.reconcile_rows = reconcile_rows
+        self.edit_window_rows = edit_window_rows
+        self.resets = 0  # times the mirror was rebuilt after a ROWID regression
+        self._deleted_from: Set[str] = set()  # tables rows were deleted from during this sync
+
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(_SYNC_STATE_SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def watermarks(self) -> Dict[str, int]:
+        rows = self.conn.execute("SELECT table_name, watermark FROM _sync_state").fetchall()
+        return {name: int(mark) for name, mark in rows}
+
+    def sync(self) -> Dict[str, int]:
+        """
+        Pull new rows and the recent rows Messages changes in place.
+
+        Returns { table_name: rows_changed } for this call (inserted, updated
+        or deleted). All tables are read in one transaction, so the mirror
+        never holds a message whose chat_message_join row is still missing
+        (or vice versa). Costs time in proportion to new rows plus the
+        reconcile window, not to the size of chat.db.
+        """
+        return self._run(full=False)
+
+    def reconcile(self) -> Dict[str, int]:
+        """
+        sync(), plus edits and unsends below the reconcile window, deletions
+        anywhere, chat renames and membership changes. Reads every table, so
+        call it rarely and not on the UI thread. Same return value as sync().
+        """
+        return self._run(full=True)
+
+    def _run(self, full: bool) -> Dict[str, int]:
+        source_uri = "file:" + os.path.abspath(self.source_path) + "?mode=ro"
+        self.conn.execute("ATTACH DATABASE ? AS src", (source_uri,))
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._ensure_schema()
+                marks = self.watermarks()
+                if self._regressed(marks):
+                    self._reset()
+                    marks = {}
+                columns = {table: self._columns(table) for table in self.tables}
+                self._deleted_from = set()
+                changed = {}
+                for table in self.tables:
+                    cols, rowid_alias = columns[table]
+                    if not cols:
+                        # Older chat.db versions lack some tables (e.g. attachment joins).
+                        changed[table] = 0
+                    elif (full and table in FULL_TABLES) or (not rowid_alias and table not in CHILD_TABLES):
+                        changed[table] = self._reconcile_full(table, cols, rowid_alias)
+                    elif table in CHILD_TABLES:
+                        changed[table] = self._pull_children(table, cols, marks, full)
+                    else:
+                        changed[table] = self._pull_rowid_table(table, cols, marks.get(table, 0), full)
+                self._sweep_orphans(changed)
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        finally:
+            self.conn.execute("DETACH DATABASE src")
+        return changed
+
+    def _ensure_schema(self) -> None:
+        existing = {
+            row[0]
+            for row in self.conn.execute(
+                "SELECT name FROM main.sqlite_master WHERE type IN ('table', 'index')"
+            )
+        }
+        placeholders = ",".join("?" for _ in self.tables)
+        # Tables first, then their indexes. Triggers are skipped on purpose: the
+        # real chat.db triggers call functions that only exist inside Messages.
+        rows = self.conn.execute(
+            f"""
+            SELECT type, name, sql
+            FROM src.sqlite_master
+            WHERE type IN ('table', 'index')
+              AND tbl_name IN ({placeholders})
+              AND sql IS NOT NULL
+            ORDER BY type = 'index', name
+            """,
+            self.tables,
+        ).fetchall()
+        for _type, name, sql in rows:
+            if name not in existing:
+                self.conn.execute(sql)
+
+    def _regressed(self, marks: Dict[str, int]) -> bool:
+        # ROWID tables are AUTOINCREMENT, so their sqlite_sequence entry only
+        # ever grows (deleting the newest rows doesn't lower it). One below
+        # the watermark, or a row at the watermark with another guid, means
+        # this is not the database the mirror was built from.
+        for table in self.tables:
+            mark = marks.get(table, 0)
+            if table not in ROWID_TABLES or not mark:
+                continue
+            seq = self.conn.execute("SELECT seq FROM src.sqlite_sequence WHERE name = ?", (table,)).fetchone()
+            if seq is None:
+                seq = self.conn.execute(f'SELECT MAX(rowid) FROM src."{table}"').fetchone()
+            if seq[0] is None or seq[0] < mark:
+                return True
+            if "guid" in self._columns(table)[0]:
+                src_row = self.conn.execute(f'SELECT guid FROM src."{table}" WHERE rowid = ?', (mark,)).fetchone()
+                main_row = self.conn.execute(f'SELECT guid FROM main."{table}" WHERE rowid = ?', (mark,)).fetchone()
+                if src_row is not None and main_row is not None and src_row != main_row:
+                    return True
+        return False
+
+    def _reset(self) -> None:
+        for table in self.tables:
+            if self._columns(table)[0]:
+                self.conn.execute(f'DELETE FROM main."{table}"')
+        self.conn.execute("DELETE FROM _sync_state")
+        self.resets += 1
+
+    def _set_mark(self, name: str, value: int) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO _sync_state (table_name, watermark) VALUES (?, ?)",
+            (name, int(value)),
+        )
+
+    def _pull_rowid_table(self, table: str, columns: List[str], watermark: int, full: bool) -> int:
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        low = max(0, watermark - self.reconcile_rows)
+
+        # New rows and changed rows in the reconcile window, in one statement:
+        # everything in the source window that the mirror doesn't hold verbatim.
+        changed = self._rowcount(self.conn.execute(
+            f"""
+            INSERT OR REPLACE INTO main."{table}" ({col_sql})
+            SELECT {col_sql} FROM src."{table}" WHERE rowid > :low
+            EXCEPT
+            SELECT {col_sql} FROM main."{table}" WHERE rowid > :low
+            """,
+            {"low": low},
+        ))
+        changed += self._delete(table, f"""
+            rowid > :low AND rowid <= :mark
+            AND rowid NOT IN (SELECT rowid FROM src."{table}" WHERE rowid > :low)
+            """, {"low": low, "mark": watermark})
+        if full:
+            if table == "message":
+                changed += self._pull_edits(columns, col_sql, low)
+            # Deletions below the window: the row counts stop matching.
+            (src_count,) = self.conn.execute(f'SELECT COUNT(*) FROM src."{table}"').fetchone()
+            (main_count,) = self.conn.execute(f'SELECT COUNT(*) FROM main."{table}"').fetchone()
+            if src_count != main_count:
+                changed += self._delete(table, f"""
+                    rowid <= :low AND rowid NOT IN (SELECT rowid FROM src."{table}" WHERE rowid <= :low)
+                    """, {"low": low})
+
+        if changed:
+            (new_mark,) = self.conn.execute(f'SELECT MAX(rowid) FROM main."{table}"').fetchone()
+            self._set_mark(table, new_mark or 0)
+        return changed
+
+    def _pull_edits(self, columns: List[str], col_sql: str, low: int) -> int:
+        # Messages can only be edited or unsent for a while after they are
+        # sent, so edited rows below the reconcile window are looked for in
+        # the EDIT_WINDOW_ROWS under it, by their edit timestamps.
+        stamps = [c for c in EDIT_STAMP_COLUMNS if c in columns]
+        if not stamps or not low:
+            return 0
+        edited = " OR ".join(f'COALESCE("{c}", 0) > 0' for c in stamps)
+        return self._rowcount(self.conn.execute(
+            f"""
+            INSERT OR REPLACE INTO main.message ({col_sql})
+            SELECT {col_sql} FROM src.message WHERE rowid > :edit_low AND rowid <= :low AND ({edited})
+            EXCEPT
+            SELECT {col_sql} FROM main.message WHERE rowid > :edit_low AND rowid <= :low AND ({edited})
+            """,
+            {"edit_low": max(0, low - self.edit_window_rows), "low": low},
+        ))
+
+    def _pull_children(self, table: str, columns: List[str], marks: Dict[str, int], full: bool) -> int:
+        # Join rows of parents that are new since the last sync. The tables
+        # have a UNIQUE key over their columns, so rows already held are
+        # ignored. Rows whose parent went away are swept in _sweep_orphans.
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        changed = 0
+        parents = CHILD_TABLES[table] if full else CHILD_TABLES[table][:1]
+        for column, parent in parents:
+            if column not in columns:
+                continue
+            changed += self._rowcount(self.conn.execute(
+                f"""
+                INSERT OR IGNORE INTO main."{table}" ({col_sql})
+                SELECT {col_sql} FROM src."{table}" WHERE "{column}" > ?
+                """,
+                (marks.get(parent, 0),),
+            ))
+        if full:
+            # Join rows removed without their parent: the row counts stop matching.
+            (src_count,) = self.conn.execute(f'SELECT COUNT(*) FROM src."{table}"').fetchone()
+            (main_count,) = self.conn.execute(f'SELECT COUNT(*) FROM main."{table}"').fetchone()
+            if src_count != main_count:
+                same = " AND ".join(f's."{c}" IS m."{c}"' for c in columns)
+                changed += self._delete(table, f'NOT EXISTS (SELECT 1 FROM src."{table}" s WHERE {same})')
+        return changed
+
+    def _reconcile_full(self, table: str, columns: List[str], rowid_alias: bool) -> int:
+        col_sql = ", ".join(f'"{c}"' for c in columns)
+        changed = self._rowcount(self.conn.execute(
+            f"""
+            INSERT OR REPLACE INTO main."{table}" ({col_sql})
+            SELECT {col_sql} FROM src."{table}"
+            EXCEPT
+            SELECT {col_sql} FROM main."{table}"
+            """
+        ))
+        if rowid_alias:
+            gone = f'rowid NOT IN (SELECT rowid FROM src."{table}")'
+        else:
+            same = " AND ".join(f's."{c}" IS m."{c}"' for c in columns)
+            gone = f'NOT EXISTS (SELECT 1 FROM src."{table}" s WHERE {same})'
+        changed += self._delete(table, gone)
+        if changed and rowid_alias:
+            (new_mark,) = self.conn.execute(f'SELECT MAX(rowid) FROM main."{table}"').fetchone()
+            self._set_mark(table, new_mark or 0)
+        return changed
+
+    def _delete(self, table: str, where: str, params: Optional[Dict[str, int]] = None) -> int:
+        deleted = self._rowcount(self.conn.execute(f'DELETE FROM main."{table}" AS m WHERE {where}', params or {}))
+        if deleted:
+            self._deleted_from.add(table)
+        return deleted
+
+    def _sweep_orphans(self, changed: Dict[str, int]) -> None:
+        # Join rows left pointing at messages, chats or attachments deleted
+        # during this sync.
+        for table in self.tables:
+            if table not in CHILD_TABLES:
+                continue
+            cols = self._columns(table)[0]
+            parents = dict(CHILD_TABLES[table])
+            parents.setdefault("chat_id", "chat")
+            for column, parent in parents.items():
+                if column in cols and parent in self._deleted_from:
+                    changed[table] = changed.get(table, 0) + self._rowcount(self.conn.execute(
+                        f"""
+                        DELETE FROM main."{table}"
+                        WHERE "{column}" NOT IN (SELECT rowid FROM main."{parent}")
+                        """
+                    ))
+
+    @staticmethod
+    def _rowcount(cur: sqlite3.Cursor) -> int:
+        return cur.rowcount if cur.rowcount is not None and cur.rowcount > 0 else 0
+
+    def _columns(self, table: str) -> Tuple[List[str], bool]:
+        info = self.conn.execute(f'PRAGMA src.table_info("{table}")').fetchall()
+        # (cid, name, type, notnull, dflt_value, pk)
+        pk_cols = [row for row in info if row[5]]
+        rowid_alias = len(pk_cols) == 1 and (pk_cols[0][2] or "").upper() == "INTEGER"
+        return [row[1] for row in info], rowid_alias
@@ -1,40 +1,204 @@
 import subprocess
-import os
-import shutil
 import sqlite3
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import snapshots
+from attachments import AttachmentInfo, load_attachments
 from contacts import ContactsConnector
-from typing import Any, Dict, List, Optional, Tuple
-from Foundation import NSData, NSKeyedUnarchiver  # type: ignore
+from message_batch import MessageBatch
+from message_sync import ChatDBMirror
+from parallel_decode import BodyDecoderPool
+from snapshots import Snapshot
+from sql_stats import DEFAULT_RECORDER, InstrumentedCursor, QueryRecorder
+from typedstream import decode_attributed_body
+
+try:
+    from Foundation import NSData, NSUnarchiver  # type: ignore
+    _HAS_FOUNDATION = True
+except ImportError:
+    _HAS_FOUNDATION = False
 
 APPLE_EPOCH = 978307200  # seconds between 1970-01-01 and 2001-01-01
+BODY_CACHE_SIZE = 50_000  # decoded attributedBody texts kept per bridge
+STATEMENT_CACHE_SIZE = 256  # prepared statements kept per connection
+TAPBACK_TYPES = set(range(2000, 2006)) | set(range(3000, 3006))
+TAPBACK_NAMES = {
+    2000: "love",
+    2001: "like",
+    2002: "dislike",
+    2003: "laugh",
+    2004: "emphasize",
+    2005: "question",
+}
+TAPBACK_REMOVE_OFFSET = 1000  # 3000-3005 removes the matching 2000-2005
+
+# SQL predicate for rows that render as a bubble (everything but tapbacks).
+VISIBLE_MESSAGE_SQL = (
+    "COALESCE(m.associated_message_type, 0) NOT BETWEEN 2000 AND 2005"
+    " AND COALESCE(m.associated_message_type, 0) NOT BETWEEN 3000 AND 3005"
+)
+# A tapback's associated_message_guid names the target part: "p:<n>/<guid>",
+# "bp:<guid>" for plugin balloons, or the bare guid. Text runs and
+# attachments alternate, so a message with n attachments has at most 2n + 1
+# parts; every key a target can have is probed exactly through
+# message_idx_associated_message.
+REACTION_LOOKUP_KEYS = 900  # keys per lookup query, under SQLite's variable limit
+
+# latest(chat_id, message_id): newest message per chat, one index seek on
+# chat_message_join(chat_id, message_date, message_id) each. message_id
+# breaks ties on identical dates so every chat yields exactly one row.
+LATEST_MESSAGE_PER_CHAT_CTE = """
+    WITH latest AS (
+        SELECT
+            c.ROWID AS chat_id,
+            (
+                SELECT cmj.message_id
+                FROM chat_message_join cmj
+                WHERE cmj.chat_id = c.ROWID
+                ORDER BY cmj.message_date DESC, cmj.message_id DESC
+                LIMIT 1
+            ) AS message_id
+        FROM chat c
+    )
+"""
 
 
-class MessageBridge:
+# MessageBridge open strategies
+OPEN_COPY = "copy"  # versioned snapshot copy of chat.db (+WAL)
+OPEN_READONLY = "readonly"  # read chat.db in place, fall back to a copy
+OPEN_MIRROR = "mirror"  # incremental ChatDBMirror
+
+
+@dataclass(frozen=True)
+class OpenReport:
+    strategy: str  # what the bridge ended up using
+    seconds: float  # time to a usable connection, including any copy
+    fallback_reason: Optional[str] = None  # why a readonly open fell back to copy
+
+
+def tapback_target_guid(associated_message_guid: str) -> str:
+    """
+    GUID of the message a tapback points at ("p:0/<guid>" or "bp:<guid>").
+    """
+    if associated_message_guid.startswith("p:"):
+        return associated_message_guid.partition("/")[2]
+    if associated_message_guid.startswith("bp:"):
+        return associated_message_guid[3:]
+    return associated_message_guid
 
-    def __init__(self, db_path=None):
-        if db_path is None:
-            self._copy_messages_db_snapshot()
-        src = db_path or os.path.expanduser("~/Library/Messages/chat.db")
-        self.tmp = "/tmp/chat.db"
-        shutil.copy2(src, self.tmp)  # avoids "db locked" issues
-        self.conn = sqlite3.connect(self.tmp)
-        self.cur = self.conn.cursor()
-    
-    @staticmethod
-    def _copy_messages_db_snapshot() -> None:
-        src_db = os.path.expanduser("~/Library/Messages/chat.db")
-        tmp_db = "/tmp/chat.db"
 
+class MessageBridge:
+
+    def __init__(
+        self,
+        db_path=None,
+        mirror: Optional[ChatDBMirror] = None,
+        query_stats: Optional[QueryRecorder] = None,
+        open_mode: str = OPEN_COPY,
+    ):
+        self.mirror = mirror
+        self.source_path = db_path or snapshots.DEFAULT_SOURCE_DB
+        # Per-query latency/row stats for every statement the bridge runs
+        self.query_stats = query_stats or DEFAULT_RECORDER
+        self.snapshot: Optional[Snapshot] = None
+        # (ROWID, date_edited) -> decoded text; an edit changes the key
+        self._body_cache: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+        self._data_version: Optional[int] = None
+
+        t0 = time.perf_counter()
+        fallback_reason = None
+        if mirror is not None:
+            # Delta-sync mode: read the persistent mirror instead of a full copy
+            mirror.sync()
+            self.tmp = mirror.path
+            self.conn = self._connect(self.tmp)
+            self.open_mode = OPEN_MIRROR
+        elif open_mode == OPEN_READONLY:
+            try:
+                self._open_readonly()
+            except sqlite3.OperationalError as e:
+                fallback_reason = str(e)
+                self._open_copy()
+        else:
+            self._open_copy()
+        self.open_report = OpenReport(self.open_mode, time.perf_counter() - t0, fallback_reason)
+        self.cur = self._cursor()
+        # date_edited only exists on macOS 13+ chat.db
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(message)")}
+        self._date_edited_sql = "m.date_edited" if "date_edited" in columns else "0"
+
+    def _open_readonly(self) -> None:
+        # Zero-copy: no snapshot to manage, each statement sees the latest
+        # committed state of chat.db.
+        self.conn = snapshots.connect_readonly(
+            self.source_path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        self.tmp = self.source_path
+        self.open_mode = OPEN_READONLY
+        (self._data_version,) = self.conn.execute("PRAGMA data_version").fetchone()
+
+    def _open_copy(self) -> None:
+        # Versioned snapshot, only re-copied when chat.db/WAL changed
+        # (avoids "db locked" issues without clobbering other readers)
+        self._snapshots = snapshots.manager_for(self.source_path)
+        self.snapshot = self._snapshots.acquire()
+        self.tmp = self.snapshot.path
+        self.conn = self._connect(self.tmp)
+        self.open_mode = OPEN_COPY
+
+    def refresh(self) -> bool:
         """
-        Copy chat.db + WAL/SHM so we include newest messages (WAL mode).
+        Bring the bridge up to date with chat.db.
+        Returns True if there may be new data to read.
         """
-        shutil.copy2(src_db, tmp_db)
-        for suffix in ("-wal", "-shm"):
-            s = src_db + suffix
-            d = tmp_db + suffix
-            if os.path.exists(s):
-                shutil.copy2(s, d)
+        if self.mirror is not None:
+            return any(self.mirror.sync().values())
+
+        if self.open_mode == OPEN_READONLY:
+            # Already live; data_version moves when another connection commits.
+            try:
+                (version,) = self.conn.execute("PRAGMA data_version").fetchone()
+            except sqlite3.OperationalError:
+                self.conn.close()
+                self._open_copy()
+                self.cur = self._cursor()
+                return True
+            changed = version != self._data_version
+            self._data_version = version
+            return changed
+
+        latest = self._snapshots.acquire()
+        if latest.version == self.snapshot.version:
+            latest.release()
+            return False
+        self.conn.close()
+        self.snapshot.release()
+        self.snapshot = latest
+        self.tmp = latest.path
+        self.conn = self._connect(self.tmp)
+        self.cur = self._cursor()
+        return True
+
+    @staticmethod
+    def _connect(path: str) -> sqlite3.Connection:
+        # A bridge is only ever used by one thread at a time, but ReaderPool
+        # may close it from another one.
+        return sqlite3.connect(path, check_same_thread=False, cached_statements=STATEMENT_CACHE_SIZE)
+
+    def _cursor(self) -> InstrumentedCursor:
+        return InstrumentedCursor(self.conn.cursor(), self.query_stats)
+
+    def close(self) -> None:
+        self.conn.close()
+        if self.snapshot is not None:
+            self.snapshot.release()
+            self.snapshot = None
 
     @staticmethod
     def apple_time_to_dt(t):
@@ -70,8 +234,8 @@ class MessageBridge:
         """)
         handles = [row[0] for row in self.cur.fetchall()]
 
-        # 3) Build contact index once
-        ContactsConnector.build_index_for_handles(handles)
+        # 3) Resolve names, waiting for the contact index to load
+        ContactsConnector.build_index_for_handles(handles, wait=True)
 
         # 4) Print messages
         for date_val, is_from_me, text, handle in messages:
@@ -85,7 +249,8 @@ class MessageBridge:
         """
         Returns a list of the most recent chats with display-friendly metadata.
         """
-        self.cur.execute("""
+        self.cur.execute(f"""
+            {LATEST_MESSAGE_PER_CHAT_CTE}
             SELECT
                 c.ROWID AS chat_id,
                 c.display_name,
@@ -94,35 +259,26 @@ class MessageBridge:
                 m.is_from_me,
                 COALESCE(m.text, '') AS text,
                 h.id AS handle
-            FROM chat c
-            JOIN chat_message_join cmj ON cmj.chat_id = c.ROWID
-            JOIN message m ON m.ROWID = cmj.message_id
+            FROM latest l
+            JOIN chat c ON c.ROWID = l.chat_id
+            JOIN message m ON m.ROWID = l.message_id
             LEFT JOIN handle h ON h.ROWID = m.handle_id
-            WHERE m.date = (
-                SELECT MAX(m2.date)
-                FROM chat_message_join cmj2
-                JOIN message m2 ON m2.ROWID = cmj2.message_id
-                WHERE cmj2.chat_id = c.ROWID
-            )
-            ORDER BY m.date DESC
+            ORDER BY m.date DESC, m.ROWID DESC
             LIMIT ?
         """, (limit,))
         rows = self.cur.fetchall()
 
         chat_ids = [row[0] for row in rows]
-        participant_handles: Dict[int, List[str]] = {}
-        all_handles: List[str] = [row[6] for row in rows if row[4] == 0 and row[6]]
-        for chat_id in chat_ids:
-            handles = self._chat_participants(chat_id)
-            participant_handles[chat_id] = handles
+        participant_handles = self._chat_participants_many(chat_ids)
+        all_handles: List[str] = [row[6] for row in rows if row[6]]
+        for handles in participant_handles.values():
             all_handles.extend(handles)
-
-        ContactsConnector.build_index_for_handles(all_handles)
+        names = dict(zip(all_handles, ContactsConnector.resolve_many(all_handles)))
 
         chats: List[Dict[str, Optional[str]]] = []
         for chat_id, display_name, chat_identifier, date_val, is_from_me, text, handle in rows:
             dt = self.apple_time_to_dt(date_val)
-            name = display_name or ContactsConnector.get_contact_name(handle) or handle or chat_identifier or "Unknown"
+            name = display_name or names.get(handle) or handle or chat_identifier or "Unknown"
             preview = " ".join((text or "").split()) or "No message"
             time_str = dt.strftime("%I:%M %p").lstrip("0") if dt else ""
             initials = "".join([part[0] for part in name.split()[:2]]).upper() or "?"
@@ -131,7 +287,7 @@ class MessageBridge:
             for h in participant_handles.get(chat_id, []):
                 if not h:
                     continue
-                name_val = ContactsConnector.get_contact_name(h) or h or "Unknown"
+                name_val = names.get(h) or h or "Unknown"
                 if name_val in seen_participants:
                     continue
                 seen_participants.add(name_val)
@@ -151,14 +307,59 @@ class MessageBridge:
         return chats
 
     def _chat_participants(self, chat_id: int) -> List[str]:
-        self.cur.execute("""
-            SELECT DISTINCT h.id
+        return self._chat_participants_many([chat_id]).get(chat_id, [])
+
+    def _chat_participants_many(self, chat_ids: List[int]) -> Dict[int, List[str]]:
+        """
+        Participant handles for many chats in one query: { chat_id: [handle, ...] }
+        """
+        out: Dict[int, List[str]] = {chat_id: [] for chat_id in chat_ids}
+        if not chat_ids:
+            return out
+        placeholders = ",".join("?" for _ in chat_ids)
+        self.cur.execute(f"""
+            SELECT DISTINCT chj.chat_id, h.id
             FROM chat_handle_join chj
             JOIN handle h ON h.ROWID = chj.handle_id
-            WHERE chj.chat_id = ?
-        """, (chat_id,))
-        return [row[0] for row in self.cur.fetchall() if row[0]]
+            WHERE chj.chat_id IN ({placeholders})
+        """, tuple(chat_ids))
+        for chat_id, handle in self.cur.fetchall():
+            if handle:
+                out[chat_id].append(handle)
+        return out
     
+    def chat_directory(self) -> List[Tuple[int, Optional[str], Optional[str], List[str]]]:
+        """
+        Every chat, most recently active first:
+        [(chat_id, display_name, chat_identifier, [participant handle, ...])]
+        """
+        self.cur.execute("""
+            SELECT
+                c.ROWID,
+                c.display_name,
+                c.chat_identifier,
+                h.id,
+                (
+                    SELECT MAX(cmj.message_date)
+                    FROM chat_message_join cmj
+                    WHERE cmj.chat_id = c.ROWID
+                ) AS last_date
+            FROM chat c
+            LEFT JOIN chat_handle_join chj ON chj.chat_id = c.ROWID
+            LEFT JOIN handle h ON h.ROWID = chj.handle_id
+            ORDER BY last_date DESC, c.ROWID DESC
+        """)
+        out: List[Tuple[int, Optional[str], Optional[str], List[str]]] = []
+        index: Dict[int, List[str]] = {}
+        for chat_id, display_name, chat_identifier, handle, _last_date in self.cur.fetchall():
+            handles = index.get(chat_id)
+            if handles is None:
+                handles = index[chat_id] = []
+                out.append((chat_id, display_name or None, chat_identifier, handles))
+            if handle and handle not in handles:
+                handles.append(handle)
+        return out
+
     # Sends a Imessage message 
     def send_imessage(self, phone_or_email, text):
         script = f'''
@@ -168,68 +369,65 @@ class MessageBridge:
         '''
         subprocess.run(["osascript", "-e", script])
     
-    MessageRow = Tuple[int, int, str, Optional[str], str, List[Dict[str, Any]]]
+    MessageRow = Tuple[int, int, str, Optional[str], str]
+    # (message_rowid, chat_rowid, date, is_from_me, text, handle, kind)
+    HistoryRow = Tuple[int, int, int, int, str, Optional[str], str]
 
-    def _text_from_attributed_body(self, blob: Optional[bytes]) -> str:
+    def _text_from_attributed_body(
+        self,
+        blob: Optional[bytes],
+        message_rowid: Optional[int] = None,
+        date_edited: Optional[int] = None,
+        cache: "Optional[OrderedDict[Tuple[int, int], str]]" = None,
+    ) -> str:
         """
         Decode Messages' message.attributedBody (often a 'typedstream' archive).
         Tries:
-            1) NSUnarchiver (typedstream)
-            2) NSKeyedUnarchiver (keyed)
-            3) best-effort byte pattern extraction
+            1) pure-Python typedstream / keyed-archive decoder (no Foundation)
+            2) NSUnarchiver (typedstream), when running on macOS
+        Results are cached per (message ROWID, date_edited), so re-polling a
+        chat never decodes the same blob twice and an edited message is
+        decoded again. `cache` defaults to the bridge's LRU.
         """
         if not blob:
             return ""
 
-        # Ensure it's bytes (sqlite can sometimes hand back memoryview)
-        if isinstance(blob, memoryview):
-            blob = blob.tobytes()
-
-        # 1) Typedstream path (your blobs: b'\\x04\\x0bstreamtyped...')
-        try:
-            from Foundation import NSData, NSUnarchiver  # type: ignore
-
-            data = NSData.dataWithBytes_length_(blob, len(blob))
-            obj = NSUnarchiver.unarchiveObjectWithData_(data)
-            if obj is not None and hasattr(obj, "string"):
-                return str(obj.string())
-        except Exception:
-            pass
-
-        # 2) Keyed-archive fallback (some macOS versions / other blobs)
-        try:
-            from Foundation import NSData, NSKeyedUnarchiver  # type: ignore
-
-            data = NSData.dataWithBytes_length_(blob, len(blob))
-            obj = NSKeyedUnarchiver.unarchiveObjectWithData_(data)
-            if obj is not None and hasattr(obj, "string"):
-                return str(obj.string())
-        except Exception:
-            pass
-
-        # 3) Best-effort fallback:
-        # Many blobs embed text as: b"\\x01+" + <1 byte length> + <utf8 bytes>
-        try:
-            marker = b"\x01+"
-            i = blob.find(marker)
-            if i != -1 and i + 3 <= len(blob):
-                n = blob[i + 2]
-                start = i + 3
-                end = start + n
-                if end <= len(blob):
-                    return blob[start:end].decode("utf-8", errors="ignore")
-        except Exception:
-            pass
-
-        return ""
+        if cache is None:
+            cache = self._body_cache
+        key = (message_rowid, int(date_edited or 0))
+        if message_rowid is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                cache.move_to_end(key)
+                return cached
+
+        text = decode_attributed_body(blob)
+
+        if not text and _HAS_FOUNDATION:
+            try:
+                if isinstance(blob, memoryview):
+                    blob = blob.tobytes()
+                data = NSData.dataWithBytes_length_(blob, len(blob))
+                obj = NSUnarchiver.unarchiveObjectWithData_(data)
+                if obj is not None and hasattr(obj, "string"):
+                    text = str(obj.string())
+            except Exception:
+                pass
+
+        if message_rowid is not None:
+            cache[key] = text
+            if len(cache) > BODY_CACHE_SIZE:
+                cache.popitem(last=False)
+        return text
 
     def last_messages_in_chat(
         self,
         chat_rowid: int,
         limit: int = 100,
-    ) -> List[MessageRow]:
+    ) -> MessageBatch:
         """
-        Returns last N messages for a single conversation (chat ROWID).
+        Returns last N messages for a single conversation (chat ROWID),
+        as a compact MessageBatch that iterates/indexes like a list of rows.
 
         Each row:
         (date, is_from_me, text, handle, kind)
@@ -237,34 +435,95 @@ class MessageBridge:
         kind:
         - "text"
         - "attachment"  (pure attachment bubble with no visible text)
-        - "reaction"    (tapback)
         - "unknown"
+
+        Tapbacks are not rows of their own: they are folded onto the message
+        they target (batch.reaction_counts(i)), so N counts visible bubbles.
         """
-        TAPBACK_TYPES = set(range(2000, 2006)) | set(range(3000, 3006))
+        return self._messages_page(chat_rowid, limit)
 
-        self.cur.execute("""
+    def messages_before(
+        self,
+        chat_rowid: int,
+        before: Optional[Tuple[int, int]] = None,
+        limit: int = 60,
+    ) -> MessageBatch:
+        """
+        One page of older history: up to `limit` messages strictly older than
+        the `before` cursor, newest first (same rows as last_messages_in_chat).
+
+        Cursors are (date, message_rowid); take the next one from the oldest
+        row of the page, `page.cursor(len(page) - 1)`. before=None starts at
+        the newest message. Every page is a single index seek, so it costs the
+        same no matter how deep into the history it is.
+        """
+        return self._messages_page(chat_rowid, limit, before=before, query_name="messages_before")
+
+    def messages_after(
+        self,
+        chat_rowid: int,
+        after: Tuple[int, int],
+        limit: int = 60,
+    ) -> MessageBatch:
+        """
+        Up to `limit` messages strictly newer than the `after` cursor (the
+        ones closest to it), returned newest first like messages_before.
+        Use `page.cursor(0)` of the newest page you have to poll for new rows.
+        """
+        return self._messages_page(chat_rowid, limit, after=after, query_name="messages_after")
+
+    def _messages_page(
+        self,
+        chat_rowid: int,
+        limit: int,
+        before: Optional[Tuple[int, int]] = None,
+        after: Optional[Tuple[int, int]] = None,
+        query_name: str = "last_messages_in_chat",
+    ) -> MessageBatch:
+        # Seeks on chat_message_join(chat_id, message_date, message_id);
+        # message_id keeps the order total when dates tie.
+        seek = ""
+        order = "DESC"
+        params: Tuple[int, ...] = (chat_rowid,)
+        if before is not None:
+            seek = "AND (cmj.message_date, cmj.message_id) < (?, ?)"
+            params += (int(before[0]), int(before[1]))
+        elif after is not None:
+            seek = "AND (cmj.message_date, cmj.message_id) > (?, ?)"
+            order = "ASC"
+            params += (int(after[0]), int(after[1]))
+
+        self.cur.execute(f"""
         SELECT
             m.ROWID AS message_rowid,
+            m.guid,
             m.date,
             m.is_from_me,
             m.text,
             m.attributedBody,
             h.id AS handle,
             m.cache_has_attachments,
-            m.associated_message_type
+            m.associated_message_type,
+            {self._date_edited_sql} AS date_edited
         FROM chat_message_join cmj
         JOIN message m ON m.ROWID = cmj.message_id
         LEFT JOIN handle h ON h.ROWID = m.handle_id
         WHERE cmj.chat_id = ?
-        ORDER BY m.date DESC
+        {seek}
+        AND {VISIBLE_MESSAGE_SQL}
+        ORDER BY cmj.message_date {order}, cmj.message_id {order}
         LIMIT ?;
-        """, (chat_rowid, limit))
+        """, (*params, limit), name=query_name)
         rows = self.cur.fetchall()
+        if order == "ASC":
+            rows.reverse()
 
-        out: List[MessageRow] = []
+        out = MessageBatch()
+        targets: Dict[str, Tuple[MessageBatch, int]] = {}
 
         for (
         message_rowid,
+        guid,
         date,
         is_from_me,
         text,
@@ -272,107 +531,439 @@ class MessageBridge:
         handle,
         cache_has_attachments,
         associated_message_type,
+        date_edited,
         ) in rows:
-            raw_text = (text or "")
-            if not raw_text.strip() and attributed_body:
-                raw_text = self._text_from_attributed_body(attributed_body)
-
-            raw_text = raw_text or ""
-            is_placeholder = (raw_text == "￼")
-
-            # Normalize assoc type: some DBs store 0 instead of NULL
-            assoc_type = associated_message_type
-            if assoc_type == 0:
-                assoc_type = None
-
-            is_tapback = (assoc_type in TAPBACK_TYPES)
-
-            has_attachments = (cache_has_attachments == 1)
-
-            kind = "text"
-            normalized_text = raw_text
+            normalized_text, kind = self._classify_message(
+                message_rowid, text, attributed_body, cache_has_attachments, associated_message_type, date_edited
+            )
+            if guid:
+                targets[guid] = (out, len(out))
+            out.append(
+                int(date),
+                int(is_from_me or 0),
+                normalized_text,
+                handle,
+                kind,
+                message_rowid,
+            )
 
-            if is_tapback:
-                kind = "reaction"
-                # For tapbacks you usually don't want to show any body text
-                normalized_text = "Reaction"
+        self._attach_reactions(targets)
+        return out
 
-            elif has_attachments:
-                # Link previews can set attachments but still have real text.
-                # Only call it an attachment bubble if there isn't visible text.
-                if (not normalized_text.strip()) or is_placeholder:
-                    kind = "attachment"
-                    normalized_text = "Attachment"
-                else:
-                    kind = "text"
+    def last_messages_for_chats(
+        self,
+        chat_ids: List[int],
+        limit: int = 100,
+    ) -> Dict[int, MessageBatch]:
+        """
+        Batched last_messages_in_chat: last N messages for every chat in one query.
 
-            elif (not normalized_text.strip()) or is_placeholder:
-                kind = "unknown"
-                normalized_text = "Unknown"
+        Returns: { chat_rowid: [ (date, is_from_me, text, handle, kind), ... ] }
+        with the same row shape and ordering (newest first) as last_messages_in_chat.
+        """
+        out: Dict[int, MessageBatch] = {chat_id: MessageBatch() for chat_id in chat_ids}
+        if not chat_ids:
+            return out
+
+        # Every step stays inside the chat_message_join(chat_id, message_date,
+        # message_id) index: find each chat's N-th newest visible date with a
+        # short seek, rank only the rows at or after it, then return just the
+        # survivors. Cost tracks N * chats (plus skipped tapbacks), not chat
+        # size.
+        placeholders = ",".join("?" for _ in chat_ids)
+        self.cur.execute(f"""
+        WITH bounds AS (
+            SELECT
+                c.ROWID AS chat_id,
+                COALESCE((
+                    SELECT cmj.message_date
+                    FROM chat_message_join cmj
+                    JOIN message m ON m.ROWID = cmj.message_id
+                    WHERE cmj.chat_id = c.ROWID
+                      AND {VISIBLE_MESSAGE_SQL}
+                    ORDER BY cmj.message_date DESC, cmj.message_id DESC
+                    LIMIT 1 OFFSET ?
+                ), -9223372036854775808) AS min_date
+            FROM chat c
+            WHERE c.ROWID IN ({placeholders})
+        ),
+        ranked AS (
+            SELECT
+                cmj.chat_id,
+                cmj.message_id,
+                ROW_NUMBER() OVER (
+                    PARTITION BY cmj.chat_id
+                    ORDER BY cmj.message_date DESC, cmj.message_id DESC
+                ) AS rn
+            FROM bounds b
+            JOIN chat_message_join cmj
+              ON cmj.chat_id = b.chat_id
+             AND cmj.message_date >= b.min_date
+            JOIN message m ON m.ROWID = cmj.message_id
+            WHERE {VISIBLE_MESSAGE_SQL}
+        )
+        SELECT
+            r.chat_id,
+            m.ROWID,
+            m.guid,
+            m.date,
+            m.is_from_me,
+            m.text,
+            m.attributedBody,
+            h.id AS handle,
+            m.cache_has_attachments,
+            m.associated_message_type,
+            {self._date_edited_sql} AS date_edited
+        FROM ranked r
+        JOIN message m ON m.ROWID = r.message_id
+        LEFT JOIN handle h ON h.ROWID = m.handle_id
+        WHERE r.rn <= ?
+        ORDER BY r.chat_id, r.rn;
+        """, (limit - 1, *chat_ids, limit))
 
-            out.append((
+        targets: Dict[str, Tuple[MessageBatch, int]] = {}
+        for (
+        chat_id,
+        message_rowid,
+        guid,
+        date,
+        is_from_me,
+        text,
+        attributed_body,
+        handle,
+        cache_has_attachments,
+        associated_message_type,
+        date_edited,
+        ) in self.cur.fetchall():
+            normalized_text, kind = self._classify_message(
+                message_rowid, text, attributed_body, cache_has_attachments, associated_message_type, date_edited
+            )
+            batch = out[chat_id]
+            if guid:
+                targets[guid] = (batch, len(batch))
+            batch.append(
                 int(date),
                 int(is_from_me or 0),
                 normalized_text,
                 handle,
                 kind,
-            ))
+                message_rowid,
+            )
 
+        self._attach_reactions(targets)
         return out
 
-    def last_100_messages_in_chat(self, chat_rowid: int) -> List[Tuple[int, int, str, Optional[str]]]:
+    def attachments_for(self, message_rowids: Iterable[int]) -> Dict[int, List[AttachmentInfo]]:
+        """
+        Attachment metadata (filename, MIME type, size) for a page of
+        messages, e.g. attachments_for(batch.rowids), in one batched query.
+        """
+        cur = self._cursor()
+        try:
+            return load_attachments(cur, message_rowids)
+        finally:
+            cur.close()
+
+    def _attach_reactions(self, targets: Dict[str, Tuple[MessageBatch, int]]) -> None:
+        """
+        Fold tapbacks onto the rows they target (guid -> (batch, row index)).
+
+        Reactions are looked up by associated_message_guid and replayed
+        oldest first, one pass: an add sets that sender's tapback on the
+        target (a new one replaces their previous one) and a 3000-series
+        removal clears it if it matches. What is left is counted per type.
+        """
+        keys: List[str] = []
+        attachment_counts = self._attachment_counts(
+            [batch.rowids[index] for batch, index in targets.values()]
+        )
+        for guid, (batch, index) in targets.items():
+            parts = 2 * attachment_counts.get(batch.rowids[index], 0) + 1
+            keys.extend(f"p:{part}/{guid}" for part in range(parts))
+            keys.append("bp:" + guid)
+            keys.append(guid)
+
+        rows: List[tuple] = []
+        cur = self._cursor()
+        try:
+            for start in range(0, len(keys), REACTION_LOOKUP_KEYS):
+                chunk = keys[start:start + REACTION_LOOKUP_KEYS]
+                rows.extend(cur.execute(f"""
+                SELECT m.associated_message_guid, m.associated_message_type, m.is_from_me, m.handle_id, m.date, m.ROWID
+                FROM message m
+                WHERE m.associated_message_guid IN ({",".join("?" for _ in chunk)})
+                """, chunk).fetchall())
+        finally:
+            cur.close()
+        rows.sort(key=lambda row: (row[4] or 0, row[5]))  # replay oldest first
+
+        state: Dict[str, Dict[object, int]] = {}
+        for associated_guid, assoc_type, is_from_me, handle_id, _date, _rowid in rows:
+            target = tapback_target_guid(associated_guid)
+            if target not in targets or assoc_type not in TAPBACK_TYPES:
+                continue
+            senders = state.setdefault(target, {})
+            sender = "me" if is_from_me else handle_id
+            if assoc_type in TAPBACK_NAMES:
+                senders[sender] = assoc_type
+            elif senders.get(sender) == assoc_type - TAPBACK_REMOVE_OFFSET:
+                del senders[sender]
+
+        for target, senders in state.items():
+            if not senders:
+                continue
+            counts: Dict[str, int] = {}
+            for assoc_type in senders.values():
+                name = TAPBACK_NAMES[assoc_type]
+                counts[name] = counts.get(name, 0) + 1
+            batch, index = targets[target]
+            batch.reactions[index] = counts
+
+    def _attachment_counts(self, message_rowids: List[int]) -> Dict[int, int]:
+        # message ROWID -> number of attachments, only for messages that have any
+        rowids = sorted({rowid for rowid in message_rowids if rowid})
+        counts: Dict[int, int] = {}
+        cur = self._cursor()
+        try:
+            for start in range(0, len(rowids), REACTION_LOOKUP_KEYS):
+                chunk = rowids[start:start + REACTION_LOOKUP_KEYS]
+                counts.update(cur.execute(f"""
+                SELECT maj.message_id, COUNT(*)
+                FROM message_attachment_join maj
+                WHERE maj.message_id IN ({",".join("?" for _ in chunk)})
+                GROUP BY maj.message_id
+                """, chunk).fetchall())
+        finally:
+            cur.close()
+        return counts
+
+    def _classify_message(
+        self,
+        message_rowid: Optional[int],
+        text: Optional[str],
+        attributed_body: Optional[bytes],
+        cache_has_attachments: Optional[int],
+        associated_message_type: Optional[int],
+        date_edited: Optional[int] = None,
+        body_cache: "Optional[OrderedDict[Tuple[int, int], str]]" = None,
+    ) -> Tuple[str, str]:
+        """
+        Returns (normalized_text, kind) for one message row.
+        """
+        raw_text = (text or "")
+        if not raw_text.strip() and attributed_body:
+            raw_text = self._text_from_attributed_body(attributed_body, message_rowid, date_edited, body_cache)
+
+        raw_text = raw_text or ""
+        is_placeholder = (raw_text == "￼")
+
+        # Normalize assoc type: some DBs store 0 instead of NULL
+        assoc_type = associated_message_type
+        if assoc_type == 0:
+            assoc_type = None
+
+        is_tapback = (assoc_type in TAPBACK_TYPES)
+
+        has_attachments = (cache_has_attachments == 1)
+
+        kind = "text"
+        normalized_text = raw_text
+
+        if is_tapback:
+            kind = "reaction"
+            # For tapbacks you usually don't want to show any body text
+            normalized_text = "Reaction"
+
+        elif has_attachments:
+            # Link previews can set attachments but still have real text.
+            # Only call it an attachment bubble if there isn't visible text.
+            if (not normalized_text.strip()) or is_placeholder:
+                kind = "attachment"
+                normalized_text = "Attachment"
+            else:
+                kind = "text"
+
+        elif (not normalized_text.strip()) or is_placeholder:
+            kind = "unknown"
+            normalized_text = "Unknown"
+
+        return normalized_text, kind
+
+    def iter_messages(
+        self,
+        since_rowid: int = 0,
+        chat_ids: Optional[Iterable[int]] = None,
+        batch_size: int = 1000,
+        decode_pool: Optional[BodyDecoderPool] = None,
+    ) -> Iterator[List[HistoryRow]]:
+        """
+        Streams the full message history in ROWID order, in batches.
+
+        Each batch holds at most `batch_size` messages:
+        [ (message_rowid, chat_rowid, date, is_from_me, text, handle, kind), ... ]
+
+        Pages are fetched with keyset pagination (message ROWID > last seen),
+        so memory stays at one batch regardless of history size. To resume
+        after a crash, pass the message_rowid of the last row of the last
+        batch you finished processing as `since_rowid`.
+
+        With a `decode_pool`, each batch's attributedBody blobs are decoded
+        across its worker processes before the rows are classified.
+        """
+        chat_filter = ""
+        chat_params: Tuple[int, ...] = ()
+        if chat_ids is not None:
+            chat_params = tuple(chat_ids)
+            if not chat_params:
+                return
+            chat_filter = f"AND cmj.chat_id IN ({','.join('?' for _ in chat_params)})"
+
+        # Own cursor: callers may use the bridge between batches.
+        cur = self._cursor()
+        last_rowid = since_rowid
+        try:
+            while True:
+                # Page over distinct message ids first so a message that sits
+                # in two chats is never split across batches.
+                cur.execute(f"""
+                WITH page AS (
+                    SELECT DISTINCT cmj.message_id
+                    FROM chat_message_join cmj
+                    WHERE cmj.message_id > ?
+                    {chat_filter}
+                    ORDER BY cmj.message_id
+                    LIMIT ?
+                )
+                SELECT
+                    m.ROWID,
+                    cmj.chat_id,
+                    m.date,
+                    m.is_from_me,
+                    m.text,
+                    m.attributedBody,
+                    h.id AS handle,
+                    m.cache_has_attachments,
+                    m.associated_message_type,
+                    {self._date_edited_sql} AS date_edited
+                FROM page p
+                JOIN chat_message_join cmj ON cmj.message_id = p.message_id
+                JOIN message m ON m.ROWID = p.message_id
+                LEFT JOIN handle h ON h.ROWID = m.handle_id
+                WHERE 1 = 1 {chat_filter}
+                ORDER BY m.ROWID, cmj.chat_id;
+                """, (last_rowid, *chat_params, batch_size, *chat_params))
+
+                page = cur.fetchall()
+                # Bodies decoded for this page only: a history pass must not
+                # evict the recent chats the UI keeps in _body_cache.
+                page_bodies: "OrderedDict[Tuple[int, int], str]" = OrderedDict()
+                if decode_pool is not None:
+                    self._predecode_bodies(page, decode_pool, page_bodies)
+
+                batch: List[MessageBridge.HistoryRow] = []
+                for (
+                message_rowid,
+                chat_id,
+                date,
+                is_from_me,
+                text,
+                attributed_body,
+                handle,
+                cache_has_attachments,
+                associated_message_type,
+                date_edited,
+                ) in page:
+                    normalized_text, kind = self._classify_message(
+                        message_rowid,
+                        text,
+                        attributed_body,
+                        cache_has_attachments,
+                        associated_message_type,
+                        date_edited,
+                        page_bodies,
+                    )
+                    batch.append((
+                        int(message_rowid),
+                        int(chat_id),
+                        int(date or 0),
+                        int(is_from_me or 0),
+                        normalized_text,
+                        handle,
+                        kind,
+                    ))
+
+                if not batch:
+                    return
+                last_rowid = batch[-1][0]
+                yield batch
+        finally:
+            cur.close()
+
+    def _predecode_bodies(
+        self,
+        rows: List[tuple],
+        pool: BodyDecoderPool,
+        cache: "OrderedDict[Tuple[int, int], str]",
+    ) -> None:
+        # rows: iter_messages page rows; fills the page's (ROWID,
+        # date_edited) cache that _text_from_attributed_body reads from.
+        keys: List[Tuple[int, int]] = []
+        blobs: List[bytes] = []
+        for message_rowid, _chat_id, _date, _from_me, text, attributed_body, *_rest, date_edited in rows:
+            key = (message_rowid, int(date_edited or 0))
+            if attributed_body and not (text or "").strip() and key not in cache:
+                cache[key] = ""  # a message in two chats is decoded once
+                keys.append(key)
+                blobs.append(attributed_body)
+        if not blobs:
+            return
+        for key, decoded in zip(keys, pool.decode(blobs)):
+            if decoded:
+                cache[key] = decoded
+            else:
+                del cache[key]
+
+    def last_100_messages_in_chat(self, chat_rowid: int) -> MessageBatch:
         """
         Returns last 100 messages for a single conversation (chat ROWID).
-        Each row: (date, is_from_me, text, handle)
+        Each row: (date, is_from_me, text, handle, kind)
         """
         return self.last_messages_in_chat(chat_rowid, limit=100)
 
-    def last_100_messages_for_latest_conversations(self, x: int) -> Dict[int, List[Tuple[int, int, str, Optional[str]]]]:
+    def last_100_messages_for_latest_conversations(self, x: int) -> Dict[int, MessageBatch]:
         """
         For the latest X conversations (by most recent message.date),
         return last 100 messages per conversation.
 
-        Returns: { chat_rowid: [ (date, is_from_me, text, handle), ... ] }
+        Returns: { chat_rowid: [ (date, is_from_me, text, handle, kind), ... ] }
         """
         # Get latest x chats by most recent message time
-        self.cur.execute("""
-            SELECT
-                cmj.chat_id,
-                MAX(m.date) AS last_date
-            FROM chat_message_join cmj
-            JOIN message m ON m.ROWID = cmj.message_id
-            GROUP BY cmj.chat_id
-            ORDER BY last_date DESC
+        self.cur.execute(f"""
+            {LATEST_MESSAGE_PER_CHAT_CTE}
+            SELECT l.chat_id
+            FROM latest l
+            JOIN message m ON m.ROWID = l.message_id
+            ORDER BY m.date DESC, m.ROWID DESC
             LIMIT ?
         """, (x,))
         chat_ids = [row[0] for row in self.cur.fetchall()]
 
-        # Build contacts index from all handles in these chats (non-me)
-        # (optional but speeds up printing names)
-        if chat_ids:
-            placeholders = ",".join("?" for _ in chat_ids)
-            self.cur.execute(f"""
-                SELECT DISTINCT h.id
-                FROM chat_message_join cmj
-                JOIN message m ON m.ROWID = cmj.message_id
-                LEFT JOIN handle h ON h.ROWID = m.handle_id
-                WHERE cmj.chat_id IN ({placeholders})
-                  AND m.is_from_me = 0
-                  AND h.id IS NOT NULL
-                LIMIT 2000
-            """, tuple(chat_ids))
-            handles = [r[0] for r in self.cur.fetchall()]
-            ContactsConnector.build_index_for_handles(handles)
-
-        out: Dict[int, List[Tuple[int, int, str, Optional[str]]]] = {}
-        for chat_id in chat_ids:
-            out[chat_id] = self.last_messages_in_chat(chat_id, limit=100)
+        out = self.last_messages_for_chats(chat_ids, limit=100)
+
+        # Build contacts index from the handles we actually return (non-me)
+        handles = [
+            handle
+            for rows in out.values()
+            for _date, is_from_me, _text, handle, _kind in rows
+            if not is_from_me and handle
+        ]
+        ContactsConnector.build_index_for_handles(handles)
 
         return out
 
 if __name__ == "__main__":
-    MessageBridge._copy_messages_db_snapshot()
     mb = MessageBridge()
+    ContactsConnector.ensure_loaded()
 
     chats = mb.last_100_messages_for_latest_conversations(5)
 
@@ -380,7 +971,7 @@ if __name__ == "__main__":
         print("\n" + "=" * 80)
         print(f"CHAT {chat_id} (showing {len(msgs)} most recent)")
         print("=" * 80)
-        for date_val, is_from_me, text, handle in msgs:
+        for date_val, is_from_me, text, handle, _kind in msgs:
             dt = mb.apple_time_to_dt(date_val)
             sender = "me" if is_from_me else (ContactsConnector.get_contact_name(handle) or handle or "unknown")
             print(f"[{dt}] {sender}: {text}")
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Sequence
+
+from typedstream import decode_attributed_body
+
+DEFAULT_CHUNK_SIZE = 2_000
+# Below this many blobs, pickling + IPC costs more than decoding in-process.
+DEFAULT_MIN_PARALLEL = 8_000
+
+
+def decode_chunk(blobs: Sequence[Optional[bytes]]) -> List[str]:
+    return [decode_attributed_body(blob) for blob in blobs]
+
+
+class BodyDecoderPool:
+    """
+    Opt-in process pool for decoding attributedBody blobs during bulk
+    backfill. decode() keeps input order; small inputs (or workers <= 1)
+    are decoded in-process. Workers use the pure-Python decoder only.
+    """
+
+    def __init__(
+        self,
+        workers: Optional[int] = None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+        min_parallel: int = DEFAULT_MIN_PARALLEL,
+    ) -> None:
+        self.workers = workers if workers is not None else (os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+        self.min_parallel = min_parallel
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def decode(self, blobs: Sequence[Optional[bytes]]) -> List[str]:
+        if self.workers <= 1 or len(blobs) < self.min_parallel:
+            return decode_chunk(blobs)
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        chunks = [blobs[i:i + self.chunk_size] for i in range(0, len(blobs), self.chunk_size)]
+        out: List[str] = []
+        for part in self._executor.map(decode_chunk, chunks):
+            out.extend(part)
+        return out
+
+    def close(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self) -> "BodyDecoderPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,469 @@
+from __future__ import annotations
+
+import argparse
+import os
+import socket
+import socketserver
+import struct
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from change_feed import ChangeFeed
+from message_batch import MessageBatch
+from messages import OPEN_COPY, OPEN_READONLY
+from reader_pool import ReaderPool
+from search_index import MessageSearchIndex, SearchHit
+
+DEFAULT_SOCKET = os.path.expanduser("~/Library/Application Support/AllInOne/query.sock")
+
+# Wire format. Every frame is a fixed header followed by one encoded value:
+#
+#   request:  <u32 payload length> <u32 request id> <u8 op>     <payload>
+#   response: <u32 payload length> <u32 request id> <u8 status> <payload>
+#
+# Values use a small tagged encoding: ints are zigzag varints, strings and
+# bytes are varint-length-prefixed, lists and dicts are varint counts. Message
+# history travels as MessageBatch columns, so typed arrays cross the socket as
+# raw bytes instead of one object per row.
+HEADER = struct.Struct("<IIB")
+MAX_FRAME = 64 * 1024 * 1024
+
+OP_PING = 1
+OP_TOP_CHATS = 2
+OP_MESSAGES_BEFORE = 3
+OP_MESSAGES_AFTER = 4
+OP_LAST_FOR_CHATS = 5
+OP_SEARCH = 6
+OP_REFRESH = 7
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_NONE, _FALSE, _TRUE, _INT, _FLOAT, _STR, _BYTES, _LIST, _DICT = range(9)
+_FLOAT_STRUCT = struct.Struct("<d")
+
+
+class QueryError(RuntimeError):
+    """
+    The daemon could not run a request; the message comes from the server.
+    """
+
+
+def _write_varint(out: bytearray, n: int) -> None:
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    shift = 0
+    n = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _encode(out: bytearray, value: Any) -> None:
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_INT)
+        _write_varint(out, (value << 1) ^ (value >> 63) if value < 0 else value << 1)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _FLOAT_STRUCT.pack(value)
+    elif isinstance(value, str):
+        data = value.encode("utf-8", "surrogatepass")
+        out.append(_STR)
+        _write_varint(out, len(data))
+        out += data
+    elif isinstance(value, (bytes, bytearray, memoryview)):
+        out.append(_BYTES)
+        _write_varint(out, len(value))
+        out += value
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _write_varint(out, len(value))
+        for item in value:
+            _encode(out, item)
+    elif isinstance(value, dict):
+        out.append(_DICT)
+        _write_varint(out, len(value))
+        for key, item in value.items():
+            _encode(out, key)
+            _encode(out, item)
+    else:
+        raise TypeError(f"cannot encode {type(value).__name__}")
+
+
+def _decode(buf: bytes, pos: int) -> Tuple[Any, int]:
+    tag = buf[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT:
+        n, pos = _read_varint(buf, pos)
+        return (n >> 1) ^ -(n & 1), pos
+    if tag == _FLOAT:
+        return _FLOAT_STRUCT.unpack_from(buf, pos)[0], pos + 8
+    if tag in (_STR, _BYTES):
+        n, pos = _read_varint(buf, pos)
+        data = buf[pos:pos + n]
+        return (data.decode("utf-8", "surrogatepass") if tag == _STR else bytes(data)), pos + n
+    if tag == _LIST:
+        n, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(n):
+            item, pos = _decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        n, pos = _read_varint(buf, pos)
+        out = {}
+        for _ in range(n):
+            key, pos = _decode(buf, pos)
+            out[key], pos = _decode(buf, pos)
+        return out, pos
+    raise ValueError(f"bad tag {tag} at {pos - 1}")
+
+
+def encode_value(value: Any) -> bytes:
+    out = bytearray()
+    _encode(out, value)
+    return bytes(out)
+
+
+def decode_value(data: bytes) -> Any:
+    """
+    Raises ValueError for any malformed or truncated payload.
+    """
+    try:
+        value, pos = _decode(data, 0)
+    except (IndexError, struct.error, RecursionError) as e:
+        raise ValueError(f"malformed value: {type(e).__name__}") from None
+    if pos != len(data):
+        raise ValueError("trailing bytes after value")
+    return value
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def _send_frame(sock: socket.socket, request_id: int, code: int, value: Any) -> None:
+    payload = encode_value(value)
+    sock.sendall(HEADER.pack(len(payload), request_id, code) + payload)
+
+
+def _recv_raw_frame(sock: socket.socket) -> Optional[Tuple[int, int, bytes]]:
+    header = _recv_exact(sock, HEADER.size)
+    if header is None:
+        return None
+    length, request_id, code = HEADER.unpack(header)
+    if length > MAX_FRAME:
+        raise ValueError(f"frame of {length} bytes is over the {MAX_FRAME} limit")
+    payload = _recv_exact(sock, length)
+    if payload is None:
+        return None
+    return request_id, code, payload
+
+
+def _recv_frame(sock: socket.socket) -> Optional[Tuple[int, int, Any]]:
+    frame = _recv_raw_frame(sock)
+    if frame is None:
+        return None
+    request_id, code, payload = frame
+    return request_id, code, decode_value(payload)
+
+
+def _cursor_arg(cursor: Optional[List[int]]) -> Optional[Tuple[int, int]]:
+    return (int(cursor[0]), int(cursor[1])) if cursor else None
+
+
+class QueryDaemon:
+    """
+    Long-lived local query service over a Unix socket.
+
+    Owns one ReaderPool whose readers are leased per request rather than
+    tied to the connection threads, so they, their snapshot references and
+    their warm attributedBody caches outlive short-lived clients; and
+    optionally one shared FTS search index. Readers only move to a newer
+    snapshot after a refresh: a ChangeFeed triggers one (and updates the
+    index) when chat.db changes, so clients never copy or open chat.db
+    themselves.
+    """
+
+    def __init__(
+        self,
+        socket_path: Optional[str] = None,
+        db_path: Optional[str] = None,
+        *,
+        open_mode: str = OPEN_COPY,
+        search_index_path: Optional[str] = None,
+        watch: bool = True,
+    ) -> None:
+        self.socket_path = socket_path or DEFAULT_SOCKET
+        self.db_path = db_path
+        self.pool = ReaderPool(db_path, open_mode=open_mode)
+        self.search_index_path = search_index_path
+        # One index shared by every connection thread; _index_lock serializes
+        # searches and updates on its connection.
+        self._index: Optional[MessageSearchIndex] = None
+        self._index_lock = threading.Lock()
+        self._feed: Optional[ChangeFeed] = None
+        self._watch = watch
+        self._server: Optional[socketserver.ThreadingUnixStreamServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._handlers: Dict[int, Callable[[Any], Any]] = {
+            OP_PING: lambda _args: "pong",
+            OP_TOP_CHATS: self._top_chats,
+            OP_MESSAGES_BEFORE: self._messages_before,
+            OP_MESSAGES_AFTER: self._messages_after,
+            OP_LAST_FOR_CHATS: self._last_for_chats,
+            OP_SEARCH: self._search_messages,
+            OP_REFRESH: self._refresh,
+        }
+
+    # --- request handlers (run on the client connection's thread) ---
+
+    def _top_chats(self, args: Dict[str, Any]) -> Any:
+        with self.pool.lease() as bridge:
+            return bridge.top_chats(limit=int(args.get("limit", 50)))
+
+    def _messages_before(self, args: Dict[str, Any]) -> Any:
+        with self.pool.lease() as bridge:
+            batch = bridge.messages_before(
+                int(args["chat_id"]), _cursor_arg(args.get("cursor")), int(args.get("limit", 60))
+            )
+        return batch.to_columns()
+
+    def _messages_after(self, args: Dict[str, Any]) -> Any:
+        with self.pool.lease() as bridge:
+            batch = bridge.messages_after(
+                int(args["chat_id"]), _cursor_arg(args["cursor"]), int(args.get("limit", 60))
+            )
+        return batch.to_columns()
+
+    def _last_for_chats(self, args: Dict[str, Any]) -> Any:
+        with self.pool.lease() as bridge:
+            batches = bridge.last_messages_for_chats(
+                [int(c) for c in args["chat_ids"]], int(args.get("limit", 100))
+            )
+        return {chat_id: batch.to_columns() for chat_id, batch in batches.items()}
+
+    def _search_index(self) -> MessageSearchIndex:
+        # Caller holds _index_lock.
+        if self.search_index_path is None:
+            raise QueryError("search is not enabled on this daemon")
+        if self._index is None:
+            self._index = MessageSearchIndex(self.search_index_path, check_same_thread=False)
+        return self._index
+
+    def _search_messages(self, args: Dict[str, Any]) -> Any:
+        chat_id = args.get("chat_id")
+        with self._index_lock:
+            hits = self._search_index().search(
+                str(args["query"]), int(args.get("limit", 20)), None if chat_id is None else int(chat_id)
+            )
+        return [
+            [h.message_rowid, h.chat_id, h.date, h.is_from_me, h.handle, h.snippet, h.score] for h in hits
+        ]
+
+    def _refresh(self, _args: Any) -> Any:
+        self.pool.refresh()
+        return self.update_search_index()
+
+    def update_search_index(self) -> int:
+        if self.search_index_path is None:
+            return 0
+        with self._index_lock, self.pool.lease() as bridge:
+            return self._search_index().update(bridge)
+
+    # --- lifecycle ---
+
+    def handle(self, op: int, args: Any) -> Any:
+        handler = self._handlers.get(op)
+        if handler is None:
+            raise QueryError(f"unknown op {op}")
+        return handler(args or {})
+
+    def start(self) -> "QueryDaemon":
+        parent = os.path.dirname(self.socket_path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale socket from a previous run
+        daemon = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self) -> None:
+                sock = self.request
+                while True:
+                    try:
+                        frame = _recv_raw_frame(sock)
+                    except (OSError, ValueError):
+                        return  # connection dropped, or a frame we can't skip
+                    if frame is None:
+                        return
+                    request_id, op, payload = frame
+                    try:
+                        # A bad payload fails only its own request: the
+                        # header said how long it was, so framing holds.
+                        result, status = daemon.handle(op, decode_value(payload)), STATUS_OK
+                    except Exception as e:
+                        result, status = f"{type(e).__name__}: {e}", STATUS_ERROR
+                    try:
+                        _send_frame(sock, request_id, status, result)
+                    except OSError:
+                        return
+
+        server = socketserver.ThreadingUnixStreamServer(self.socket_path, Handler)
+        server.daemon_threads = True
+        self._server = server
+        self.update_search_index()
+        if self._watch:
+            self._feed = ChangeFeed(self.db_path)
+            self._feed.subscribe(lambda _event: self._refresh(None))
+            self._feed.start()
+        self._thread = threading.Thread(target=server.serve_forever, name="query-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._feed is not None:
+            self._feed.stop()
+            self._feed = None
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        with self._index_lock:
+            if self._index is not None:
+                self._index.close()
+                self._index = None
+        self.pool.close()
+
+    def __enter__(self) -> "QueryDaemon":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class QueryClient:
+    """
+    Client for QueryDaemon. Mirrors the MessageBridge read API; history comes
+    back as MessageBatch. One request is in flight per client at a time
+    (calls from several threads are serialized).
+    """
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: Optional[float] = 30.0) -> None:
+        self.socket_path = socket_path or DEFAULT_SOCKET
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(self.socket_path)
+        self._lock = threading.Lock()
+        self._next_id = 0
+
+    def close(self) -> None:
+        self.sock.close()
+
+    def __enter__(self) -> "QueryClient":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def call(self, op: int, args: Optional[Dict[str, Any]] = None) -> Any:
+        with self._lock:
+            self._next_id = (self._next_id + 1) & 0xFFFFFFFF
+            request_id = self._next_id
+            _send_frame(self.sock, request_id, op, args or {})
+            frame = _recv_frame(self.sock)
+        if frame is None:
+            raise ConnectionError("query daemon closed the connection")
+        response_id, status, result = frame
+        if response_id != request_id:
+            raise ConnectionError(f"response {response_id} for request {request_id}")
+        if status != STATUS_OK:
+            raise QueryError(result)
+        return result
+
+    def ping(self) -> bool:
+        return self.call(OP_PING) == "pong"
+
+    def top_chats(self, limit: int = 50) -> List[Dict[str, Any]]:
+        return self.call(OP_TOP_CHATS, {"limit": limit})
+
+    def last_messages_in_chat(self, chat_rowid: int, limit: int = 100) -> MessageBatch:
+        return self.messages_before(chat_rowid, None, limit)
+
+    def messages_before(
+        self, chat_rowid: int, before: Optional[Tuple[int, int]] = None, limit: int = 60
+    ) -> MessageBatch:
+        columns = self.call(OP_MESSAGES_BEFORE, {"chat_id": chat_rowid, "cursor": before, "limit": limit})
+        return MessageBatch.from_columns(columns)
+
+    def messages_after(self, chat_rowid: int, after: Tuple[int, int], limit: int = 60) -> MessageBatch:
+        columns = self.call(OP_MESSAGES_AFTER, {"chat_id": chat_rowid, "cursor": after, "limit": limit})
+        return MessageBatch.from_columns(columns)
+
+    def last_messages_for_chats(self, chat_ids: List[int], limit: int = 100) -> Dict[int, MessageBatch]:
+        result = self.call(OP_LAST_FOR_CHATS, {"chat_ids": list(chat_ids), "limit": limit})
+        return {int(chat_id): MessageBatch.from_columns(columns) for chat_id, columns in result.items()}
+
+    def search(self, query: str, limit: int = 20, chat_id: Optional[int] = None) -> List[SearchHit]:
+        rows = self.call(OP_SEARCH, {"query": query, "limit": limit, "chat_id": chat_id})
+        return [SearchHit(*row) for row in rows]
+
+    def refresh(self) -> int:
+        """
+        Ask the daemon to pick up chat.db changes now. Returns messages newly
+        added to the search index.
+        """
+        return self.call(OP_REFRESH)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve chat.db queries over a Unix socket.")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET)
+    parser.add_argument("--db", default=None, help="chat.db path (default: ~/Library/Messages/chat.db)")
+    parser.add_argument("--open-mode", choices=(OPEN_COPY, OPEN_READONLY), default=OPEN_COPY)
+    parser.add_argument("--search-index", default=None, help="FTS index path; enables search")
+    args = parser.parse_args()
+
+    daemon = QueryDaemon(args.socket, args.db, open_mode=args.open_mode, search_index_path=args.search_index)
+    daemon.start()
+    print(f"serving {args.db or 'chat.db'} on {daemon.socket_path}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import contextlib
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from messages import OPEN_COPY, OPEN_MIRROR, MessageBridge
+from sql_stats import QueryRecorder
+
+
+class ReaderPool:
+    """
+    Per-thread MessageBridge readers over the same chat.db.
+
+    MessageBridge keeps one connection and one shared cursor, so a single
+    instance must not be used from several threads at once. The pool gives
+    every thread its own bridge (own connection, own prepared-statement
+    cache) on the shared, refcounted snapshot versions, so summarization,
+    backfill and UI refresh can query in parallel.
+
+    refresh() doesn't touch other threads' connections: each thread moves
+    to the latest chat.db state the next time it calls bridge(), so a run of
+    queries in one thread between refreshes always sees one consistent
+    snapshot. Bridges of threads that have exited are closed on the next
+    registration, which releases their snapshot references.
+
+    Servers whose threads come and go with their clients use lease()
+    instead: its bridges belong to the pool, not to a thread, so they (and
+    their snapshot references and attributedBody caches) outlive the
+    connections that used them.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        *,
+        open_mode: str = OPEN_COPY,
+        query_stats: Optional[QueryRecorder] = None,
+    ) -> None:
+        if open_mode == OPEN_MIRROR:
+            raise ValueError("ReaderPool reads snapshots or chat.db directly; the mirror has a single writer")
+        self.db_path = db_path
+        self.open_mode = open_mode
+        self.query_stats = query_stats
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._bridges: Dict[int, Tuple[threading.Thread, MessageBridge]] = {}
+        self._leasable: List[MessageBridge] = []  # every bridge lease() has made
+        self._idle: List[Tuple[MessageBridge, int]] = []  # (bridge, generation), most recent last
+        self._generation = 0
+        self._closed = False
+
+    def bridge(self) -> MessageBridge:
+        """
+        The calling thread's bridge, brought up to date if refresh() was
+        called since this thread last asked for it.
+        """
+        local = self._local
+        bridge: Optional[MessageBridge] = getattr(local, "bridge", None)
+        if bridge is None:
+            if self._closed:
+                raise RuntimeError("ReaderPool is closed")
+            bridge = MessageBridge(self.db_path, query_stats=self.query_stats, open_mode=self.open_mode)
+            local.bridge = bridge
+            local.generation = self._generation
+            with self._lock:
+                self._reap()
+                self._bridges[threading.get_ident()] = (threading.current_thread(), bridge)
+        elif local.generation != self._generation:
+            local.generation = self._generation
+            bridge.refresh()
+        return bridge
+
+    def refresh(self) -> None:
+        """
+        Have every thread pick up the latest chat.db state on its next
+        bridge() call.
+        """
+        with self._lock:
+            self._generation += 1
+
+    @contextlib.contextmanager
+    def lease(self) -> Iterator[MessageBridge]:
+        """
+        A bridge for one unit of work on the calling thread, handed back to
+        the pool afterwards. Brought up to date if refresh() was called
+        since it was last used; otherwise it keeps the snapshot it has.
+        """
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("ReaderPool is closed")
+            entry = self._idle.pop() if self._idle else None
+            generation = self._generation
+        if entry is None:
+            bridge = MessageBridge(self.db_path, query_stats=self.query_stats, open_mode=self.open_mode)
+            with self._lock:
+                self._leasable.append(bridge)
+        else:
+            bridge, leased_generation = entry
+            if leased_generation != generation:
+                bridge.refresh()
+        try:
+            yield bridge
+        finally:
+            with self._lock:
+                closed = self._closed
+                if not closed:
+                    self._idle.append((bridge, generation))
+            if closed:
+                bridge.close()
+
+    def size(self) -> int:
+        with self._lock:
+            return len(self._bridges) + len(self._leasable)
+
+    def _reap(self) -> None:
+        for ident, (thread, bridge) in list(self._bridges.items()):
+            if not thread.is_alive():
+                del self._bridges[ident]
+                bridge.close()
+
+    def close(self) -> None:
+        """
+        Close every thread's bridge. Threads must be done querying.
+        """
+        with self._lock:
+            self._closed = True
+            bridges = [bridge for _thread, bridge in self._bridges.values()]
+            bridges += [bridge for bridge, _generation in self._idle]
+            self._bridges.clear()
+            self._leasable.clear()
+            self._idle.clear()
+        for bridge in bridges:
+            bridge.close()
+        self._local = threading.local()
+
+    def __enter__(self) -> "ReaderPool":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import heapq
+import math
+import unicodedata
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from contact_index import ContactIndex
+
+# Ranking tiers, best first: whole name, name prefix, every query word
+# starts a name word, substring, and trigram-similar (typos).
+TIER_EXACT, TIER_PREFIX, TIER_WORD_PREFIX, TIER_SUBSTRING, TIER_FUZZY = 4, 3, 2, 1, 0
+FUZZY_MIN_SIMILARITY = 0.3
+
+
+@dataclass(frozen=True)
+class Recipient:
+    name: str
+    handles: Tuple[str, ...]
+    chat_ids: Tuple[int, ...]  # most recently active first
+
+
+@dataclass(frozen=True)
+class RecipientMatch:
+    recipient: Recipient
+    tier: int
+    similarity: float
+
+
+def normalize_name(name: str) -> str:
+    """
+    Casefolded, accents stripped, runs of anything but letters and digits
+    collapsed to one space.
+    """
+    decomposed = unicodedata.normalize("NFKD", name.casefold())
+    out = []
+    space = True
+    for ch in decomposed:
+        if ch.isalnum():
+            out.append(ch)
+            space = False
+        elif not space and not unicodedata.combining(ch):
+            out.append(" ")
+            space = True
+    return "".join(out).rstrip()
+
+
+def trigrams(norm: str) -> Set[str]:
+    padded = f"  {norm} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RecipientIndex:
+    """
+    Search over everyone a note can go to: contact names and every chat,
+    each name mapped back to its handles and chat IDs.
+
+    Entries sharing a normalized name are merged, so a contact and their
+    one-to-one chat are one result. Word-prefix matches come from a sorted
+    word list (a flat trie: bisect finds every word with a prefix); only
+    when those don't fill the result are per-name trigram postings used to
+    find substrings and typos, so a keystroke touches only entries sharing
+    letters with the query. Results are ranked by tier, then closeness,
+    then chats before contacts and recent chats first. The index is
+    immutable once built; rebuild and swap to update.
+    """
+
+    def __init__(self) -> None:
+        self.recipients: List[Recipient] = []
+        self._norm: List[str] = []
+        self._grams: List[Set[str]] = []
+        self._postings: Dict[str, List[int]] = {}
+        self._words: List[Tuple[str, int]] = []  # (name word, entry), sorted
+
+    def __len__(self) -> int:
+        return len(self.recipients)
+
+    @classmethod
+    def build(
+        cls,
+        chats: Iterable[Tuple[int, Optional[str], Optional[str], Sequence[str]]] = (),
+        contacts: Optional[ContactIndex] = None,
+        resolve: Optional[Callable[[str], Optional[str]]] = None,
+    ) -> "RecipientIndex":
+        """
+        chats as MessageBridge.chat_directory() returns them (most recent
+        first). Chats without a display name are named after their
+        participants, resolved through `resolve` (default: the contact
+        index) where possible.
+        """
+        if resolve is None:
+            resolve = contacts.resolve if contacts is not None else (lambda _handle: None)
+
+        merged: Dict[str, Tuple[str, List[str], List[int]]] = {}
+        order: List[str] = []
+
+        def add(name: str, handles: Iterable[str], chat_ids: Iterable[int]) -> None:
+            norm = normalize_name(name)
+            if not norm:
+                return
+            entry = merged.get(norm)
+            if entry is None:
+                entry = merged[norm] = (name, [], [])
+                order.append(norm)
+            for handle in handles:
+                if handle not in entry[1]:
+                    entry[1].append(handle)
+            entry[2].extend(chat_ids)
+
+        for chat_id, display_name, chat_identifier, handles in chats:
+            if display_name:
+                add(display_name, handles, (chat_id,))
+            elif len(handles) == 1:
+                add(resolve(handles[0]) or handles[0], handles, (chat_id,))
+            elif handles:
+                add(", ".join(resolve(h) or h for h in handles), handles, (chat_id,))
+            elif chat_identifier:
+                add(chat_identifier, (), (chat_id,))
+        if contacts is not None:
+            for name, handles in contacts.handles_by_name().items():
+                add(name, handles, ())
+
+        index = cls()
+        postings = index._postings
+        for entry_id, norm in enumerate(order):
+            name, handles, chat_ids = merged[norm]
+            index.recipients.append(Recipient(name, tuple(handles), tuple(chat_ids)))
+            index._norm.append(norm)
+            grams = trigrams(norm)
+            index._grams.append(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(entry_id)
+            for word in set(norm.split()):
+                index._words.append((word, entry_id))
+        index._words.sort()
+        return index
+
+    def _prefix_entries(self, prefix: str) -> Set[int]:
+        words = self._words
+        i = bisect_left(words, (prefix, -1))
+        j = bisect_left(words, (prefix + "\U0010ffff", -1), i)
+        return {entry for _word, entry in words[i:j]}
+
+    def _tier(self, q: str, q_words: List[str], norm: str) -> int:
+        if norm == q:
+            return TIER_EXACT
+        if norm.startswith(q):
+            return TIER_PREFIX
+        if all(any(w.startswith(qw) for w in norm.split()) for qw in q_words):
+            return TIER_WORD_PREFIX
+        if q in norm:
+            return TIER_SUBSTRING
+        return TIER_FUZZY
+
+    def _similarity(self, q_grams: Set[str], entry: int) -> float:
+        grams = self._grams[entry]
+        shared = len(q_grams & grams)
+        return shared / (len(q_grams) + len(grams) - shared)
+
+    def search(self, query: str, limit: int = 10) -> List[RecipientMatch]:
+        q = normalize_name(query)
+        if not q or limit <= 0:
+            return []
+        q_words = q.split()
+        q_grams = trigrams(q)
+        norms = self._norm
+
+        # Entries where every query word starts a name word (tiers 2-4),
+        # ranked by how much of the name the query covers. Lower entry ids
+        # were more recently active, and chats come before contact-only
+        # entries, so -entry breaks ties in favour of both.
+        matched = self._prefix_entries(q_words[0])
+        for qw in q_words[1:]:
+            if not matched:
+                break
+            matched &= self._prefix_entries(qw)
+        n = len(q)
+        if len(q_words) == 1:
+            # Every match has q starting one of its words: only the whole
+            # name / name prefix distinction is left to check.
+            scored = []
+            append = scored.append
+            for entry in matched:
+                norm = norms[entry]
+                if norm.startswith(q):
+                    append((TIER_EXACT if len(norm) == n else TIER_PREFIX, n / len(norm), -entry))
+                else:
+                    append((TIER_WORD_PREFIX, n / len(norm), -entry))
+        else:
+            scored = [(self._tier(q, q_words, norms[entry]), n / len(norms[entry]), -entry) for entry in matched]
+
+        if len(scored) < limit and len(q) >= 3:
+            # Not enough word-prefix hits: look for substrings and typos via
+            # trigrams. A candidate needs `needed` query trigrams, so it is in
+            # at least one of the k - needed + 1 shortest postings.
+            postings = sorted((self._postings.get(g, ()) for g in q_grams), key=len)
+            needed = max(1, min(math.ceil(len(q_grams) * FUZZY_MIN_SIMILARITY), len(q) - 2))
+            pool: Set[int] = set()
+            for posting in postings[:len(postings) - needed + 1]:
+                pool.update(posting)
+            pool -= matched
+            for entry in pool:
+                norm = norms[entry]
+                if q in norm:
+                    scored.append((TIER_SUBSTRING, len(q) / len(norm), -entry))
+                    continue
+                similarity = self._similarity(q_grams, entry)
+                if similarity >= FUZZY_MIN_SIMILARITY:
+                    scored.append((TIER_FUZZY, similarity, -entry))
+
+        best = heapq.nlargest(limit, scored)
+        return [
+            RecipientMatch(self.recipients[-entry], tier, self._similarity(q_grams, -entry))
+            for tier, _closeness, entry in best
+        ]
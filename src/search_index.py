@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from dataclasses import dataclass
+from typing import List, Optional
+
+from messages import MessageBridge
+
+DEFAULT_INDEX_DB = os.path.expanduser("~/Library/Application Support/AllInOne/search_index.db")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS index_state (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS message_fts USING fts5(
+    text,
+    chat_id,
+    date UNINDEXED,
+    is_from_me UNINDEXED,
+    handle UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+
+@dataclass(frozen=True)
+class SearchHit:
+    message_rowid: int
+    chat_id: int
+    date: int
+    is_from_me: int
+    handle: Optional[str]
+    snippet: str
+    score: float
+
+
+def fts_query(query: str, chat_id: Optional[int] = None) -> str:
+    """
+    Turn free text into a safe FTS5 query against the text column: every
+    word is quoted (so punctuation and FTS operators are literal) and the
+    last one prefix-matches. chat_id is an indexed column, so restricting to
+    one chat is an index intersection rather than a post-filter.
+    """
+    terms = ['"' + word.replace('"', '""') + '"' for word in query.split()]
+    if not terms:
+        return ""
+    terms[-1] += "*"
+    match = "text : (" + " ".join(terms) + ")"
+    if chat_id is not None:
+        match += f' AND chat_id : "{int(chat_id)}"'
+    return match
+
+
+class MessageSearchIndex:
+    """
+    Sidecar SQLite FTS5 index over message text, including text decoded
+    from attributedBody. Filled incrementally in message ROWID order from a
+    MessageBridge; the FTS rowid is the chat.db message ROWID.
+    """
+
+    def __init__(self, index_path: Optional[str] = None, check_same_thread: bool = True) -> None:
+        """
+        check_same_thread=False lets several threads share the index; they
+        must then serialize their calls themselves.
+        """
+        self.path = index_path or DEFAULT_INDEX_DB
+        parent = os.path.dirname(self.path)
+        if parent:
+            os.makedirs(parent, exist_ok=True)
+        self.conn = sqlite3.connect(self.path, check_same_thread=check_same_thread)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
+
+    @property
+    def watermark(self) -> int:
+        row = self.conn.execute("SELECT value FROM index_state WHERE key = 'message_rowid'").fetchone()
+        return int(row[0]) if row else 0
+
+    def update(self, bridge: MessageBridge, batch_size: int = 5_000) -> int:
+        """
+        Index messages newer than the stored watermark. Returns rows indexed.
+        Each batch commits together with its watermark, so an interrupted
+        update resumes where it stopped.
+        """
+        indexed = 0
+        for batch in bridge.iter_messages(since_rowid=self.watermark, batch_size=batch_size):
+            # A message joined to several chats is indexed under the first one.
+            # iter_messages never splits a message across batches.
+            rows = []
+            last_rowid = None
+            for message_rowid, chat_id, date, is_from_me, text, handle, kind in batch:
+                if kind == "text" and message_rowid != last_rowid:
+                    rows.append((message_rowid, text, chat_id, date, is_from_me, handle))
+                last_rowid = message_rowid
+            with self.conn:
+                self.conn.executemany(
+                    """
+                    INSERT INTO message_fts (rowid, text, chat_id, date, is_from_me, handle)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    """,
+                    rows,
+                )
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO index_state (key, value) VALUES ('message_rowid', ?)",
+                    (batch[-1][0],),
+                )
+            indexed += len(rows)
+        return indexed
+
+    def search(self, query: str, limit: int = 20, chat_id: Optional[int] = None) -> List[SearchHit]:
+        """
+        Ranked (BM25) keyword search. Words are matched literally; the last
+        word also matches as a prefix ("din" finds "dinner").
+        """
+        match = fts_query(query, chat_id)
+        if not match:
+            return []
+        rows = self.conn.execute(
+            """
+            SELECT
+                rowid,
+                chat_id,
+                date,
+                is_from_me,
+                handle,
+                snippet(message_fts, 0, '[', ']', '…', 12),
+                rank
+            FROM message_fts
+            WHERE message_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (match, limit),
+        ).fetchall()
+        return [
+            SearchHit(int(rowid), int(chat), int(date), int(from_me), handle, snippet, float(rank))
+            for rowid, chat, date, from_me, handle, snippet, rank in rows
+        ]
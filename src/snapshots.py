@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import atexit
+import os
+import shutil
+import sqlite3
+import struct
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import Dict, Optional, Set
+
+DEFAULT_SOURCE_DB = os.path.expanduser("~/Library/Messages/chat.db")
+
+# Pragmas for reading chat.db in place (see connect_readonly)
+READONLY_MMAP_SIZE = 1 << 30  # map up to 1 GiB of the file instead of read()ing pages
+READONLY_CACHE_KIB = 64 * 1024  # 64 MiB page cache per connection
+READONLY_BUSY_TIMEOUT = 1.0
+
+WAL_HEADER_SIZE = 32
+WAL_FRAME_HEADER_SIZE = 24
+_COPY_ATTEMPTS = 3
+
+
+@dataclass(frozen=True)
+class SourceFingerprint:
+    db_size: int
+    db_mtime_ns: int
+    wal_size: int
+    wal_mtime_ns: int
+    # WAL header (salts + checkpoint sequence) followed by the header of the
+    # last complete frame. Catches WAL resets and rewrites that keep size and
+    # a coarse mtime unchanged.
+    wal_marker: bytes
+
+
+def fingerprint(db_path: str) -> SourceFingerprint:
+    st = os.stat(db_path)
+    wal_path = db_path + "-wal"
+    try:
+        wst = os.stat(wal_path)
+    except FileNotFoundError:
+        return SourceFingerprint(st.st_size, st.st_mtime_ns, 0, 0, b"")
+
+    marker = b""
+    try:
+        with open(wal_path, "rb") as f:
+            header = f.read(WAL_HEADER_SIZE)
+            marker = header
+            if len(header) == WAL_HEADER_SIZE:
+                page_size = struct.unpack(">I", header[8:12])[0]
+                frame_size = WAL_FRAME_HEADER_SIZE + page_size
+                frames = (wst.st_size - WAL_HEADER_SIZE) // frame_size if page_size else 0
+                if frames > 0:
+                    f.seek(WAL_HEADER_SIZE + (frames - 1) * frame_size)
+                    marker += f.read(WAL_FRAME_HEADER_SIZE)
+    except FileNotFoundError:
+        # WAL was checkpointed away between stat() and open()
+        return SourceFingerprint(st.st_size, st.st_mtime_ns, 0, 0, b"")
+
+    return SourceFingerprint(st.st_size, st.st_mtime_ns, wst.st_size, wst.st_mtime_ns, marker)
+
+
+def connect_readonly(
+    db_path: str,
+    *,
+    mmap_size: int = READONLY_MMAP_SIZE,
+    cache_kib: int = READONLY_CACHE_KIB,
+    timeout: float = READONLY_BUSY_TIMEOUT,
+    **connect_kwargs,
+) -> sqlite3.Connection:
+    """
+    Open chat.db in place, without copying it.
+
+    mode=ro plus query_only means this connection can never write, and each
+    statement reads a consistent WAL snapshot while Messages keeps writing.
+    Raises sqlite3.OperationalError if the database is locked or can't be
+    read this way (e.g. the -shm file can't be opened); callers fall back
+    to a copy.
+    """
+    uri = "file:" + os.path.abspath(db_path) + "?mode=ro"
+    conn = sqlite3.connect(uri, uri=True, timeout=timeout, **connect_kwargs)
+    try:
+        conn.execute("PRAGMA query_only = ON")
+        conn.execute(f"PRAGMA mmap_size = {int(mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = -{int(cache_kib)}")
+        # Read the schema (and the WAL index) now, so a locked or unreadable
+        # database fails here instead of in the first real query.
+        conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+class Snapshot:
+    """
+    A reference to one immutable snapshot version. Release it (or use it as a
+    context manager) when the connection reading it has been closed.
+    """
+
+    def __init__(self, manager: "SnapshotManager", version: int, path: str) -> None:
+        self._manager = manager
+        self.version = version
+        self.path = path
+        self._released = False
+
+    def release(self) -> None:
+        if not self._released:
+            self._released = True
+            self._manager._release(self.version)
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.release()
+
+
+class SnapshotManager:
+    """
+    Hands out read-only copies of chat.db (+ WAL/SHM).
+
+    A new copy is only made when the source fingerprint changes. Each copy
+    lives in its own version directory and is written under a temporary name
+    before being renamed into place, so a reader never opens a half-written
+    file. Versions are deleted once they are no longer current and nobody
+    holds a reference to them.
+    """
+
+    def __init__(self, source_path: Optional[str] = None, root_dir: Optional[str] = None) -> None:
+        self.source_path = source_path or DEFAULT_SOURCE_DB
+        self._owns_root = root_dir is None
+        self.root_dir = root_dir or tempfile.mkdtemp(prefix="chatdb-snapshots-")
+        self._make_root()
+        self._lock = threading.Lock()
+        self._refcounts: Dict[int, int] = {}
+        self._paths: Dict[int, str] = {}
+        self._current: Optional[int] = None
+        self._current_fp: Optional[SourceFingerprint] = None
+        self._next_version = 1
+        self.copies_made = 0
+
+    def acquire(self) -> Snapshot:
+        with self._lock:
+            fp = fingerprint(self.source_path)
+            if self._current is None or fp != self._current_fp:
+                version, fp = self._copy_version(fp)
+                self._current = version
+                self._current_fp = fp
+                self._refcounts[version] = 0
+                self._collect()
+            version = self._current
+            self._refcounts[version] += 1
+            return Snapshot(self, version, self._paths[version])
+
+    def current_version(self) -> Optional[int]:
+        return self._current
+
+    def live_versions(self) -> Dict[int, int]:
+        with self._lock:
+            return dict(self._refcounts)
+
+    def close(self) -> None:
+        """
+        Once no snapshot is held, delete them all and the temporary root
+        (a root_dir passed in is kept); while one is still held this does
+        nothing. For managers with a single owner: the shared ones from
+        manager_for() live as long as the process and are removed at exit.
+        A later acquire() starts over with a fresh copy.
+        """
+        with self._lock:
+            if any(refs > 0 for refs in self._refcounts.values()):
+                return
+            self._current = None
+            self._current_fp = None
+            self._collect()
+            if self._owns_root and not self._refcounts:
+                shutil.rmtree(self.root_dir, ignore_errors=True)
+                with _owned_roots_lock:
+                    _owned_roots.discard(self.root_dir)
+
+    def _make_root(self) -> None:
+        os.makedirs(self.root_dir, exist_ok=True)
+        if self._owns_root:
+            with _owned_roots_lock:
+                _owned_roots.add(self.root_dir)
+
+    def _release(self, version: int) -> None:
+        with self._lock:
+            if version in self._refcounts:
+                self._refcounts[version] -= 1
+                self._collect()
+
+    def _collect(self) -> None:
+        for version, refs in list(self._refcounts.items()):
+            if version != self._current and refs <= 0:
+                del self._refcounts[version]
+                shutil.rmtree(os.path.dirname(self._paths.pop(version)), ignore_errors=True)
+
+    def _copy_version(self, fp: SourceFingerprint):
+        version = self._next_version
+        self._next_version += 1
+        final_dir = os.path.join(self.root_dir, f"v{version}")
+        staging_dir = final_dir + ".tmp"
+
+        # Messages can write while we copy. Re-fingerprint afterwards and retry
+        # a couple of times so we don't publish a torn db/WAL pair. If it never
+        # settles, keep the pre-copy fingerprint so the next acquire re-copies.
+        for attempt in range(_COPY_ATTEMPTS):
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            if attempt == 0:
+                self._make_root()  # a closed manager's root is gone
+            os.makedirs(staging_dir)
+            dst_db = os.path.join(staging_dir, "chat.db")
+            shutil.copy2(self.source_path, dst_db)
+            for suffix in ("-wal", "-shm"):
+                s = self.source_path + suffix
+                if os.path.exists(s):
+                    shutil.copy2(s, dst_db + suffix)
+            after = fingerprint(self.source_path)
+            if after == fp:
+                break
+            if attempt < _COPY_ATTEMPTS - 1:
+                fp = after
+
+        os.rename(staging_dir, final_dir)
+        self._paths[version] = os.path.join(final_dir, "chat.db")
+        self.copies_made += 1
+        return version, fp
+
+
+_managers: Dict[str, SnapshotManager] = {}
+_managers_lock = threading.Lock()
+
+# mkdtemp roots not yet removed by close(); whatever is left goes at exit.
+_owned_roots: Set[str] = set()
+_owned_roots_lock = threading.Lock()
+
+
+@atexit.register
+def _remove_owned_roots() -> None:
+    with _owned_roots_lock:
+        roots = list(_owned_roots)
+        _owned_roots.clear()
+    for root in roots:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def manager_for(source_path: Optional[str] = None) -> SnapshotManager:
+    """
+    Process-wide SnapshotManager per source database, so every MessageBridge
+    reading the same chat.db shares (and reuses) the same snapshots.
+    """
+    key = os.path.abspath(source_path or DEFAULT_SOURCE_DB)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = SnapshotManager(key)
+            _managers[key] = manager
+        return manager
@@ -0,0 +1,250 @@
+from __future__ import annotations
+
+import bisect
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open.
+BUCKET_BOUNDS_MS: Tuple[float, ...] = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+SLOW_QUERY_SECONDS = 0.05
+MAX_PLANS_PER_QUERY = 5
+ITER_FETCH_ROWS = 256  # rows per fetchmany() when a cursor is iterated
+
+
+@dataclass(frozen=True)
+class SlowQuery:
+    seconds: float
+    rows: int
+    sql: str
+    plan: Tuple[str, ...]  # EXPLAIN QUERY PLAN detail lines, indented by depth
+
+
+@dataclass
+class QueryStats:
+    name: str
+    calls: int = 0
+    rows: int = 0
+    total_seconds: float = 0.0
+    max_seconds: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * (len(BUCKET_BOUNDS_MS) + 1))
+    slow: Deque[SlowQuery] = field(default_factory=lambda: deque(maxlen=MAX_PLANS_PER_QUERY))
+
+    def add(self, seconds: float, rows: int) -> None:
+        self.calls += 1
+        self.rows += rows
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, seconds * 1000)] += 1
+
+    def percentile_ms(self, q: float) -> float:
+        """
+        Upper bound of the histogram bucket holding the q-th quantile.
+        """
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max_seconds * 1000
+        return self.max_seconds * 1000
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "rows": self.rows,
+            "total_ms": self.total_seconds * 1000,
+            "mean_ms": self.total_seconds * 1000 / self.calls if self.calls else 0.0,
+            "p50_ms": self.percentile_ms(0.5),
+            "p95_ms": self.percentile_ms(0.95),
+            "max_ms": self.max_seconds * 1000,
+            "histogram": dict(zip([f"<={b}ms" for b in BUCKET_BOUNDS_MS] + ["inf"], self.buckets)),
+            "slow": [
+                {"ms": s.seconds * 1000, "rows": s.rows, "sql": s.sql, "plan": list(s.plan)}
+                for s in self.slow
+            ],
+        }
+
+
+class QueryRecorder:
+    """
+    Collects per-query latency histograms and row counts from
+    InstrumentedCursor. Statements slower than slow_threshold get their
+    EXPLAIN QUERY PLAN captured (the last few per query name are kept).
+    """
+
+    def __init__(self, slow_threshold: float = SLOW_QUERY_SECONDS) -> None:
+        self.slow_threshold = slow_threshold
+        self._lock = threading.Lock()
+        self._stats: Dict[str, QueryStats] = {}
+        self._dump_stop: Optional[threading.Event] = None
+
+    def record(
+        self,
+        name: str,
+        seconds: float,
+        rows: int,
+        sql: str,
+        params: Sequence[Any],
+        conn: Any,
+    ) -> None:
+        slow = None
+        if seconds >= self.slow_threshold:
+            slow = SlowQuery(seconds, rows, sql.strip(), explain(conn, sql, params))
+        with self._lock:
+            stats = self._stats.get(name)
+            if stats is None:
+                stats = self._stats[name] = QueryStats(name)
+            stats.add(seconds, rows)
+            if slow is not None:
+                stats.slow.append(slow)
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        """
+        {query name: {calls, rows, total_ms, mean_ms, p50_ms, p95_ms, max_ms,
+        histogram, slow}}, most expensive (total time) first.
+        """
+        with self._lock:
+            ordered = sorted(self._stats.values(), key=lambda s: s.total_seconds, reverse=True)
+            return {s.name: s.as_dict() for s in ordered}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def report(self) -> str:
+        lines = [f"{'query':<36} {'calls':>7} {'rows':>9} {'total ms':>10} {'p50':>7} {'p95':>7} {'max ms':>9}"]
+        for name, s in self.stats().items():
+            lines.append(
+                f"{name:<36} {s['calls']:>7} {s['rows']:>9} {s['total_ms']:>10.1f} "
+                f"{s['p50_ms']:>7g} {s['p95_ms']:>7g} {s['max_ms']:>9.2f}"
+            )
+            for slow in s["slow"][-1:]:
+                lines.append(f"    slowest recent: {slow['ms']:.1f} ms, {slow['rows']} rows")
+                lines.extend(f"      {line}" for line in slow["plan"])
+        return "\n".join(lines)
+
+    def start_dump(self, interval: float = 60.0, write: Optional[Callable[[str], None]] = None) -> None:
+        """
+        Write report() every `interval` seconds from a daemon thread
+        (to stderr unless `write` is given) until stop_dump().
+        """
+        self.stop_dump()
+        stop = self._dump_stop = threading.Event()
+        write = write or (lambda text: print(text, file=sys.stderr))
+
+        def run() -> None:
+            while not stop.wait(interval):
+                write(self.report())
+
+        threading.Thread(target=run, name="sql-stats-dump", daemon=True).start()
+
+    def stop_dump(self) -> None:
+        if self._dump_stop is not None:
+            self._dump_stop.set()
+            self._dump_stop = None
+
+
+DEFAULT_RECORDER = QueryRecorder()
+
+
+def explain(conn: Any, sql: str, params: Sequence[Any]) -> Tuple[str, ...]:
+    try:
+        rows = conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall()
+    except Exception as e:
+        return (f"(no plan: {e})",)
+    depth: Dict[int, int] = {0: -1}
+    lines = []
+    for node_id, parent, _unused, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + detail)
+    return tuple(lines)
+
+
+class InstrumentedCursor:
+    """
+    sqlite3.Cursor wrapper that times each statement from execute() until
+    its rows have been fetched and reports it to a QueryRecorder.
+
+    A statement is recorded once fetchall() returns, fetchmany() returns a
+    short batch, iteration ends, or on the first fetchone(), which is a
+    point lookup that nothing else may follow. A statement that is never
+    read to the end is recorded on the next execute(), close(), or when
+    the cursor is garbage collected.
+
+    The query name defaults to the calling function ("top_chats",
+    "_chat_participants_many", ...), so existing call sites are instrumented
+    without changes; pass name= to label one explicitly.
+    """
+
+    def __init__(self, cursor: Any, recorder: QueryRecorder) -> None:
+        self._cursor = cursor
+        self._recorder = recorder
+        self._pending: Optional[List[Any]] = None  # [name, sql, params, seconds, rows]
+
+    def execute(self, sql: str, params: Sequence[Any] = (), name: Optional[str] = None) -> "InstrumentedCursor":
+        self._finish()
+        if name is None:
+            name = sys._getframe(1).f_code.co_name
+        t0 = time.perf_counter()
+        self._cursor.execute(sql, params)
+        self._pending = [name, sql, params, time.perf_counter() - t0, 0]
+        return self
+
+    def _fetched(self, t0: float, rows: int, exhausted: bool) -> None:
+        pending = self._pending
+        if pending is not None:
+            pending[3] += time.perf_counter() - t0
+            pending[4] += rows
+            if exhausted:
+                self._finish()
+
+    def _finish(self) -> None:
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            name, sql, params, seconds, rows = pending
+            self._recorder.record(name, seconds, rows, sql, params, self._cursor.connection)
+
+    def fetchall(self) -> List[Any]:
+        t0 = time.perf_counter()
+        rows = self._cursor.fetchall()
+        self._fetched(t0, len(rows), True)
+        return rows
+
+    def fetchone(self) -> Any:
+        t0 = time.perf_counter()
+        row = self._cursor.fetchone()
+        self._fetched(t0, row is not None, True)
+        return row
+
+    def fetchmany(self, size: Optional[int] = None) -> List[Any]:
+        size = self._cursor.arraysize if size is None else size
+        t0 = time.perf_counter()
+        rows = self._cursor.fetchmany(size)
+        self._fetched(t0, len(rows), len(rows) < size)
+        return rows
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(ITER_FETCH_ROWS)
+            yield from rows
+            if len(rows) < ITER_FETCH_ROWS:
+                return
+
+    def close(self) -> None:
+        self._finish()
+        self._cursor.close()
+
+    def __del__(self) -> None:
+        try:
+            self._finish()
+        except Exception:
+            pass  # connection already closed at interpreter shutdown
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self._cursor, attr)
@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import plistlib
+import struct
+from typing import Optional, Tuple
+
+# Decoders for message.attributedBody that don't need Foundation.
+#
+# Messages stores attributedBody as an NSArchiver "typedstream" of an
+# NSAttributedString (older/rarer blobs are NSKeyedArchiver bplists). Only the
+# plain string is needed, which typedstream writes as the first C string
+# ('+' type) after the NSString class record:
+#
+#   ... NSString \x01 \x94 \x84 \x01 + <length> <utf-8 bytes> \x86 ...
+#
+# <length> uses typedstream's integer encoding: one signed byte for small
+# values, 0x81 + int16 LE, or 0x82 + int32 LE. The int16 form is signed, so
+# writers switch to 0x82 above 32767.
+
+TYPEDSTREAM_HEADER = b"\x04\x0bstreamtyped"
+BPLIST_HEADER = b"bplist00"
+
+_TAG_INT16 = 0x81
+_TAG_INT32 = 0x82
+_STRING_MARKER = b"\x84\x01+"
+_STRING_CLASSES = (b"NSMutableString", b"NSString")
+
+
+def _read_int(blob: bytes, pos: int) -> Tuple[Optional[int], int]:
+    if pos >= len(blob):
+        return None, pos
+    tag = blob[pos]
+    if tag == _TAG_INT16:
+        if pos + 3 > len(blob):
+            return None, pos
+        return struct.unpack_from("<H", blob, pos + 1)[0], pos + 3
+    if tag == _TAG_INT32:
+        if pos + 5 > len(blob):
+            return None, pos
+        return struct.unpack_from("<I", blob, pos + 1)[0], pos + 5
+    if tag < 0x80:
+        return tag, pos + 1
+    return None, pos
+
+
+def decode_typedstream_text(blob: bytes) -> str:
+    start = 0
+    for cls in _STRING_CLASSES:
+        i = blob.find(cls)
+        if i != -1:
+            start = i + len(cls)
+            break
+
+    i = blob.find(_STRING_MARKER, start)
+    if i != -1:
+        pos = i + len(_STRING_MARKER)
+    else:
+        # Some writers omit the shared-type tag before "+"
+        i = blob.find(b"\x01+", start)
+        if i == -1:
+            return ""
+        pos = i + 2
+
+    length, pos = _read_int(blob, pos)
+    if length is None or pos + length > len(blob):
+        return ""
+    return blob[pos:pos + length].decode("utf-8", errors="replace")
+
+
+def decode_keyed_archive_text(blob: bytes) -> str:
+    try:
+        archive = plistlib.loads(blob)
+        objects = archive["$objects"]
+        root = objects[archive["$top"]["root"].data]
+        value = objects[root["NSString"].data]
+    except Exception:
+        return ""
+    if isinstance(value, dict):
+        value = value.get("NS.string", "")
+    return value if isinstance(value, str) else ""
+
+
+def decode_attributed_body(blob: Optional[bytes]) -> str:
+    """
+    Plain text of a message.attributedBody blob, or "" if it can't be decoded.
+    """
+    if not blob:
+        return ""
+    if isinstance(blob, memoryview):
+        blob = blob.tobytes()
+    if blob.startswith(BPLIST_HEADER):
+        return decode_keyed_archive_text(blob)
+    return decode_typedstream_text(blob)
+
+
+def _encode_int(value: int) -> bytes:
+    if value < 0x80:
+        return bytes([value])
+    if value <= 0x7FFF:
+        return bytes([_TAG_INT16]) + struct.pack("<h", value)
+    return bytes([_TAG_INT32]) + struct.pack("<I", value)
+
+
+def encode_attributed_body(text: str) -> bytes:
+    """
+    Build a typedstream NSAttributedString blob shaped like the ones Messages
+    writes (one attribute run, __kIMMessagePartAttributeName = 0).
+    """
+    data = text.encode("utf-8")
+    utf16_len = len(text.encode("utf-16-le")) // 2
+    return (
+        TYPEDSTREAM_HEADER
+        + b"\x81\xe8\x03\x84\x01@\x84\x84\x84\x12NSAttributedString\x00"
+        + b"\x84\x84\x08NSObject\x00\x85\x92\x84\x84\x84\x08NSString\x01\x94"
+        + _STRING_MARKER
+        + _encode_int(len(data))
+        + data
+        + b"\x86\x84\x02iI\x01"
+        + _encode_int(utf16_len)
+        + b"\x92\x84\x84\x84\x0cNSDictionary\x00\x94\x84\x01i\x01\x92\x84\x96\x96"
+        + b"\x1d__kIMMessagePartAttributeName\x86\x92\x84\x84\x84\x08NSNumber\x00"
+        + b"\x84\x84\x07NSValue\x00\x94\x84\x01*\x84\x99\x99\x00\x86\x86\x86"
+    )
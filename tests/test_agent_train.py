@@ -1,13 +1,21 @@
 from datetime import datetime, timedelta
 
+import pytest
+
 from agent_train import (
+    FineTuningOrchestrator,
+    InMemoryMetadataStore,
     MessageRecord,
+    PipelineStats,
     TrainingConfig,
     build_dataset,
     clean_messages,
     select_model_for_user,
     should_train,
     split_train_holdout,
+    stream_clean,
+    stream_dataset,
+    training_line,
     UserModelState,
 )
 
@@ -79,3 +87,140 @@ def test_select_model_for_user():
 
     assert select_model_for_user(state_ready, "base-model") == "ft-model"
     assert select_model_for_user(state_none, "base-model") == "base-model"
+
+
+def test_stream_dataset_matches_sorted_split():
+    base_time = datetime(2025, 1, 1, 8, 0, 0)
+    config = TrainingConfig(holdout_ratio=0.15)
+    for n in (1, 2, 3, 7, 10, 41, 100):
+        messages = [_msg(i, f"message {i}", base_time + timedelta(minutes=i)) for i in range(n)]
+        train, holdout = split_train_holdout(messages, config.holdout_ratio)
+
+        dataset = stream_dataset(iter(messages), config)
+
+        assert list(dataset.holdout) == holdout
+        assert dataset.train_lines == tuple(training_line(m, config) for m in train)
+        assert dataset.dataset_hash == build_dataset(list(reversed(messages)), config).dataset_hash
+
+
+def test_stream_clean_pulls_lazily_and_counts_stages():
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    pulled = []
+
+    def source():
+        for i, text in enumerate(["too old to keep", "hello there", "ok", "Hello  there", "call 415-555-1111"]):
+            pulled.append(i)
+            yield _msg(i, text, now - timedelta(days=200 if i == 0 else 1))
+
+    stats = PipelineStats()
+    stream = stream_clean(source(), TrainingConfig(), now=now, stats=stats)
+    assert next(stream).text == "hello there"
+    assert pulled == [0, 1]
+
+    rest = list(stream)
+    assert [m.text for m in rest] == ["call [REDACTED_PHONE]"]
+    counts = {s.name: (s.records_in, s.records_out) for s in stats.stages}
+    assert counts == {
+        "recent": (5, 4),
+        "sent": (4, 4),
+        "clean": (4, 3),
+        "redact": (3, 3),
+        "dedupe": (3, 2),
+        "tokens": (2, 2),
+    }
+    assert (stats.messages, stats.tokens) == (2, 4)
+
+
+def test_dedupe_runs_on_redacted_text():
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    messages = [_msg(1, "Call me at 415-555-1111", now), _msg(2, "call me at 212-555-2222", now)]
+
+    assert len(clean_messages(messages, TrainingConfig(redact_pii=True))) == 1
+    assert len(clean_messages(messages, TrainingConfig(redact_pii=False))) == 2
+
+
+class _FakeClient:
+    def __init__(self):
+        self.uploaded = None
+
+    def upload_training_file(self, jsonl):
+        self.uploaded = jsonl
+        return "file-1"
+
+    def create_fine_tune_job(self, training_file_id, base_model):
+        return "job-1"
+
+    def poll_fine_tune_job(self, job_id):
+        return "succeeded", "ft-model"
+
+
+class _Reiterable:
+    # A re-readable source, like a view over chat.db: every iteration
+    # generates the records afresh.
+    def __init__(self, make):
+        self.make = make
+        self.passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        return iter(self.make())
+
+
+def test_orchestrator_streams_ordered_records():
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    start = now - timedelta(days=30)
+    config = TrainingConfig(min_messages=20, min_tokens=50)
+    source = _Reiterable(lambda: (_msg(i, f"note number {i} for later", start + timedelta(hours=i)) for i in range(100)))
+
+    client = _FakeClient()
+    orchestrator = FineTuningOrchestrator(client, InMemoryMetadataStore(), config)
+    metadata = orchestrator.start_training("u1", source, now=now)
+
+    assert source.passes == 2
+    assert metadata.status == "succeeded"
+    assert metadata.num_messages == 100
+    assert metadata.training_data_range == (start, start + timedelta(hours=99))
+    assert len(client.uploaded.splitlines()) == 90
+    serialize = orchestrator.last_pipeline_stats.stage("serialize")
+    assert (serialize.records_in, serialize.records_out) == (90, 90)
+
+
+def test_orchestrator_sorts_records_that_arrive_out_of_order():
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    start = now - timedelta(days=30)
+    config = TrainingConfig(min_messages=20, min_tokens=50)
+    messages = [_msg(i, f"note number {i} for later", start + timedelta(hours=i)) for i in range(100)]
+    shuffled = messages[50:] + messages[:50]
+
+    client = _FakeClient()
+    orchestrator = FineTuningOrchestrator(client, InMemoryMetadataStore(), config)
+    metadata = orchestrator.start_training("u1", shuffled, now=now)
+
+    expected = build_dataset(messages, config)
+    assert metadata.dataset_hash == expected.dataset_hash
+    assert client.uploaded == expected.to_jsonl()
+    assert orchestrator.last_pipeline_stats.out_of_order == 1
+
+
+def test_orchestrator_skips_without_serializing():
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    config = TrainingConfig(min_messages=500)
+    messages = [_msg(i, f"note number {i} for later", now - timedelta(hours=i)) for i in range(10)]
+
+    orchestrator = FineTuningOrchestrator(_FakeClient(), InMemoryMetadataStore(), config)
+    metadata = orchestrator.start_training("u1", messages[::-1], now=now)
+
+    assert metadata.status == "failed"
+    assert metadata.num_messages == 10
+    assert orchestrator.last_pipeline_stats.stage("serialize").records_in == 0
+
+
+def test_one_shot_iterators_and_unordered_streams_are_rejected():
+    now = datetime(2025, 6, 1, 12, 0, 0)
+    messages = [_msg(i, f"message {i}", now - timedelta(minutes=i)) for i in range(3)]
+    orchestrator = FineTuningOrchestrator(_FakeClient(), InMemoryMetadataStore(), TrainingConfig())
+
+    with pytest.raises(TypeError):
+        orchestrator.start_training("u1", iter(messages), now=now)
+    with pytest.raises(ValueError):
+        stream_dataset(messages, TrainingConfig())
@@ -0,0 +1,95 @@
+import os
+import threading
+
+from attachments import AttachmentInfo, ThumbnailCache, load_attachments
+from chatdb_synth import create_chat_db, insert_attachment, insert_chat, insert_handle, insert_message
+
+
+def test_load_attachments_is_one_query_for_a_page(tmp_path):
+    conn = create_chat_db(str(tmp_path / "chat.db"))
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    photo = insert_message(conn, chat_id, 1_000, None, handle_id=alice, cache_has_attachments=1)
+    insert_message(conn, chat_id, 2_000, "plain text", handle_id=alice)
+    album = insert_message(conn, chat_id, 3_000, None, is_from_me=1, cache_has_attachments=1)
+    insert_attachment(conn, photo, "~/Library/Messages/Attachments/a1/IMG_0001.HEIC", "image/heic", 2_400_000)
+    insert_attachment(conn, album, "~/Library/Messages/Attachments/b2/IMG_0002.JPG", "image/jpeg", 900_000)
+    insert_attachment(conn, album, "~/Library/Messages/Attachments/b2/notes.pdf", "application/pdf", 12_000)
+    conn.commit()
+
+    statements = []
+    conn.set_trace_callback(statements.append)
+    found = load_attachments(conn, [photo, photo + 1, album])
+    conn.set_trace_callback(None)
+    conn.close()
+
+    assert len(statements) == 1
+    assert sorted(found) == [photo, album]
+    (heic,) = found[photo]
+    assert heic.name == "IMG_0001.HEIC"
+    assert heic.path == os.path.expanduser("~/Library/Messages/Attachments/a1/IMG_0001.HEIC")
+    assert (heic.mime_type, heic.total_bytes, heic.is_image) == ("image/heic", 2_400_000, True)
+    assert [(a.name, a.is_image) for a in found[album]] == [("IMG_0002.JPG", True), ("notes.pdf", False)]
+
+
+def _fake_renderer(calls):
+    def render(src_path, dst_path, max_edge):
+        calls.append(threading.current_thread().name)
+        with open(dst_path, "wb") as f:
+            f.write(b"\x89PNG" + b"\0" * 96)
+        return True
+
+    return render
+
+
+def test_thumbnail_cache_renders_off_thread_once_and_evicts_lru(tmp_path):
+    sources = []
+    for i in range(3):
+        src = tmp_path / f"img{i}.jpg"
+        src.write_bytes(b"jpeg" * (i + 1))
+        sources.append(AttachmentInfo(i + 1, i + 1, str(src), src.name, "image/jpeg", None, 4, 0))
+    calls = []
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), max_bytes=250, renderer=_fake_renderer(calls))
+
+    assert cache.get(sources[0]) is None
+    first = cache.request(sources[0]).result()
+    again = cache.request(sources[0]).result()
+    assert first == again == cache.get(sources[0])
+    assert len(calls) == 1
+    assert calls[0] != threading.current_thread().name
+
+    cache.request(sources[1]).result()
+    cache.get(sources[0])  # touch, so sources[1] is now least recently used
+    cache.request(sources[2]).result()
+    cache.close()
+
+    assert cache.get(sources[1]) is None
+    assert cache.get(sources[0]) and cache.get(sources[2])
+    assert cache.total_bytes() <= 250
+
+    # The index is rebuilt from disk on the next start
+    reopened = ThumbnailCache(str(tmp_path / "thumbs"), max_bytes=250, renderer=_fake_renderer(calls))
+    assert reopened.get(sources[2]) == cache.get(sources[2])
+    assert len(calls) == 3
+
+
+def test_thumbnail_cache_does_not_retry_a_failed_render_until_the_file_changes(tmp_path):
+    src = tmp_path / "broken.heic"
+    src.write_bytes(b"not an image")
+    attachment = AttachmentInfo(1, 1, str(src), src.name, "image/heic", None, 12, 0)
+    calls = []
+
+    def failing(src_path, dst_path, max_edge):
+        calls.append(src_path)
+        return False
+
+    cache = ThumbnailCache(str(tmp_path / "thumbs"), renderer=failing)
+    assert cache.request(attachment).result() is None
+    assert cache.request(attachment).result() is None
+    assert len(calls) == 1
+
+    src.write_bytes(b"a different file")
+    os.utime(src, ns=(0, os.stat(src).st_mtime_ns + 1_000_000_000))
+    assert cache.request(attachment).result() is None
+    cache.close()
+    assert len(calls) == 2
@@ -0,0 +1,106 @@
+import time
+
+from change_feed import ChangeFeed, MessagesAdded, SourceChanged
+from chatdb_synth import create_chat_db, insert_chat, insert_handle, insert_message
+
+
+def _source(tmp_path):
+    conn = create_chat_db(str(tmp_path / "chat.db"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    alice = insert_handle(conn, "+14155550001")
+    bob = insert_handle(conn, "+14155550002")
+    chats = [insert_chat(conn, "+14155550001", [alice]), insert_chat(conn, "+14155550002", [bob])]
+    insert_message(conn, chats[0], 1_000, "already there", handle_id=alice)
+    conn.commit()
+    return conn, chats
+
+
+def test_feed_reports_chats_with_new_rowids_after_a_burst(tmp_path):
+    conn, (first, second) = _source(tmp_path)
+    events = []
+
+    with ChangeFeed(str(tmp_path / "chat.db"), debounce=0.1, poll_interval=0.02) as feed:
+        feed.subscribe(events.append)
+        # A burst of single-row commits, like Messages receiving a thread
+        for i in range(10):
+            insert_message(conn, second if i % 3 else first, 2_000 + i, f"m{i}")
+            conn.commit()
+            time.sleep(0.005)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            added = [e for e in events if isinstance(e, MessagesAdded)]
+            if sum(c.new_messages for e in added for c in e.chats) == 10:
+                break
+            time.sleep(0.02)
+    conn.close()
+
+    added = [e for e in events if isinstance(e, MessagesAdded)]
+    assert sum(c.new_messages for e in added for c in e.chats) == 10
+    assert {chat_id for e in added for chat_id in e.chat_ids} == {first, second}
+    # Debounced: the burst is not reported commit by commit
+    assert len(added) < 10
+    assert added[0].since_rowid == 1
+    assert added[-1].max_rowid == 11
+
+
+def test_poll_distinguishes_new_messages_from_other_writes(tmp_path):
+    conn, (first, _second) = _source(tmp_path)
+    feed = ChangeFeed(str(tmp_path / "chat.db"))
+    seen = []
+    unsubscribe = feed.subscribe(seen.append)
+
+    assert feed.poll() is None
+
+    conn.execute("UPDATE message SET text = 'edited' WHERE ROWID = 1")
+    conn.commit()
+    assert isinstance(feed.poll(), SourceChanged)
+
+    rowid = insert_message(conn, first, 3_000, "new")
+    conn.commit()
+    event = feed.poll()
+    assert isinstance(event, MessagesAdded)
+    assert event.chat_ids == (first,)
+    assert event.chats[0].last_message_rowid == rowid
+
+    unsubscribe()
+    insert_message(conn, first, 4_000, "unheard")
+    conn.commit()
+    feed.poll()
+    feed.stop()
+    conn.close()
+
+    assert len(seen) == 2
+
+
+def test_feed_survives_os_errors_in_the_watcher_and_poll(tmp_path, monkeypatch, caplog):
+    import change_feed
+
+    conn, (first, _second) = _source(tmp_path)
+    monkeypatch.setattr(change_feed, "ERROR_BACKOFF_SECONDS", 0.01)
+    real_fingerprint = change_feed.fingerprint
+    failures = {"left": 0}
+
+    def flaky_fingerprint(path):
+        # Like the WAL being rotated under a stat(): the first two calls fail.
+        if failures["left"]:
+            failures["left"] -= 1
+            raise FileNotFoundError(path + "-wal")
+        return real_fingerprint(path)
+
+    feed = ChangeFeed(str(tmp_path / "chat.db"), debounce=0.02, poll_interval=0.02)
+    events = []
+    feed.subscribe(events.append)
+    monkeypatch.setattr(change_feed, "fingerprint", flaky_fingerprint)
+    with feed:
+        failures["left"] = 2
+        deadline = time.monotonic() + 5
+        while failures["left"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        insert_message(conn, first, 5_000, "after the errors")
+        conn.commit()
+        while time.monotonic() < deadline and not any(isinstance(e, MessagesAdded) for e in events):
+            time.sleep(0.02)
+    conn.close()
+
+    assert any(isinstance(e, MessagesAdded) for e in events)
+    assert "change feed" in caplog.text
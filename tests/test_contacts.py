@@ -0,0 +1,268 @@
+import threading
+
+import pytest
+
+from contact_index import ContactIndex, load_or_build, phone_key
+from contact_sources import (
+    CSVContactSource,
+    ContactEntry,
+    ContactSource,
+    MemoryContactSource,
+    VCardContactSource,
+    source_for_path,
+)
+from contacts import ContactsConnector
+from contacts_synth import generate_contacts, handles_for, write_csv, write_vcard
+
+ENTRIES = [
+    ContactEntry("Alice Smith", ("+1 (415) 555-0100",), ("Alice@Example.com",)),
+    ContactEntry("Bob Jones", ("555-0199",)),
+    ContactEntry("Carol", (), ("carol@example.org",)),
+]
+
+
+@pytest.fixture(autouse=True)
+def _reset_connector():
+    yield
+    ContactsConnector.configure(None, None)
+
+
+def test_lookup_by_phone_and_email():
+    index = ContactIndex.build(MemoryContactSource(ENTRIES))
+
+    assert index.lookup("+14155550100") == "Alice Smith"
+    assert index.lookup("4155550100") == "Alice Smith"
+    assert index.lookup("alice@example.com") == "Alice Smith"
+    assert index.lookup("+1 212 555 0199") == "Bob Jones"  # 7-digit fallback
+    assert index.lookup("carol@EXAMPLE.org") == "Carol"
+    assert index.lookup("12345") is None
+    assert index.lookup("") is None
+    assert index.contacts_seen == 3
+
+
+def test_contact_source_requires_contacts():
+    class Incomplete(ContactSource):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
+    assert MemoryContactSource([]).change_token()
+
+
+def test_warm_start_loads_cache_without_enumerating(tmp_path):
+    cache = str(tmp_path / "contacts.bin")
+    source = MemoryContactSource(ENTRIES)
+
+    first = load_or_build(source, cache)
+    second = load_or_build(source, cache)
+
+    assert source.enumerations == 1
+    assert second.token == first.token
+    assert second.lookup("+14155550100") == "Alice Smith"
+    assert second.names == first.names
+
+
+def test_changed_source_invalidates_cache(tmp_path):
+    cache = str(tmp_path / "contacts.bin")
+    load_or_build(MemoryContactSource(ENTRIES), cache)
+
+    changed = MemoryContactSource(ENTRIES[:1] + [ContactEntry("Bobby", ("555-0199",))])
+    index = load_or_build(changed, cache)
+
+    assert changed.enumerations == 1
+    assert index.lookup("5550199") == "Bobby"
+    assert ContactIndex.load(cache).token == changed.change_token()
+
+
+def test_corrupt_cache_is_rebuilt(tmp_path):
+    cache = tmp_path / "contacts.bin"
+    cache.write_bytes(b"AIOC\x01garbage")
+    source = MemoryContactSource(ENTRIES)
+
+    assert load_or_build(source, str(cache)).lookup("carol@example.org") == "Carol"
+    assert source.enumerations == 1
+
+
+def test_connector_uses_configured_source(tmp_path):
+    ContactsConnector.configure(MemoryContactSource(ENTRIES), str(tmp_path / "contacts.bin"))
+    ContactsConnector.build_index_for_handles(["+14155550100", "unknown@example.com"], wait=True)
+
+    assert ContactsConnector.get_contact_name("+14155550100") == "Alice Smith"
+    assert ContactsConnector.get_contact_name("unknown@example.com") is None
+
+
+def test_handles_seen_after_first_build_resolve():
+    source = MemoryContactSource(ENTRIES)
+    ContactsConnector.configure(source, None)
+    ContactsConnector.build_index_for_handles(["+14155550100"], wait=True)
+
+    # Not part of the first batch, and no second enumeration needed
+    assert ContactsConnector.get_contact_name("carol@example.org") == "Carol"
+    ContactsConnector.build_index_for_handles(["555-0199"])
+    assert ContactsConnector.get_contact_name("555-0199") == "Bob Jones"
+    assert source.enumerations == 1
+
+
+def test_refresh_swaps_in_new_index_while_readers_run(tmp_path):
+    source = MemoryContactSource(ENTRIES)
+    ContactsConnector.configure(source, str(tmp_path / "contacts.bin"))
+    ContactsConnector.ensure_loaded()
+    stop = threading.Event()
+    seen = set()
+
+    def reader():
+        while not stop.is_set():
+            seen.add(ContactsConnector.get_contact_name("5550199"))
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    source.entries[1] = ContactEntry("Robert Jones", ("555-0199",))
+    ContactsConnector.refresh().result()
+    assert ContactsConnector.get_contact_name("5550199") == "Robert Jones"
+    stop.set()
+    thread.join()
+
+    assert seen <= {"Bob Jones", "Robert Jones"}
+    assert source.enumerations == 2
+
+
+class _GatedSource(MemoryContactSource):
+    def __init__(self, entries):
+        super().__init__(entries)
+        self.gate = threading.Event()
+
+    def contacts(self):
+        self.gate.wait(5)
+        return super().contacts()
+
+
+def test_async_load_returns_at_once_and_notifies_subscribers():
+    source = _GatedSource(ENTRIES)
+    ContactsConnector.configure(source, None)
+    notified = []
+    unsubscribe = ContactsConnector.subscribe(notified.append)
+    try:
+        ContactsConnector.build_index_for_handles(["+14155550100"])  # must not block
+        future = ContactsConnector.load_async()
+        assert not future.done()
+        assert ContactsConnector.get_contact_name("+14155550100") is None  # shown raw for now
+
+        source.gate.set()
+        index = future.result(5)
+    finally:
+        unsubscribe()
+
+    assert notified == [index]
+    assert ContactsConnector.get_contact_name("+14155550100") == "Alice Smith"
+    assert ContactsConnector.load_async().result() is index
+    assert source.enumerations == 1
+
+
+def test_phone_key_handles_country_codes():
+    assert phone_key("+1 (415) 555-0100") == ("1", "4155550100")
+    assert phone_key("1-415-555-0100") == ("1", "4155550100")
+    assert phone_key("011 44 20 7946 0958") == ("44", "2079460958")
+    assert phone_key("+44 20 7946 0958") == ("44", "2079460958")
+    assert phone_key("0044 20 7946 0958") == ("44", "2079460958")
+    assert phone_key("020 7946 0958", "44") == ("44", "2079460958")
+    assert phone_key("+39 06 1234 5678") == ("39", "0612345678")
+    assert phone_key("+353 85 123 4567") == ("353", "851234567")
+    assert phone_key("４１５ 555 0100") == ("1", "4155550100")  # fullwidth digits
+    assert phone_key("22395") is None
+    assert phone_key("not a number") is None
+
+
+def test_foreign_numbers_do_not_collide_on_national_digits():
+    index = ContactIndex.build(MemoryContactSource([
+        ContactEntry("London", ("+44 20 7946 0958",)),
+        ContactEntry("Maine", ("(207) 946-0958",)),
+    ]))
+
+    assert index.lookup("+442079460958") == "London"
+    assert index.lookup("+12079460958") == "Maine"
+
+
+def test_only_numbers_without_a_country_code_get_suffix_keys():
+    index = ContactIndex.build(MemoryContactSource([
+        ContactEntry("London", ("+44 20 7946 0958",)),
+        ContactEntry("Bob Jones", ("555-0199",)),
+    ]))
+
+    assert index.phone10 == {} and list(index.phone7) == ["5550199"]
+    assert index.lookup("+442079460958") == "London"
+    assert index.lookup("+1 207 946 0958") is None
+    assert index.lookup("+1 212 555 0199") == "Bob Jones"
+
+
+def test_resolve_many_matches_lookup_and_memoizes():
+    contacts = generate_contacts(500, seed=2)
+    handles = handles_for(contacts, 2_000, seed=3)
+    index = ContactIndex.build(MemoryContactSource(contacts))
+
+    names = index.resolve_many(handles)
+
+    assert names == [index.lookup(h) for h in handles]
+    assert sum(name is not None for name in names) > 1_400
+    assert index.resolve_many(handles[:10]) == names[:10]
+    ContactsConnector.configure(MemoryContactSource(contacts), None)
+    ContactsConnector.ensure_loaded()
+    assert ContactsConnector.resolve_many(handles[:50]) == names[:50]
+
+
+def test_vcard_source_parses_common_dialects(tmp_path):
+    path = tmp_path / "contacts.vcf"
+    path.write_text(
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nN:Smith;Alice;;;\r\nFN:Alice Smith\r\n"
+        "item1.TEL;type=CELL;type=pref:(415) 555-0100\r\n"
+        "EMAIL;type=INTERNET:alice@\r\n example.com\r\nEND:VCARD\r\n"
+        "BEGIN:VCARD\r\nVERSION:4.0\r\nN:Jones;Bob;;;\r\nTEL;VALUE=uri;TYPE=\"voice,cell\":tel:+44-20-7946-0958\r\n"
+        "END:VCARD\r\n"
+        "BEGIN:VCARD\r\nVERSION:2.1\r\nFN;CHARSET=UTF-8;ENCODING=QUOTED-PRINTABLE:Ren=C3=\r\n=A9e\r\n"
+        "TEL;CELL:555-0199\r\nEND:VCARD\r\n"
+        "BEGIN:VCARD\r\nVERSION:3.0\r\nORG:Acme\\, Inc.;Sales\r\nEMAIL:sales@acme.example\r\nEND:VCARD\r\n",
+        encoding="utf-8",
+    )
+
+    entries = list(VCardContactSource(str(path)).contacts())
+
+    assert entries == [
+        ContactEntry("Alice Smith", ("(415) 555-0100",), ("alice@example.com",)),
+        ContactEntry("Bob Jones", ("+44-20-7946-0958",)),
+        ContactEntry("Renée", ("555-0199",)),
+        ContactEntry("Acme, Inc.", (), ("sales@acme.example",)),
+    ]
+
+
+def test_csv_source_reads_google_and_outlook_layouts(tmp_path):
+    google = tmp_path / "google.csv"
+    google.write_text(
+        "Name,Given Name,Family Name,E-mail 1 - Type,E-mail 1 - Value,Phone 1 - Type,Phone 1 - Value\n"
+        "Alice Smith,Alice,Smith,* Home,alice@example.com ::: a@work.example,Mobile,+1 415 555 0100\n",
+        encoding="utf-8-sig",
+    )
+    outlook = tmp_path / "outlook.csv"
+    outlook.write_text(
+        "First Name,Last Name,E-mail Address,Mobile Phone,Home Phone\nBob,Jones,,555-0199,\n",
+        encoding="utf-8",
+    )
+
+    assert list(source_for_path(str(google)).contacts()) == [
+        ContactEntry("Alice Smith", ("+1 415 555 0100",), ("alice@example.com", "a@work.example")),
+    ]
+    assert list(CSVContactSource(str(outlook)).contacts()) == [ContactEntry("Bob Jones", ("555-0199",))]
+
+
+def test_file_sources_round_trip_and_invalidate_on_edit(tmp_path):
+    contacts = generate_contacts(300, seed=4)
+    vcf, csv_path, cache = str(tmp_path / "a.vcf"), str(tmp_path / "a.csv"), str(tmp_path / "idx.bin")
+    write_vcard(vcf, contacts)
+    write_csv(csv_path, contacts)
+
+    assert list(VCardContactSource(vcf).contacts()) == contacts
+    assert list(CSVContactSource(csv_path).contacts()) == contacts
+
+    source = VCardContactSource(vcf)
+    first = load_or_build(source, cache)
+    assert load_or_build(source, cache).token == first.token
+    write_vcard(vcf, contacts[:-1])
+    assert load_or_build(source, cache).contacts_seen == 299
@@ -0,0 +1,27 @@
+from message_batch import MessageBatch
+
+
+ROWS = [
+    (3_000, 1, "see you", None, "text"),
+    (2_000, 0, "Attachment", "+14155550001", "attachment"),
+    (1_000, 0, "hi", "+14155550001", "text"),
+]
+
+
+def test_batch_behaves_like_list_of_tuples():
+    batch = MessageBatch(ROWS)
+
+    assert len(batch) == 3
+    assert batch == ROWS
+    assert batch[1] == ROWS[1]
+    assert list(reversed(batch)) == list(reversed(ROWS))
+    assert [text for _date, _me, text, _handle, _kind in batch] == ["see you", "Attachment", "hi"]
+    assert batch[1:] == ROWS[1:]
+
+
+def test_batch_stores_each_handle_once():
+    batch = MessageBatch(ROWS)
+
+    assert batch.handles == ["+14155550001"]
+    assert batch.handle(1) is batch.handle(2)
+    assert batch.handle(0) is None
@@ -0,0 +1,238 @@
+import os
+
+from chatdb_synth import create_chat_db, insert_chat, insert_handle, insert_message
+from message_sync import ChatDBMirror
+
+
+def _seed(path):
+    conn = create_chat_db(path)
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    insert_message(conn, chat_id, 1_000, "hi", handle_id=alice)
+    insert_message(conn, chat_id, 2_000, "hey", is_from_me=1)
+    conn.commit()
+    return conn, chat_id, alice
+
+
+def test_first_sync_copies_all_rows(tmp_path):
+    source, _chat_id, _alice = _seed(str(tmp_path / "chat.db"))
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+
+    copied = mirror.sync()
+
+    assert copied["message"] == 2
+    assert copied["chat_message_join"] == 2
+    assert copied["handle"] == 1
+    assert copied["chat"] == 1
+    assert mirror.watermarks()["message"] == 2
+    source.close()
+    mirror.close()
+
+
+def test_second_sync_only_pulls_rows_above_watermark(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+    mirror.sync()
+
+    assert mirror.sync()["message"] == 0
+
+    insert_message(source, chat_id, 3_000, "new", handle_id=alice)
+    source.commit()
+    copied = mirror.sync()
+
+    assert copied["message"] == 1
+    assert copied["chat_message_join"] == 1
+    assert copied["handle"] == 0
+    rows = mirror.conn.execute(
+        """
+        SELECT m.text
+        FROM chat_message_join cmj
+        JOIN message m ON m.ROWID = cmj.message_id
+        WHERE cmj.chat_id = ?
+        ORDER BY m.date
+        """,
+        (chat_id,),
+    ).fetchall()
+    assert [r[0] for r in rows] == ["hi", "hey", "new"]
+    source.close()
+    mirror.close()
+
+
+def test_watermarks_survive_reopen(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db")).sync()
+
+    insert_message(source, chat_id, 3_000, "later", handle_id=alice)
+    source.commit()
+    reopened = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+
+    assert reopened.sync()["message"] == 1
+    source.close()
+    reopened.close()
+
+
+def _texts(mirror, chat_id):
+    rows = mirror.conn.execute(
+        """
+        SELECT m.text
+        FROM chat_message_join cmj
+        JOIN message m ON m.ROWID = cmj.message_id
+        WHERE cmj.chat_id = ?
+        ORDER BY m.date
+        """,
+        (chat_id,),
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def test_in_place_updates_in_the_recent_window_are_pulled(tmp_path):
+    source, chat_id, _alice = _seed(str(tmp_path / "chat.db"))
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+    mirror.sync()
+
+    source.execute("UPDATE message SET is_read = 1, date_read = 5000 WHERE ROWID = 1")
+    source.commit()
+
+    assert mirror.sync()["message"] == 1
+    assert mirror.conn.execute("SELECT is_read, date_read FROM message WHERE ROWID = 1").fetchone() == (1, 5000)
+    assert mirror.sync()["message"] == 0
+    source.close()
+    mirror.close()
+
+
+def test_edits_and_unsends_outside_the_window_are_pulled(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    for i in range(20):
+        insert_message(source, chat_id, 10_000 + i, f"filler {i}", handle_id=alice)
+    source.commit()
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"), reconcile_rows=5)
+    mirror.sync()
+
+    source.execute("UPDATE message SET text = 'hi (edited)', date_edited = 7000 WHERE ROWID = 1")
+    source.execute("UPDATE message SET text = NULL, date_retracted = 8000 WHERE ROWID = 2")
+    source.commit()
+
+    assert mirror.sync()["message"] == 0  # below the window: left to reconcile()
+    assert mirror.reconcile()["message"] == 2
+    assert _texts(mirror, chat_id)[:2] == ["hi (edited)", None]
+    assert mirror.reconcile()["message"] == 0
+    source.close()
+    mirror.close()
+
+
+def test_deleted_messages_and_their_joins_are_removed(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    for i in range(20):
+        insert_message(source, chat_id, 10_000 + i, f"filler {i}", handle_id=alice)
+    source.commit()
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"), reconcile_rows=5)
+    mirror.sync()
+
+    # One message far below the reconcile window, and the newest one.
+    source.execute("DELETE FROM chat_message_join WHERE message_id IN (1, 22)")
+    source.execute("DELETE FROM message WHERE ROWID IN (1, 22)")
+    source.commit()
+
+    changed = mirror.sync()  # the newest one is in the reconcile window
+    assert changed["message"] == 1
+    assert changed["chat_message_join"] == 1
+    changed = mirror.reconcile()
+    assert changed["message"] == 1
+    assert changed["chat_message_join"] == 1
+    assert mirror.resets == 0
+    texts = _texts(mirror, chat_id)
+    assert "hi" not in texts and "filler 19" not in texts and len(texts) == 20
+    source.close()
+    mirror.close()
+
+
+def test_chat_renames_and_membership_changes_are_pulled(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+    mirror.sync()
+
+    bob = insert_handle(source, "+14155550002")
+    source.execute("UPDATE chat SET display_name = 'Weekend' WHERE ROWID = ?", (chat_id,))
+    source.execute("DELETE FROM chat_handle_join WHERE handle_id = ?", (alice,))
+    source.execute("INSERT INTO chat_handle_join (chat_id, handle_id) VALUES (?, ?)", (chat_id, bob))
+    source.commit()
+
+    changed = mirror.sync()  # the rename is in the reconcile window
+    assert changed["chat"] == 1
+    assert changed["chat_handle_join"] == 0  # membership of an existing chat
+    changed = mirror.reconcile()
+    assert changed["chat_handle_join"] == 2
+    assert mirror.conn.execute("SELECT display_name FROM chat").fetchone() == ("Weekend",)
+    assert mirror.conn.execute("SELECT handle_id FROM chat_handle_join").fetchall() == [(bob,)]
+    source.close()
+    mirror.close()
+
+
+def test_vacuumed_join_tables_neither_duplicate_nor_skip(tmp_path):
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    insert_message(source, chat_id, 3_000, "third", handle_id=alice)
+    source.commit()
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+    mirror.sync()
+
+    # Free a low join rowid and let VACUUM renumber the rest below the old
+    # maximum; new joins then reuse low rowids.
+    source.execute("DELETE FROM chat_message_join WHERE message_id = 1")
+    source.commit()
+    source.execute("VACUUM")
+    insert_message(source, chat_id, 4_000, "fourth", handle_id=alice)
+    source.commit()
+
+    mirror.sync()
+    assert _texts(mirror, chat_id) == ["hi", "hey", "third", "fourth"]
+    mirror.reconcile()
+    assert _texts(mirror, chat_id) == ["hey", "third", "fourth"]
+    source.close()
+    mirror.close()
+
+
+def test_recreated_source_rebuilds_the_mirror(tmp_path):
+    path = str(tmp_path / "chat.db")
+    source, chat_id, alice = _seed(path)
+    insert_message(source, chat_id, 3_000, "third", handle_id=alice)
+    source.commit()
+    source.close()
+    mirror = ChatDBMirror(path, str(tmp_path / "mirror.db"))
+    mirror.sync()
+
+    os.remove(path)
+    source, chat_id, _alice = _seed(path)
+    mirror.sync()
+
+    assert mirror.resets == 1
+    assert _texts(mirror, chat_id) == ["hi", "hey"]
+    assert mirror.watermarks()["message"] == 2
+    source.close()
+    mirror.close()
+
+
+def test_reconcile_runs_on_a_second_mirror_in_another_thread(tmp_path):
+    import threading
+
+    source, chat_id, alice = _seed(str(tmp_path / "chat.db"))
+    mirror = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+    mirror.sync()
+    source.execute("DELETE FROM chat_handle_join")
+    source.commit()
+
+    results = []
+
+    def reconcile():
+        reconciler = ChatDBMirror(str(tmp_path / "chat.db"), str(tmp_path / "mirror.db"))
+        results.append(reconciler.reconcile())
+        reconciler.close()
+
+    worker = threading.Thread(target=reconcile)
+    worker.start()
+    worker.join()
+
+    assert results[0]["chat_handle_join"] == 1
+    assert mirror.conn.execute("SELECT COUNT(*) FROM chat_handle_join").fetchone() == (0,)
+    assert not any(mirror.sync().values())
+    source.close()
+    mirror.close()
@@ -0,0 +1,332 @@
+import sqlite3
+
+import pytest
+
+from chatdb_synth import create_chat_db, insert_attachment, insert_chat, insert_handle, insert_message
+from messages import OPEN_COPY, OPEN_READONLY, MessageBridge
+
+
+@pytest.fixture()
+def chat_db(tmp_path):
+    path = str(tmp_path / "chat.db")
+    conn = create_chat_db(path)
+    yield path, conn
+    conn.close()
+
+
+def test_top_chats_orders_by_latest_message_and_batches_participants(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    bob = insert_handle(conn, "+14155550002")
+    direct = insert_chat(conn, "+14155550001", [alice])
+    group = insert_chat(conn, "chat0001", [alice, bob], display_name="Trip")
+    insert_message(conn, direct, 1_000, "old", handle_id=alice)
+    insert_message(conn, group, 2_000, "newer", handle_id=bob)
+    insert_message(conn, direct, 3_000, "newest", is_from_me=1)
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    chats = bridge.top_chats(limit=10)
+    bridge.close()
+
+    assert [c["id"] for c in chats] == [str(direct), str(group)]
+    assert chats[0]["preview"] == "newest"
+    assert chats[0]["is_from_me"] == "1"
+    assert chats[1]["name"] == "Trip"
+    assert sorted(chats[1]["participants"]) == ["+14155550001", "+14155550002"]
+
+
+def test_top_chats_tied_dates_yield_one_row_per_chat(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    insert_message(conn, chat_id, 5_000, "first", handle_id=alice)
+    insert_message(conn, chat_id, 5_000, "second", handle_id=alice)
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    chats = bridge.top_chats(limit=10)
+    bridge.close()
+
+    assert len(chats) == 1
+    assert chats[0]["preview"] == "second"
+
+
+def test_last_messages_for_chats_matches_per_chat_reader(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    bob = insert_handle(conn, "+14155550002")
+    first = insert_chat(conn, "+14155550001", [alice])
+    second = insert_chat(conn, "+14155550002", [bob])
+    for i in range(5):
+        insert_message(conn, first, 1_000 + i, f"a{i}", handle_id=alice)
+        insert_message(conn, second, 2_000 + i, f"b{i}", is_from_me=1)
+    insert_message(conn, first, 3_000, None, handle_id=alice, cache_has_attachments=1)
+    insert_message(conn, second, 3_001, None, handle_id=bob, associated_message_type=2000)
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    batched = bridge.last_messages_for_chats([first, second], limit=3)
+    expected = {
+        first: bridge.last_messages_in_chat(first, limit=3),
+        second: bridge.last_messages_in_chat(second, limit=3),
+    }
+    bridge.close()
+
+    assert batched == expected
+    assert batched[first][0][2:] == ("Attachment", "+14155550001", "attachment")
+    # The tapback is folded away, so the window holds three real bubbles
+    assert [row[2] for row in batched[second]] == ["b4", "b3", "b2"]
+
+
+def test_tapbacks_fold_onto_targets_and_do_not_use_up_the_limit(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    bob = insert_handle(conn, "+14155550002")
+    chat_id = insert_chat(conn, "chat0001", [alice, bob])
+    insert_message(conn, chat_id, 1_000, "older", handle_id=alice, guid="G-older")
+    insert_message(conn, chat_id, 2_000, "dinner?", handle_id=alice, guid="G-dinner")
+    insert_message(conn, chat_id, 3_000, "sure", is_from_me=1, guid="G-sure")
+    tapbacks = [
+        # (date, sender, type, target)
+        (3_100, bob, 2000, "p:0/G-dinner"),
+        (3_200, 0, 2001, "p:0/G-dinner"),
+        (3_300, alice, 2003, "p:0/G-sure"),
+        (3_400, alice, 3003, "p:0/G-sure"),  # alice takes her laugh back
+        (3_500, bob, 2003, "bp:G-sure"),
+        (3_600, bob, 2000, "p:0/G-sure"),  # replaces bob's laugh
+    ]
+    for date, sender, assoc_type, target in tapbacks:
+        insert_message(
+            conn,
+            chat_id,
+            date,
+            None,
+            handle_id=sender,
+            is_from_me=int(sender == 0),
+            associated_message_guid=target,
+            associated_message_type=assoc_type,
+        )
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    page = bridge.last_messages_in_chat(chat_id, limit=2)
+    batched = bridge.last_messages_for_chats([chat_id], limit=2)[chat_id]
+    bridge.close()
+
+    assert [row[2] for row in page] == ["sure", "dinner?"]
+    assert page.reaction_counts(0) == {"love": 1}
+    assert page.reaction_counts(1) == {"love": 1, "like": 1}
+    assert batched == page
+
+
+def test_tapbacks_on_any_message_part_are_found(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    album = insert_message(conn, chat_id, 1_000, "photos", handle_id=alice, cache_has_attachments=1, guid="G-album")
+    for i in range(6):  # text plus six photos: parts p:0 .. p:12
+        insert_attachment(conn, album, f"~/Library/Messages/Attachments/{i}/IMG_{i}.JPG", "image/jpeg", 1_000)
+    insert_message(conn, chat_id, 1_100, "unrelated", handle_id=alice, guid="X-G-album")
+    for date, is_from_me, assoc_type, target in [
+        (2_000, 1, 2000, "p:7/G-album"),
+        (2_100, 0, 2001, "p:12/G-album"),
+        (2_200, 0, 2003, "G-album"),
+        (2_300, 1, 2003, "p:0/X-G-album"),
+    ]:
+        insert_message(
+            conn,
+            chat_id,
+            date,
+            None,
+            handle_id=0 if is_from_me else alice,
+            is_from_me=is_from_me,
+            associated_message_guid=target,
+            associated_message_type=assoc_type,
+        )
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    page = bridge.last_messages_in_chat(chat_id, limit=2)
+    bridge.close()
+
+    assert [row[2] for row in page] == ["unrelated", "photos"]
+    assert page.reaction_counts(0) == {"laugh": 1}
+    assert page.reaction_counts(1) == {"love": 1, "laugh": 1}
+
+
+def test_iter_messages_streams_in_rowid_order_and_resumes(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    first = insert_chat(conn, "+14155550001", [alice])
+    second = insert_chat(conn, "chat0001", [alice])
+    rowids = [
+        insert_message(conn, first if i % 2 else second, 1_000 + i, f"m{i}", handle_id=alice)
+        for i in range(7)
+    ]
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    batches = list(bridge.iter_messages(batch_size=3))
+    assert [len(b) for b in batches] == [3, 3, 1]
+    assert [row[0] for b in batches for row in b] == rowids
+
+    resumed = list(bridge.iter_messages(since_rowid=batches[0][-1][0], batch_size=10))
+    assert [row[0] for row in resumed[0]] == rowids[3:]
+
+    only_first = [row for b in bridge.iter_messages(chat_ids=[first]) for row in b]
+    assert {row[1] for row in only_first} == {first}
+    assert [row[4] for row in only_first] == ["m1", "m3", "m5"]
+    bridge.close()
+
+
+def test_attributed_body_text_is_decoded_once_per_rowid(chat_db, monkeypatch):
+    import messages
+    from typedstream import encode_attributed_body
+
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    insert_message(conn, chat_id, 1_000, None, handle_id=alice, attributed_body=encode_attributed_body("from body " * 30))
+    conn.commit()
+
+    calls = []
+    real_decode = messages.decode_attributed_body
+    monkeypatch.setattr(messages, "decode_attributed_body", lambda blob: calls.append(1) or real_decode(blob))
+
+    bridge = MessageBridge(path)
+    first = bridge.last_messages_in_chat(chat_id)
+    second = bridge.last_messages_in_chat(chat_id)
+    bridge.close()
+
+    assert first == second
+    assert first[0][2] == "from body " * 30
+    assert len(calls) == 1
+
+
+def test_edited_message_body_is_decoded_again(chat_db):
+    from typedstream import encode_attributed_body
+
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    rowid = insert_message(conn, chat_id, 1_000, None, handle_id=alice, attributed_body=encode_attributed_body("see you at 6"))
+    conn.commit()
+
+    bridge = MessageBridge(path, open_mode=OPEN_READONLY)
+    before = bridge.last_messages_in_chat(chat_id)
+    conn.execute(
+        "UPDATE message SET attributedBody = ?, date_edited = 2000 WHERE ROWID = ?",
+        (encode_attributed_body("see you at 7"), rowid),
+    )
+    conn.commit()
+    after = bridge.last_messages_in_chat(chat_id)
+    bridge.close()
+
+    assert before[0][2] == "see you at 6"
+    assert after[0][2] == "see you at 7"
+
+
+def test_iter_messages_with_decode_pool_matches_serial(chat_db):
+    from parallel_decode import BodyDecoderPool
+    from typedstream import encode_attributed_body
+
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    for i in range(40):
+        body = encode_attributed_body(f"body {i} " * (i + 1))
+        insert_message(conn, chat_id, 1_000 + i, None, handle_id=alice, attributed_body=body)
+    conn.commit()
+
+    serial = [row for b in MessageBridge(path).iter_messages(batch_size=16) for row in b]
+    with BodyDecoderPool(workers=2, chunk_size=5, min_parallel=0) as pool:
+        parallel = [row for b in MessageBridge(path).iter_messages(batch_size=16, decode_pool=pool) for row in b]
+
+    assert parallel == serial
+    assert parallel[3][4] == "body 3 " * 4
+
+
+def test_iter_messages_leaves_the_ui_body_cache_alone(chat_db):
+    from parallel_decode import BodyDecoderPool
+    from typedstream import encode_attributed_body
+
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    recent = insert_chat(conn, "+14155550001", [alice])
+    insert_message(conn, recent, 9_000, None, handle_id=alice, attributed_body=encode_attributed_body("on screen"))
+    for i in range(30):
+        insert_message(conn, recent, 1_000 + i, None, handle_id=alice, attributed_body=encode_attributed_body(f"old {i}"))
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    bridge.last_messages_in_chat(recent, limit=1)
+    cached = dict(bridge._body_cache)
+    serial = [row for b in bridge.iter_messages(batch_size=8) for row in b]
+    with BodyDecoderPool(workers=2, chunk_size=4, min_parallel=0) as pool:
+        parallel = [row for b in bridge.iter_messages(batch_size=8, decode_pool=pool) for row in b]
+    bridge.close()
+
+    assert serial == parallel
+    assert [row[4] for row in serial[1:3]] == ["old 0", "old 1"]
+    assert dict(bridge._body_cache) == cached
+
+
+def test_keyset_pages_walk_history_without_gaps_or_duplicates(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    # Repeated dates: the ROWID tie-breaker must keep page boundaries exact
+    for i in range(25):
+        insert_message(conn, chat_id, 1_000 + i // 3, f"m{i}", handle_id=alice)
+    conn.commit()
+
+    bridge = MessageBridge(path)
+    newest = bridge.last_messages_in_chat(chat_id, limit=25)
+    pages = []
+    cursor = None
+    while True:
+        page = bridge.messages_before(chat_id, cursor, limit=7)
+        if not page:
+            break
+        pages.append(page)
+        cursor = page.cursor(len(page) - 1)
+    newer = bridge.messages_after(chat_id, newest.cursor(10), limit=4)
+    bridge.close()
+
+    walked = [row for page in pages for row in page]
+    assert [len(p) for p in pages] == [7, 7, 7, 4]
+    assert walked == list(newest)
+    assert [row[2] for row in walked[:2]] == ["m24", "m23"]
+    # The four messages just newer than row 10, still newest first
+    assert newer == newest[6:10]
+
+
+def test_readonly_open_reads_in_place_and_falls_back_to_copy_when_locked(chat_db):
+    path, conn = chat_db
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    insert_message(conn, chat_id, 1_000, "first", handle_id=alice)
+    conn.commit()
+
+    bridge = MessageBridge(path, open_mode=OPEN_READONLY)
+    assert bridge.open_report.strategy == OPEN_READONLY
+    assert bridge.open_report.fallback_reason is None
+    assert bridge.tmp == path
+    assert bridge.refresh() is False
+
+    insert_message(conn, chat_id, 2_000, "second", handle_id=alice)
+    conn.commit()
+    assert bridge.refresh() is True
+    assert [row[2] for row in bridge.last_messages_in_chat(chat_id)] == ["second", "first"]
+    with pytest.raises(sqlite3.OperationalError):
+        bridge.conn.execute("DELETE FROM message")
+    bridge.close()
+
+    conn.execute("BEGIN EXCLUSIVE")
+    locked = MessageBridge(path, open_mode=OPEN_READONLY)
+    conn.rollback()
+    assert locked.open_report.strategy == OPEN_COPY
+    assert "locked" in locked.open_report.fallback_reason
+    assert [row[2] for row in locked.last_messages_in_chat(chat_id)] == ["second", "first"]
+    locked.close()
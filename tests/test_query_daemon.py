@@ -0,0 +1,97 @@
+import time
+
+import pytest
+
+from chatdb_synth import generate_chat_db
+from messages import MessageBridge
+import snapshots
+from query_daemon import (
+    HEADER,
+    OP_TOP_CHATS,
+    STATUS_ERROR,
+    QueryClient,
+    QueryDaemon,
+    QueryError,
+    _recv_frame,
+    decode_value,
+    encode_value,
+)
+
+
+def test_value_codec_round_trip():
+    value = {
+        "none": None,
+        "flags": [True, False],
+        "ints": [0, 1, -1, 2**40, -(2**62), 127, 128],
+        "float": 1.5,
+        "text": "héllo \U0001F600",
+        "blob": b"\x00\xff",
+        7: [[1, "a"], {}],
+    }
+    assert decode_value(encode_value(value)) == value
+    assert len(encode_value(5)) == 2
+
+
+def test_client_matches_direct_bridge(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 4_000, 30, seed=5)
+    bridge = MessageBridge(path)
+    socket_path = str(tmp_path / "q.sock")
+
+    with QueryDaemon(socket_path, path, search_index_path=str(tmp_path / "fts.db"), watch=False):
+        with QueryClient(socket_path) as client, QueryClient(socket_path) as other:
+            assert client.ping()
+            assert client.top_chats(limit=10) == bridge.top_chats(limit=10)
+
+            page = client.last_messages_in_chat(3, limit=25)
+            assert page == bridge.last_messages_in_chat(3, limit=25)
+            older = other.messages_before(3, page.cursor(0), limit=25)
+            assert older == bridge.messages_before(3, page.cursor(0), limit=25)
+            assert client.messages_after(3, older.cursor(0), limit=10) == bridge.messages_after(
+                3, older.cursor(0), limit=10
+            )
+
+            batches = client.last_messages_for_chats([1, 2, 4], limit=5)
+            assert batches == bridge.last_messages_for_chats([1, 2, 4], limit=5)
+
+            word = next(t for t in page.texts if t and t.split()).split()[0]
+            hits = client.search(word, limit=5)
+            assert hits and all(hit.message_rowid > 0 for hit in hits)
+
+            with pytest.raises(QueryError):
+                client.call(99)
+            assert client.ping()
+    bridge.close()
+
+
+def test_short_lived_clients_reuse_warm_readers_snapshot_and_index(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 500, 5, seed=2)
+    socket_path = str(tmp_path / "q.sock")
+
+    with QueryDaemon(socket_path, path, search_index_path=str(tmp_path / "fts.db"), watch=False) as daemon:
+        index = daemon._index
+        for _ in range(5):
+            with QueryClient(socket_path) as client:
+                client.top_chats(limit=3)
+                client.search("see", limit=3)
+            time.sleep(0.01)  # let the connection thread finish
+        assert daemon.pool.size() == 1
+        assert snapshots.manager_for(path).copies_made == 1
+        assert daemon._index is index
+    assert daemon._index is None
+
+
+def test_malformed_payload_gets_an_error_reply_and_the_connection_survives(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 100, 2, seed=3)
+    socket_path = str(tmp_path / "q.sock")
+
+    with QueryDaemon(socket_path, path, watch=False):
+        with QueryClient(socket_path) as client:
+            for payload in (b"\x07\x05\x01", b"\x04", b"\x03\xff\xff"):  # truncated dict, float, varint
+                client.sock.sendall(HEADER.pack(len(payload), 41, OP_TOP_CHATS) + payload)
+                request_id, status, message = _recv_frame(client.sock)
+                assert (request_id, status) == (41, STATUS_ERROR)
+                assert message.startswith("ValueError")
+            assert client.ping()
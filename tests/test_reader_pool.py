@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+
+from chatdb_synth import generate_chat_db, insert_message
+from messages import MessageBridge
+from reader_pool import ReaderPool
+
+
+def _reference(path, chat_ids):
+    bridge = MessageBridge(path)
+    top = bridge.top_chats(limit=20)
+    pages = {chat_id: list(bridge.last_messages_in_chat(chat_id, limit=40)) for chat_id in chat_ids}
+    bridge.close()
+    return top, pages
+
+
+def test_threads_get_their_own_readers_and_consistent_results(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 5_000, 40, seed=3)
+    chat_ids = list(range(1, 11))
+    expected_top, expected_pages = _reference(path, chat_ids)
+
+    pool = ReaderPool(path)
+    errors = []
+    bridges = set()
+    start = threading.Barrier(8)
+
+    def worker(n):
+        try:
+            start.wait()
+            for i in range(25):
+                bridge = pool.bridge()
+                bridges.add(id(bridge))
+                chat_id = chat_ids[(n + i) % len(chat_ids)]
+                assert bridge.top_chats(limit=20) == expected_top
+                assert list(bridge.last_messages_in_chat(chat_id, limit=40)) == expected_pages[chat_id]
+                batches = sum(1 for _ in bridge.iter_messages(batch_size=500))
+                assert batches == 10
+        except Exception as e:  # surfaced below; assertion errors in threads are otherwise lost
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert not errors, errors[0]
+    assert len(bridges) == 8
+    pool.close()
+
+
+def test_refresh_moves_each_thread_to_the_new_snapshot(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 500, 5, seed=1)
+    pool = ReaderPool(path)
+    before = pool.bridge().last_messages_in_chat(1, limit=1)
+
+    seen_in_thread = []
+    t = threading.Thread(target=lambda: seen_in_thread.append(pool.bridge().snapshot.version))
+    t.start()
+    t.join()
+
+    conn = sqlite3.connect(path)
+    insert_message(conn, 1, 10**18, "fresh")
+    conn.commit()
+    conn.close()
+
+    # Until refresh() the thread keeps reading its snapshot
+    assert pool.bridge().last_messages_in_chat(1, limit=1) == before
+    pool.refresh()
+    assert pool.bridge().last_messages_in_chat(1, limit=1)[0][2] == "fresh"
+    assert pool.bridge().snapshot.version != seen_in_thread[0]
+
+    # The exited thread's bridge is closed when the next thread registers
+    t = threading.Thread(target=pool.bridge)
+    t.start()
+    t.join()
+    assert pool.size() == 2
+    pool.close()
+
+
+def test_leased_bridges_outlive_threads_and_refresh_only_when_asked(tmp_path):
+    path = str(tmp_path / "chat.db")
+    generate_chat_db(path, 500, 5, seed=4)
+    pool = ReaderPool(path)
+    leased = []
+
+    def use():
+        with pool.lease() as bridge:
+            leased.append((bridge, bridge.snapshot.version))
+
+    for _ in range(3):
+        t = threading.Thread(target=use)
+        t.start()
+        t.join()
+    assert len({id(bridge) for bridge, _version in leased}) == 1
+    assert pool.size() == 1
+
+    conn = sqlite3.connect(path)
+    insert_message(conn, 1, 10**18, "fresh")
+    conn.commit()
+    conn.close()
+    with pool.lease() as bridge:
+        assert bridge.snapshot.version == leased[0][1]
+    pool.refresh()
+    with pool.lease() as bridge:
+        assert bridge.snapshot.version != leased[0][1]
+        assert bridge.last_messages_in_chat(1, limit=1)[0][2] == "fresh"
+    pool.close()
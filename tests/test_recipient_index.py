@@ -0,0 +1,68 @@
+from chatdb_synth import create_chat_db, insert_chat, insert_handle
+from contact_index import ContactIndex
+from contact_sources import ContactEntry, MemoryContactSource
+from messages import MessageBridge
+from recipient_index import TIER_EXACT, TIER_FUZZY, TIER_WORD_PREFIX, RecipientIndex, normalize_name
+
+CONTACTS = ContactIndex.build(MemoryContactSource([
+    ContactEntry("Renée Dubois", ("+33 6 12 34 56 78",), ("renee@example.com",)),
+    ContactEntry("Alice Smith", ("(415) 555-0100",)),
+    ContactEntry("Alicia Keys", ("(415) 555-0101",)),
+    ContactEntry("Bob Jones", ("(415) 555-0199",)),
+]))
+CHATS = [
+    (7, None, "+14155550100", ["+14155550100"]),
+    (5, "Climbing crew", "chat123", ["+14155550100", "+14155550199"]),
+    (3, None, "chat456", ["+14155550101", "+19995550000"]),
+]
+
+
+def test_normalize_name():
+    assert normalize_name("  Renée  O'Brien-Smith ") == "renee o brien smith"
+    assert normalize_name("ＡＬＩＣＥ") == "alice"
+
+
+def test_names_map_back_to_handles_and_chats():
+    index = RecipientIndex.build(CHATS, CONTACTS)
+
+    alice = index.search("alice smith")[0]
+    assert alice.tier == TIER_EXACT
+    assert alice.recipient.chat_ids == (7,)
+    assert alice.recipient.handles == ("+14155550100",)
+    crew = index.search("crew")[0].recipient
+    assert crew.name == "Climbing crew" and crew.chat_ids == (5,)
+    group = index.search("keys")[0].recipient
+    assert group.name == "Alicia Keys"
+    assert [m.recipient.name for m in index.search("+19995550000")] == ["Alicia Keys, +19995550000"]
+    assert set(index.search("renee")[0].recipient.handles) == {"+33612345678", "renee@example.com"}
+
+
+def test_ranking_prefers_prefix_then_chats_and_tolerates_typos():
+    index = RecipientIndex.build(CHATS, CONTACTS)
+
+    names = [m.recipient.name for m in index.search("ali")]
+    assert names[0] == "Alice Smith"  # has a chat, same tier as "Alicia Keys"
+    assert "Alicia Keys" in names
+    assert index.search("a s")[0].tier == TIER_WORD_PREFIX
+    fuzzy = index.search("alcie smith")
+    assert fuzzy and fuzzy[0].recipient.name == "Alice Smith" and fuzzy[0].tier == TIER_FUZZY
+    assert index.search("zzzz") == []
+    assert len(index.search("a", limit=2)) == 2
+
+
+def test_builds_from_chat_directory(tmp_path):
+    conn = create_chat_db(str(tmp_path / "chat.db"))
+    alice = insert_handle(conn, "+14155550100")
+    bob = insert_handle(conn, "+14155550199")
+    insert_chat(conn, "+14155550100", [alice])
+    insert_chat(conn, "chat1", [alice, bob], display_name="Climbing crew")
+    conn.commit()
+    bridge = MessageBridge(str(tmp_path / "chat.db"))
+
+    directory = bridge.chat_directory()
+    index = RecipientIndex.build(directory, CONTACTS)
+
+    assert sorted(len(handles) for _id, _name, _ident, handles in directory) == [1, 2]
+    assert index.search("alice")[0].recipient.chat_ids
+    assert index.search("climbing")[0].recipient.handles == ("+14155550100", "+14155550199")
+    bridge.close()
@@ -0,0 +1,34 @@
+from chatdb_synth import create_chat_db, insert_chat, insert_handle, insert_message
+from messages import MessageBridge
+from search_index import MessageSearchIndex
+from typedstream import encode_attributed_body
+
+
+def test_search_finds_text_and_attributed_body_incrementally(tmp_path):
+    path = str(tmp_path / "chat.db")
+    conn = create_chat_db(path)
+    alice = insert_handle(conn, "+14155550001")
+    first = insert_chat(conn, "+14155550001", [alice])
+    second = insert_chat(conn, "chat0001", [alice])
+    insert_message(conn, first, 1_000, "dinner at eight?", handle_id=alice)
+    body_rowid = insert_message(
+        conn, second, 2_000, None, handle_id=alice, attributed_body=encode_attributed_body("Dinner moved to Friday")
+    )
+    insert_message(conn, first, 3_000, None, handle_id=alice, associated_message_type=2001)
+    conn.commit()
+
+    index = MessageSearchIndex(str(tmp_path / "search.db"))
+    assert index.update(MessageBridge(path)) == 2
+
+    hits = index.search("dinner")
+    assert {hit.chat_id for hit in hits} == {first, second}
+    assert index.search("fri")[0].message_rowid == body_rowid
+    assert "[Dinner]" in index.search("dinner", chat_id=second)[0].snippet
+    assert index.search('eight" OR *') == []
+
+    late = insert_message(conn, first, 4_000, "running late", is_from_me=1)
+    conn.commit()
+    assert index.update(MessageBridge(path)) == 1
+    assert [hit.message_rowid for hit in index.search("late")] == [late]
+    index.close()
+    conn.close()
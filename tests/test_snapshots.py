@@ -0,0 +1,119 @@
+import os
+
+from chatdb_synth import create_chat_db, insert_chat, insert_handle, insert_message
+from messages import MessageBridge
+from snapshots import SnapshotManager, fingerprint
+
+
+def _source(tmp_path):
+    conn = create_chat_db(str(tmp_path / "chat.db"))
+    alice = insert_handle(conn, "alice@example.com")
+    chat_id = insert_chat(conn, "alice@example.com", [alice])
+    insert_message(conn, chat_id, 1_000, "hi", handle_id=alice)
+    conn.commit()
+    return conn, chat_id
+
+
+def test_unchanged_source_reuses_snapshot(tmp_path):
+    conn, _chat_id = _source(tmp_path)
+    manager = SnapshotManager(str(tmp_path / "chat.db"), str(tmp_path / "snaps"))
+
+    first = manager.acquire()
+    second = manager.acquire()
+
+    assert first.version == second.version
+    assert first.path == second.path
+    assert manager.copies_made == 1
+    conn.close()
+
+
+def test_changed_source_gets_new_version_and_old_is_collected(tmp_path):
+    conn, chat_id = _source(tmp_path)
+    manager = SnapshotManager(str(tmp_path / "chat.db"), str(tmp_path / "snaps"))
+    old = manager.acquire()
+
+    insert_message(conn, chat_id, 2_000, "more")
+    conn.commit()
+    new = manager.acquire()
+
+    assert new.version != old.version
+    # Still referenced, so the old version must stay on disk
+    assert os.path.exists(old.path)
+
+    old.release()
+    assert not os.path.exists(old.path)
+    assert os.path.exists(new.path)
+    assert manager.live_versions() == {new.version: 1}
+    conn.close()
+
+
+def test_fingerprint_tracks_wal_writes(tmp_path):
+    conn, chat_id = _source(tmp_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    before = fingerprint(str(tmp_path / "chat.db"))
+
+    insert_message(conn, chat_id, 3_000, "wal write")
+    conn.commit()
+
+    after = fingerprint(str(tmp_path / "chat.db"))
+    assert after.wal_size > 0
+    assert after != before
+    conn.close()
+
+
+def test_close_removes_the_temporary_root_once_nothing_is_held(tmp_path):
+    conn, _chat_id = _source(tmp_path)
+    manager = SnapshotManager(str(tmp_path / "chat.db"))
+    first = manager.acquire()
+    second = manager.acquire()
+
+    first.release()
+    manager.close()  # second still holds the current version
+    assert os.path.exists(second.path)
+
+    second.release()
+    manager.close()
+    assert not os.path.exists(manager.root_dir)
+
+    # A closed manager starts over on the next acquire
+    again = manager.acquire()
+    assert os.path.exists(again.path)
+    again.release()
+    manager.close()
+    assert not os.path.exists(manager.root_dir)
+    conn.close()
+
+
+def test_closed_manager_registers_a_recreated_root_for_exit_cleanup(tmp_path):
+    import snapshots
+
+    conn, _chat_id = _source(tmp_path)
+    manager = SnapshotManager(str(tmp_path / "chat.db"))
+    manager.acquire().release()
+    manager.close()
+    assert manager.root_dir not in snapshots._owned_roots
+
+    again = manager.acquire()
+    assert manager.root_dir in snapshots._owned_roots
+    again.release()
+    manager.close()
+    conn.close()
+
+
+def test_closing_one_bridge_keeps_the_shared_snapshot(tmp_path):
+    conn, _chat_id = _source(tmp_path)
+    first = MessageBridge(str(tmp_path / "chat.db"))
+    second = MessageBridge(str(tmp_path / "chat.db"))
+    manager = first._snapshots
+    assert second._snapshots is manager and second.tmp == first.tmp
+
+    first.close()
+    assert os.path.exists(second.tmp)
+    third = MessageBridge(str(tmp_path / "chat.db"))
+    assert third.tmp == second.tmp
+    assert manager.copies_made == 1
+
+    second.close()
+    third.close()
+    assert manager.live_versions() == {manager.current_version(): 0}
+    conn.close()
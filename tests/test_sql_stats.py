@@ -0,0 +1,65 @@
+from chatdb_synth import create_chat_db, insert_chat, insert_handle, insert_message
+from messages import MessageBridge
+from sql_stats import QueryRecorder
+
+
+def test_bridge_queries_are_recorded_by_name_with_rows_and_slow_plans(tmp_path):
+    path = str(tmp_path / "chat.db")
+    conn = create_chat_db(path)
+    alice = insert_handle(conn, "+14155550001")
+    chat_id = insert_chat(conn, "+14155550001", [alice])
+    for i in range(5):
+        insert_message(conn, chat_id, 1_000 + i, f"m{i}", handle_id=alice)
+    conn.commit()
+    conn.close()
+
+    # Threshold 0: every statement counts as slow and gets its plan captured
+    recorder = QueryRecorder(slow_threshold=0)
+    bridge = MessageBridge(path, query_stats=recorder)
+    bridge.top_chats(limit=10)
+    bridge.last_messages_in_chat(chat_id, limit=3)
+    bridge.last_messages_in_chat(chat_id, limit=3)
+    page = bridge.messages_before(chat_id, None, limit=2)
+    bridge.messages_before(chat_id, page.cursor(1), limit=2)
+    bridge.close()
+
+    stats = recorder.stats()
+    assert stats["top_chats"]["calls"] == 1
+    assert stats["top_chats"]["rows"] == 1
+    assert stats["_chat_participants_many"]["calls"] == 1
+    assert stats["last_messages_in_chat"]["calls"] == 2
+    assert stats["last_messages_in_chat"]["rows"] == 6
+    assert stats["messages_before"]["rows"] == 4
+    assert sum(stats["messages_before"]["histogram"].values()) == 2
+
+    plan = "\n".join(stats["messages_before"]["slow"][-1]["plan"])
+    assert "chat_message_join_idx_message_date_id_chat_id" in plan
+    assert "messages_before" in recorder.report()
+
+
+def test_fetchone_and_abandoned_statements_are_recorded_without_a_next_execute(tmp_path):
+    import sqlite3
+
+    from sql_stats import InstrumentedCursor
+
+    conn = sqlite3.connect(str(tmp_path / "t.db"))
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(10)])
+    recorder = QueryRecorder()
+
+    cur = InstrumentedCursor(conn.cursor(), recorder)
+    (count,) = cur.execute("SELECT COUNT(*) FROM t", name="count").fetchone()
+    assert count == 10
+    assert recorder.stats()["count"]["calls"] == 1
+    assert recorder.stats()["count"]["rows"] == 1
+
+    rows = list(cur.execute("SELECT x FROM t", name="iterated"))
+    assert len(rows) == 10
+    assert recorder.stats()["iterated"]["rows"] == 10
+
+    abandoned = InstrumentedCursor(conn.cursor(), recorder)
+    abandoned.execute("SELECT x FROM t", name="abandoned").fetchmany(3)
+    del abandoned
+    assert recorder.stats()["abandoned"]["calls"] == 1
+    assert recorder.stats()["abandoned"]["rows"] == 3
+    conn.close()
@@ -0,0 +1,79 @@
+import plistlib
+
+import pytest
+
+from typedstream import _TAG_INT16, _TAG_INT32, _encode_int, decode_attributed_body, encode_attributed_body
+
+# attributedBody for a message with a link, laid out the way Messages writes
+# it and unlike encode_attributed_body's output: NSMutableAttributedString /
+# NSMutableString classes, an emoji (UTF-16 run lengths differ from the
+# UTF-8 byte count), a 0x81 two-byte length, three attribute runs and a
+# second string (the NSURL) after the text.
+LINK_MESSAGE_TEXT = (
+    "Dinner at 7? \U0001f35d menu: https://example.com/menu?item=caf%C3%A9&lang=en "
+    + "see you there " * 10
+)
+LINK_MESSAGE_BODY = bytes.fromhex(
+    "040b73747265616d747970656481e803840140848484194e534d757461626c65"
+    "41747472696275746564537472696e67008484124e5341747472696275746564"
+    "537472696e67008484084e534f626a6563740085928484840f4e534d75746162"
+    "6c65537472696e67018484084e53537472696e67019584012b81d40044696e6e"
+    "657220617420373f20f09f8d9d206d656e753a2068747470733a2f2f6578616d"
+    "706c652e636f6d2f6d656e753f6974656d3d636166254333254139266c616e67"
+    "3d656e2073656520796f752074686572652073656520796f7520746865726520"
+    "73656520796f752074686572652073656520796f752074686572652073656520"
+    "796f752074686572652073656520796f752074686572652073656520796f7520"
+    "74686572652073656520796f752074686572652073656520796f752074686572"
+    "652073656520796f752074686572652086840269490116928484840c4e534469"
+    "6374696f6e617279009584016901928497971d5f5f6b494d4d65737361676550"
+    "6172744174747269627574654e616d658692848484084e534e756d6265720084"
+    "84074e5356616c7565009584012a849b9b00868684026949012f928496960292"
+    "849797165f5f6b494d4c696e6b4174747269627574654e616d65869284848405"
+    "4e5355524c009584016300928497972f68747470733a2f2f6578616d706c652e"
+    "636f6d2f6d656e753f6974656d3d636166254333254139266c616e673d656e86"
+    "86929a929c868402694901818d00929e8686"
+)
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "hi",
+        "x" * 127,
+        "long message " * 40,  # > 255 bytes: two-byte length prefix
+        "🎉 émoji and ünïcode " * 10,
+        "z" * 32_767,  # largest two-byte length
+        "z" * 32_768,  # int16 is signed: four-byte length from here
+        "y" * 70_000,  # four-byte length prefix
+    ],
+)
+def test_typedstream_round_trip(text):
+    assert decode_attributed_body(encode_attributed_body(text)) == text
+
+
+def test_int16_length_tag_is_only_used_while_it_fits_signed():
+    assert _encode_int(32_767)[0] == _TAG_INT16
+    assert _encode_int(32_768)[0] == _TAG_INT32
+
+
+def test_messages_link_body_decodes_to_the_message_text():
+    assert decode_attributed_body(LINK_MESSAGE_BODY) == LINK_MESSAGE_TEXT
+
+
+def test_keyed_archive_body():
+    uid = plistlib.UID
+    blob = plistlib.dumps(
+        {
+            "$archiver": "NSKeyedArchiver",
+            "$version": 100000,
+            "$top": {"root": uid(1)},
+            "$objects": ["$null", {"NSString": uid(2)}, {"NS.string": "keyed text"}],
+        },
+        fmt=plistlib.FMT_BINARY,
+    )
+    assert decode_attributed_body(blob) == "keyed text"
+
+
+def test_garbage_decodes_to_empty_string():
+    assert decode_attributed_body(b"\x04\x0bstreamtyped\x00\x01") == ""
+    assert decode_attributed_body(None) == ""